@@ -18,8 +18,10 @@ Utility modules
 .. autosummary::
   :toctree:
 
+  COT.checksum_cache
   COT.data_validation
   COT.file_reference
+  COT.tar_file
   COT.utilities
   COT.xml_file
 
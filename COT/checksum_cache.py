@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+# checksum_cache.py - Persistent cache of file checksums
+#
+# October 2026, the COT project developers.
+# Copyright (c) 2026 the COT project developers.
+# See the COPYRIGHT.txt file at the top-level directory of this distribution
+# and at https://github.com/glennmatthews/cot/blob/master/COPYRIGHT.txt.
+#
+# This file is part of the Common OVF Tool (COT) project.
+# It is subject to the license terms in the LICENSE.txt file found in the
+# top-level directory of this distribution and at
+# https://github.com/glennmatthews/cot/blob/master/LICENSE.txt. No part
+# of COT, including this file, may be copied, modified, propagated, or
+# distributed except according to the terms contained in the LICENSE.txt file.
+
+"""Persistent cache of file checksums, shared between COT invocations.
+
+Checksumming multi-gigabyte disk images is one of the most expensive things
+COT does, and the same unchanged disk images are often processed by many
+successive COT runs. When enabled (see
+:data:`COT.file_reference.CHECKSUM_CACHE` and the ``cot --checksum-cache``
+option), previously computed checksums are looked up here before any file
+data is read.
+
+Entries are keyed by the real path of the file, its
+:func:`~COT.utilities.file_fingerprint`, and the checksum algorithm, so any
+change to the file (or its replacement by a different file) is a cache miss.
+The number of entries is bounded, with the least recently used entries
+being evicted first.
+
+**Classes**
+
+.. autosummary::
+  :nosignatures:
+
+  ChecksumCache
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import sqlite3
+except ImportError:
+    # Python built without SQLite support
+    sqlite3 = None
+
+logger = logging.getLogger(__name__)
+
+
+class ChecksumCache(object):
+    """Persistent, size-bounded LRU cache of file checksums in SQLite.
+
+    ::
+
+      >>> import tempfile, shutil
+      >>> temp_dir = tempfile.mkdtemp()
+      >>> cache = ChecksumCache(os.path.join(temp_dir, "cache.sqlite"))
+      >>> cache.get("/foo/bar.vmdk", (1, 2, 3, 4), "sha1") is None
+      True
+      >>> cache.put("/foo/bar.vmdk", (1, 2, 3, 4), "sha1", "0123abcd")
+      >>> cache.get("/foo/bar.vmdk", (1, 2, 3, 4), "sha1")
+      '0123abcd'
+      >>> cache.get("/foo/bar.vmdk", (1, 2, 3, 5), "sha1") is None
+      True
+      >>> cache.close()
+      >>> shutil.rmtree(temp_dir)
+    """
+
+    DEFAULT_MAX_ENTRIES = 10000
+    """Default maximum number of checksums to remember."""
+
+    @staticmethod
+    def default_path():
+        """Get the default location of the cache database.
+
+        Returns:
+          str: ``$XDG_CACHE_HOME/cot/checksums.sqlite``, where
+          ``$XDG_CACHE_HOME`` defaults to ``~/.cache``.
+        """
+        cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                      os.path.join(os.path.expanduser('~'), '.cache'))
+        return os.path.join(cache_home, 'cot', 'checksums.sqlite')
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """Open (creating if needed) the cache database.
+
+        Args:
+          path (str): Path to the database. Defaults to :meth:`default_path`.
+          max_entries (int): Maximum number of entries to retain.
+
+        Raises:
+          IOError: if the cache cannot be opened or created.
+        """
+        if sqlite3 is None:
+            raise IOError("Python SQLite support is not available")
+        if path is None:
+            path = self.default_path()
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            # Checksums may be computed in multiple threads,
+            # so we share the connection under our own lock.
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS checksums ("
+                    "path TEXT NOT NULL, "
+                    "algorithm TEXT NOT NULL, "
+                    "fingerprint TEXT NOT NULL, "
+                    "checksum TEXT NOT NULL, "
+                    "last_used REAL NOT NULL, "
+                    "PRIMARY KEY (path, algorithm))")
+        except (OSError, sqlite3.Error) as exc:
+            raise IOError("Unable to open checksum cache {0}: {1}"
+                          .format(path, exc))
+        logger.debug("Opened checksum cache %s", path)
+
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._conn.close()
+
+    def get(self, path, fingerprint, algorithm):
+        """Look up the checksum of the given file, if known.
+
+        Args:
+          path (str): Real path identifying the file.
+          fingerprint (tuple): Current fingerprint of the file.
+          algorithm (str): Checksum algorithm such as 'sha1'.
+
+        Returns:
+          str: Cached checksum, or ``None`` if not cached or if the cached
+          checksum was computed for a different fingerprint.
+        """
+        fingerprint = json.dumps(list(fingerprint))
+        try:
+            with self._lock, self._conn:
+                row = self._conn.execute(
+                    "SELECT checksum FROM checksums WHERE path = ? AND "
+                    "algorithm = ? AND fingerprint = ?",
+                    (path, algorithm, fingerprint)).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute(
+                    "UPDATE checksums SET last_used = ? WHERE path = ? AND "
+                    "algorithm = ?", (time.time(), path, algorithm))
+        except sqlite3.Error as exc:
+            logger.warning("Unable to read checksum cache %s: %s",
+                           self.path, exc)
+            return None
+        logger.debug("Found cached %s checksum for %s", algorithm, path)
+        return str(row[0])
+
+    def put(self, path, fingerprint, algorithm, checksum):
+        """Record the checksum of the given file.
+
+        Evicts the least recently used entries if the cache is full.
+
+        Args:
+          path (str): Real path identifying the file.
+          fingerprint (tuple): Fingerprint of the file when it was read.
+          algorithm (str): Checksum algorithm such as 'sha1'.
+          checksum (str): Checksum of the file.
+        """
+        fingerprint = json.dumps(list(fingerprint))
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checksums (path, algorithm, "
+                    "fingerprint, checksum, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (path, algorithm, fingerprint, checksum, time.time()))
+                (count,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM checksums").fetchone()
+                if count > self.max_entries:
+                    logger.debug("Evicting %d entries from checksum cache",
+                                 count - self.max_entries)
+                    self._conn.execute(
+                        "DELETE FROM checksums WHERE rowid IN (SELECT rowid "
+                        "FROM checksums ORDER BY last_used, rowid LIMIT ?)",
+                        (count - self.max_entries,))
+        except sqlite3.Error as exc:
+            logger.warning("Unable to update checksum cache %s: %s",
+                           self.path, exc)
+
+    def __len__(self):
+        """Get the number of entries in the cache.
+
+        Returns:
+          int: Entry count
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM checksums").fetchone()[0]
@@ -237,6 +237,10 @@ otherwise, will create a new disk entry.""")
         group.add_argument('-o', '--output',
                            help="""Name/path of new OVF/OVA package to """
                            """create instead of updating the existing OVF""")
+        group.add_argument('--manifest-last', action='store_true',
+                           help="""When writing an OVA, place the manifest """
+                           """at the end rather than second, so that each """
+                           """file is read only once""")
 
         group = parser.add_argument_group("disk-related options")
 
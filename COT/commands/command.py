@@ -261,7 +261,8 @@ class ReadWriteCommand(ReadCommand):
 
     Attributes:
     :attr:`package`,
-    :attr:`output`
+    :attr:`output`,
+    :attr:`manifest_last`
     """
 
     def __init__(self, ui):
@@ -273,6 +274,8 @@ class ReadWriteCommand(ReadCommand):
         super(ReadWriteCommand, self).__init__(ui)
         # Default to an unspecified output rather than no output
         self._output = ""
+        self.manifest_last = False
+        """Place the manifest at the end of an output OVA, not second."""
 
     # Overriding a parent class's property is a bit ugly in Python.
     # Also, Pylint bug: https://github.com/PyCQA/pylint/issues/844
@@ -386,5 +389,5 @@ class ReadWriteCommand(ReadCommand):
             # One more sanity check
             self.check_disk_space(2 * self.vm.predicted_output_size(),
                                   self.output, label="VM output", die=True)
-            self.vm.write()
+            self.vm.write(manifest_last=self.manifest_last)
         super(ReadWriteCommand, self).finished()
@@ -645,6 +645,10 @@ class COTEditHardware(ReadWriteCommand):
         group.add_argument('-o', '--output',
                            help="Name/path of new OVF/OVA package to create "
                            "instead of updating the existing OVF")
+        group.add_argument('--manifest-last', action='store_true',
+                           help="When writing an OVA, place the manifest "
+                           "at the end rather than second, so that each "
+                           "file is read only once")
         group.add_argument('-v', '--virtual-system-type',
                            action='append', nargs='+',
                            type=no_whitespace, metavar=('TYPE', 'TYPE2'),
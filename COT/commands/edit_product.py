@@ -160,6 +160,10 @@ Edit product information attributes of the given OVF or OVA""")
         parser.add_argument('-o', '--output',
                             help="Name/path of new OVF/OVA package to create "
                             "instead of updating the existing OVF")
+        parser.add_argument('--manifest-last', action='store_true',
+                            help="When writing an OVA, place the manifest "
+                            "at the end rather than second, so that each "
+                            "file is read only once")
         parser.add_argument('-c', '--product-class',
                             help='Product class, such as "com.cisco.csr1000v"')
         parser.add_argument('-p', '--product',
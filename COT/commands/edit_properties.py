@@ -25,6 +25,7 @@
 """
 
 import argparse
+import json
 import logging
 import os.path
 import re
@@ -49,6 +50,7 @@ class COTEditProperties(ReadWriteCommand):
     Attributes:
     :attr:`config_file`,
     :attr:`properties`,
+    :attr:`properties_file`,
     :attr:`transports`,
     :attr:`user_configurable`
     """
@@ -62,6 +64,7 @@ class COTEditProperties(ReadWriteCommand):
         super(COTEditProperties, self).__init__(ui)
         self._config_file = None
         self._properties = []
+        self._properties_file = None
         self.labels = []
         """List of label strings to set for the properties being updated."""
         self.descriptions = []
@@ -86,6 +89,79 @@ class COTEditProperties(ReadWriteCommand):
                                     .format(value))
         self._config_file = value
 
+    @property
+    def properties_file(self):
+        """Path to a JSON or ``key=value`` file of property values to set.
+
+        Raises:
+          InvalidInputError: if the file does not exist.
+        """
+        return self._properties_file
+
+    @properties_file.setter
+    def properties_file(self, value):
+        if not os.path.exists(value):
+            raise InvalidInputError("Specified properties file {0} does "
+                                    "not exist!".format(value))
+        self._properties_file = value
+
+    def read_properties_file(self):
+        """Read the (key, value) pairs from :attr:`properties_file`.
+
+        The file may be either a JSON object mapping keys to values, or
+        plain text with one ``key=value`` pair per line. In the latter
+        case, blank lines and lines beginning with ``#`` are ignored.
+
+        Returns:
+          list: ``(key, value)`` pairs, in the order given in the file.
+
+        Raises:
+          InvalidInputError: if the file contents are not in either format,
+            or if a JSON value is not a string, number, or boolean.
+        """
+        with open(self.properties_file, 'r') as fileobj:
+            text = fileobj.read()
+
+        if text.lstrip().startswith('{'):
+            try:
+                data = json.loads(text, object_pairs_hook=list)
+            except ValueError as exc:
+                raise InvalidInputError("Invalid JSON in properties file "
+                                        "{0}: {1}"
+                                        .format(self.properties_file, exc))
+            result = []
+            for key, value in data:
+                # Nested objects are also lists, due to object_pairs_hook
+                if value is None or isinstance(value, list):
+                    raise InvalidInputError(
+                        "Invalid value for property '{0}' in properties file "
+                        "{1} - expected a string, number, or boolean but got "
+                        "{2}".format(key, self.properties_file,
+                                     "null" if value is None else
+                                     "an array or object"))
+                if isinstance(value, bool):
+                    value = str(value).lower()
+                else:
+                    value = str(value)
+                result.append((key, value))
+            return result
+
+        result = []
+        for line_num, line in enumerate(text.splitlines(), start=1):
+            line = line.strip()
+            # Skip blank lines and comment lines
+            if (not line) or line[0] == '#':
+                continue
+            key, sep, value = line.partition('=')
+            key = key.strip()
+            if not sep or not key:
+                raise InvalidInputError(
+                    "Invalid line {0} in properties file {1} - expected "
+                    "'key=value' but got '{2}'"
+                    .format(line_num, self.properties_file, line))
+            result.append((key, value.strip()))
+        return result
+
     @property
     def properties(self):
         r"""List of property (key, value, type) tuples to update.
@@ -213,6 +289,18 @@ class COTEditProperties(ReadWriteCommand):
             self.vm.config_file_to_properties(self.config_file,
                                               self.user_configurable)
 
+        if self.properties_file is not None:
+            file_properties = self.read_properties_file()
+            new_keys = [key for (key, _) in file_properties
+                        if not self.vm.has_property(key)]
+            if new_keys:
+                self.ui.confirm_or_die(
+                    "{0} properties in {1} do not yet exist:\n{2}\n"
+                    "Create them?".format(len(new_keys), self.properties_file,
+                                          ", ".join(new_keys)))
+            self.vm.set_property_values(file_properties,
+                                        self.user_configurable)
+
         if self.properties:
             for index in range(0, len(self.properties)):
                 key, value, prop_type = self.properties[index]
@@ -234,7 +322,7 @@ class COTEditProperties(ReadWriteCommand):
             self.vm.environment_transports = self.transports
 
         if (not self.config_file and not self.properties and
-                not self.transports):
+                not self.properties_file and not self.transports):
             logger.info("No changes specified in CLI; "
                         "entering interactive mode.")
             # Interactive mode!
@@ -309,20 +397,25 @@ class COTEditProperties(ReadWriteCommand):
             usage=self.ui.fill_usage("edit-properties", [
                 "PACKAGE [-p KEY1=VALUE1 [-p KEY2=VALUE2 ...]] "
                 "[-l LABEL1 [-l LABEL2 ...]] [-d DESC1 [-d DESC2 ...]] "
-                "[-c CONFIG_FILE] [-u [USER_CONFIGURABLE]] "
+                "[-c CONFIG_FILE] [-f PROPERTIES_FILE] "
+                "[-u [USER_CONFIGURABLE]] "
                 "[-t TRANSPORT [TRANSPORT2 ...]] [-o OUTPUT]",
                 "PACKAGE [-u [USER_CONFIGURABLE]] [-o OUTPUT]",
             ]),
             formatter_class=argparse.RawDescriptionHelpFormatter,
             description="""
 Configure environment properties of the given OVF or OVA. The user may specify
-keys and values as command-line arguments or may provide a config-file to
-read from. If neither --config-file, --properties, nor --transport are given,
-the program will run interactively.""",
+keys and values as command-line arguments, may provide a config-file to
+read from, or may provide a properties-file of keys and values to set.
+If none of --config-file, --properties, --properties-file, or --transport
+are given, the program will run interactively.""",
             epilog=self.ui.fill_examples([
                 ("Add configuration from a text file and mark the resulting"
                  " properties as non-user-configurable.",
                  'cot edit-properties input.ovf -c config.txt -u=0'),
+                ("Set the values of many properties at once, from a JSON"
+                 " file or a text file of 'key=value' lines.",
+                 'cot edit-properties input.ovf -f values.json'),
                 ("Add/update two properties, one a string with no default"
                  " value and the other a boolean defaulting to true, and"
                  " mark both properties as user-configurable.",
@@ -345,6 +438,10 @@ the program will run interactively.""",
         group.add_argument('-o', '--output',
                            help="Name/path of new OVF/OVA package to create "
                            "instead of updating the existing OVF")
+        group.add_argument('--manifest-last', action='store_true',
+                           help="When writing an OVA, place the manifest "
+                           "at the end rather than second, so that each "
+                           "file is read only once")
 
         group = parser.add_argument_group("property setting options")
 
@@ -357,6 +454,11 @@ the program will run interactively.""",
             '-c', '--config-file',
             help="Read configuration CLI from this text file and generate"
             " generic properties for each line of CLI")
+        group.add_argument(
+            '-f', '--properties-file',
+            help="Read property keys and values from this file, which may"
+            " be a JSON object or a text file of 'key=value' lines, and"
+            " update or create each property accordingly")
         group.add_argument(
             '-p', '--properties', action='append', nargs='+',
             metavar=('KEY1[=VALUE1][+TYPE1]', 'K2[=V2][+T2]'),
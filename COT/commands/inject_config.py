@@ -280,6 +280,10 @@ be included as-is and will not be renamed.""")
         parser.add_argument('-o', '--output',
                             help="Name/path of new VM package to create "
                             "instead of updating the existing package")
+        parser.add_argument('--manifest-last', action='store_true',
+                            help="When writing an OVA, place the manifest "
+                            "at the end rather than second, so that each "
+                            "file is read only once")
 
         parser.add_argument(
             '-c', '--config-file',
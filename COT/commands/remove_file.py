@@ -136,6 +136,10 @@ Remove a file from the given OVF. Will prompt for confirmation unless
         group.add_argument('-o', '--output',
                            help="""Name/path of new OVF/OVA package to """
                            """create instead of updating the existing OVF""")
+        group.add_argument('--manifest-last', action='store_true',
+                           help="""When writing an OVA, place the manifest """
+                           """at the end rather than second, so that each """
+                           """file is read only once""")
 
         group = parser.add_argument_group("file selection options")
 
@@ -20,9 +20,11 @@ import logging
 import os
 import re
 
+import mock
+
 from COT.commands.tests.command_testcase import CommandTestCase
 from COT.commands.edit_properties import COTEditProperties
-from COT.data_validation import ValueUnsupportedError
+from COT.data_validation import ValueUnsupportedError, InvalidInputError
 
 
 class TestCOTEditProperties(CommandTestCase):
@@ -358,6 +360,116 @@ set!</ovf:Description>
         self.command.properties = ["hello=world"]
         self.assertRaises(NotImplementedError, self.command.run)
 
+    def test_properties_file_json(self):
+        """Set existing and new property values from a JSON file."""
+        self.command.package = self.input_ovf
+        path = os.path.join(self.temp_dir, "values.json")
+        with open(path, 'w') as fileobj:
+            fileobj.write('{"login-username": "admin", '
+                          '"enable-ssh-server": true, '
+                          '"new-property": 5}')
+        self.command.properties_file = path
+        self.command.run()
+        self.command.finished()
+        self.check_diff("""
+       <ovf:Category>1. Bootstrap Properties</ovf:Category>
+-      <ovf:Property ovf:key="login-username" ovf:qualifiers="MaxLen(64)" \
+ovf:type="string" ovf:userConfigurable="true" ovf:value="">
++      <ovf:Property ovf:key="login-username" ovf:qualifiers="MaxLen(64)" \
+ovf:type="string" ovf:userConfigurable="true" ovf:value="admin">
+         <ovf:Label>Login Username</ovf:Label>
+...
+       <ovf:Category>2. Features</ovf:Category>
+-      <ovf:Property ovf:key="enable-ssh-server" ovf:type="boolean" \
+ovf:userConfigurable="true" ovf:value="false">
++      <ovf:Property ovf:key="enable-ssh-server" ovf:type="boolean" \
+ovf:userConfigurable="true" ovf:value="true">
+         <ovf:Label>Enable SSH Login</ovf:Label>
+...
+       </ovf:Property>
++      <ovf:Property ovf:key="new-property" ovf:type="string" ovf:value="5" />
+     </ovf:ProductSection>
+""")
+
+    def test_properties_file_key_value(self):
+        """Set property values from a file of key=value lines."""
+        self.command.package = self.input_ovf
+        path = os.path.join(self.temp_dir, "values.txt")
+        with open(path, 'w') as fileobj:
+            fileobj.write("# Comment line\n"
+                          "\n"
+                          "login-username = admin\n"
+                          "enable-ssh-server=1\n")
+        self.command.properties_file = path
+        self.command.user_configurable = False
+        self.command.run()
+        self.command.finished()
+        self.check_diff("""
+       <ovf:Category>1. Bootstrap Properties</ovf:Category>
+-      <ovf:Property ovf:key="login-username" ovf:qualifiers="MaxLen(64)" \
+ovf:type="string" ovf:userConfigurable="true" ovf:value="">
++      <ovf:Property ovf:key="login-username" ovf:qualifiers="MaxLen(64)" \
+ovf:type="string" ovf:userConfigurable="false" ovf:value="admin">
+         <ovf:Label>Login Username</ovf:Label>
+...
+       <ovf:Category>2. Features</ovf:Category>
+-      <ovf:Property ovf:key="enable-ssh-server" ovf:type="boolean" \
+ovf:userConfigurable="true" ovf:value="false">
++      <ovf:Property ovf:key="enable-ssh-server" ovf:type="boolean" \
+ovf:userConfigurable="false" ovf:value="true">
+         <ovf:Label>Enable SSH Login</ovf:Label>
+""")
+
+    def test_properties_file_invalid(self):
+        """Invalid properties files are rejected without changing the VM."""
+        self.command.package = self.input_ovf
+        self.assertRaises(InvalidInputError, setattr, self.command,
+                          "properties_file", "/foo/bar.json")
+
+        path = os.path.join(self.temp_dir, "values.txt")
+        for contents in ["hostname\n", "=foo\n", "{bad json}",
+                         '{"hostname": null}', '{"hostname": ["a", "b"]}',
+                         '{"hostname": {"value": "a"}}']:
+            with open(path, 'w') as fileobj:
+                fileobj.write(contents)
+            self.command.properties_file = path
+            self.assertRaises(InvalidInputError, self.command.run)
+
+        # A single invalid value means that no values are set at all
+        with open(path, 'w') as fileobj:
+            fileobj.write("login-username=admin\n"
+                          "enable-ssh-server=maybe\n")
+        self.command.properties_file = path
+        self.assertRaises(ValueUnsupportedError, self.command.run)
+        self.assertEqual(self.command.vm.get_property_value("login-username"),
+                         "")
+
+    def test_properties_file_existing_no_value(self):
+        """A property with no value is not mistaken for a new property."""
+        self.command.package = self.input_ovf
+        self.command.vm.set_property_value("no-value", None)
+        path = os.path.join(self.temp_dir, "values.json")
+        with open(path, 'w') as fileobj:
+            fileobj.write('{"no-value": "hello", "new-property": "world"}')
+        self.command.properties_file = path
+        with mock.patch.object(self.command.ui, 'confirm_or_die') as confirm:
+            self.command.run()
+        confirm.assert_called_once_with(
+            "1 properties in {0} do not yet exist:\nnew-property\n"
+            "Create them?".format(path))
+        self.assertEqual(self.command.vm.get_property_value("no-value"),
+                         "hello")
+        self.command.finished()
+        with open(self.input_ovf) as fileobj:
+            input_count = len(re.findall(r'<ovf:Property ', fileobj.read()))
+        with open(self.temp_file) as fileobj:
+            output = fileobj.read()
+        # Each property is written exactly once, not duplicated
+        self.assertEqual(len(re.findall(r'<ovf:Property ', output)),
+                         input_count + 2)
+        for key in ("no-value", "new-property"):
+            self.assertEqual(output.count('ovf:key="{0}"'.format(key)), 1)
+
     def test_config_file_not_supported(self):
         """Platform doesn't support literal CLI configuration."""
         self.command.package = self.iosv_ovf
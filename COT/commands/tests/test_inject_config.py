@@ -116,7 +116,10 @@ class TestCOTInjectConfig(CommandTestCase):
         """Inject config file on an ISO."""
         self.command.package = self.input_ovf
         self.command.config_file = self.config_file
-        self.command.run()
+        # The ISO is created without any helper programs
+        with mock.patch('COT.helpers.helper.check_output') as mock_co:
+            self.command.run()
+            mock_co.assert_not_called()
         self.assertLogged(**self.OVERWRITING_DISK_ITEM)
         self.command.finished()
         config_iso = os.path.join(self.temp_dir, 'config.iso')
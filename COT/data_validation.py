@@ -38,8 +38,10 @@
   canonicalize_nic_subtype
   canonicalize_scsi_subtype
   check_for_conflict
+  checksum_hash
   device_address
   file_checksum
+  file_checksums
   mac_address
   match_or_die
   natural_sort
@@ -318,26 +320,71 @@ def check_for_conflict(label, refs):
     return obj
 
 
-def file_checksum(path_or_obj, checksum_type):
+def checksum_hash(checksum_type):
+    """Get a new hash object for computing the given type of checksum.
+
+    ::
+
+      >>> hash_obj = checksum_hash('md5')
+      >>> hash_obj.update(b'hello')
+      >>> hash_obj.hexdigest()
+      '5d41402abc4b2a76b9719d911017c592'
+      >>> checksum_hash('crc32')
+      Traceback (most recent call last):
+        ...
+      NotImplementedError: No support for generating checksum type crc32
+
+    Args:
+      checksum_type (str): Supported values are 'md5', 'sha1', 'sha256',
+        'sha512'.
+    Returns:
+      object: New :mod:`hashlib` hash object.
+    Raises:
+      NotImplementedError: if ``checksum_type`` is not supported.
+    """
+    if checksum_type == 'md5':
+        return hashlib.md5()
+    elif checksum_type == 'sha1':
+        return hashlib.sha1()
+    elif checksum_type == 'sha256':
+        return hashlib.sha256()
+    elif checksum_type == 'sha512':
+        return hashlib.sha512()
+    raise NotImplementedError(
+        "No support for generating checksum type {0}"
+        .format(checksum_type))
+
+
+def file_checksum(path_or_obj, checksum_type, blocksize=65536):
     """Get the checksum of the given file.
 
     Args:
       path_or_obj (str): File path to checksum OR an opened file object
       checksum_type (str): Supported values are 'md5', 'sha1', 'sha256'.
+      blocksize (int): Number of bytes to read from the file at a time.
     Returns:
       str: Hexadecimal file checksum
     """
-    # pylint: disable=redefined-variable-type
-    if checksum_type == 'md5':
-        hash_obj = hashlib.md5()
-    elif checksum_type == 'sha1':
-        hash_obj = hashlib.sha1()
-    elif checksum_type == 'sha256':
-        hash_obj = hashlib.sha256()
-    else:
-        raise NotImplementedError(
-            "No support for generating checksum type {0}"
-            .format(checksum_type))
+    return file_checksums(path_or_obj, [checksum_type],
+                          blocksize)[checksum_type]
+
+
+def file_checksums(path_or_obj, checksum_types, blocksize=65536):
+    """Get several different checksums of the given file in a single pass.
+
+    The file is read only once, with each block of data fed to all of the
+    requested hash functions in turn.
+
+    Args:
+      path_or_obj (str): File path to checksum OR an opened file object
+      checksum_types (list): Checksum types, as for :func:`checksum_hash`.
+      blocksize (int): Number of bytes to read from the file at a time.
+    Returns:
+      dict: Checksum type --> hexadecimal file checksum
+    """
+    hash_objs = dict((checksum_type, checksum_hash(checksum_type))
+                     for checksum_type in checksum_types)
+    updates = [hash_obj.update for hash_obj in hash_objs.values()]
 
     # Is it a file or do we need to open it?
     try:
@@ -346,19 +393,31 @@ def file_checksum(path_or_obj, checksum_type):
     except AttributeError:
         file_obj = open(path_or_obj, 'rb')
 
-    blocksize = 65536
-
     try:
-        while True:
-            buf = file_obj.read(blocksize)
-            if len(buf) == 0:
-                break
-            hash_obj.update(buf)
+        if hasattr(file_obj, 'readinto'):
+            # Reuse a single buffer rather than allocating one per read
+            buf = bytearray(blocksize)
+            view = memoryview(buf)
+            while True:
+                count = file_obj.readinto(buf)
+                if not count:
+                    break
+                data = view[:count]
+                for update in updates:
+                    update(data)
+        else:
+            while True:
+                buf = file_obj.read(blocksize)
+                if len(buf) == 0:
+                    break
+                for update in updates:
+                    update(buf)
     finally:
         if file_obj != path_or_obj:
             file_obj.close()
 
-    return hash_obj.hexdigest()
+    return dict((checksum_type, hash_obj.hexdigest())
+                for checksum_type, hash_obj in hash_objs.items())
 
 
 def mac_address(string):
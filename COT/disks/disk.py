@@ -15,6 +15,7 @@
 import logging
 import os
 import re
+import struct
 
 from COT.helpers import helpers, HelperError
 
@@ -27,6 +28,9 @@ class DiskRepresentation(object):
     disk_format = None
     """Disk format represented by this class."""
 
+    ISO_MAGIC_OFFSETS = (0x8001, 0x8801, 0x9001)
+    """Offsets at which an ISO 9660 volume descriptor may say ``CD001``."""
+
     @staticmethod
     def subclasses():
         """List of subclasses of DiskRepresentation.
@@ -53,6 +57,39 @@ class DiskRepresentation(object):
                      if subclass.disk_format == disk_format),
                     None)
 
+    @staticmethod
+    def detect_format(path):
+        """Identify the format of the given file from its contents, if we can.
+
+        This looks for the magic numbers of QCOW and QCOW2 images, sparse
+        VMDK extents, VMDK descriptor files, and ISO 9660 images, so it's
+        much cheaper than asking a helper program like ``qemu-img``.
+
+        Args:
+          path (str): Path to an existing file.
+
+        Returns:
+          str: Disk format such as 'iso', 'qcow2', or 'vmdk', or ``None`` if
+          the file has no recognizable header (as is the case for RAW
+          images and for any formats not listed above).
+        """
+        with open(path, 'rb') as fileobj:
+            header = fileobj.read(512)
+            if header[:4] == b'QFI\xfb':
+                (version,) = struct.unpack(">I", header[4:8].rjust(4, b'\0'))
+                return 'qcow2' if version >= 2 else 'qcow'
+            if header[:4] in (b'KDMV', b'COWD'):
+                # Sparse extent, possibly with an embedded descriptor
+                return 'vmdk'
+            if (header.startswith(b'# Disk DescriptorFile') or
+                    re.search(br'^\s*createType\s*=', header, re.MULTILINE)):
+                return 'vmdk'
+            for offset in DiskRepresentation.ISO_MAGIC_OFFSETS:
+                fileobj.seek(offset)
+                if fileobj.read(5) == b'CD001':
+                    return 'iso'
+        return None
+
     @staticmethod
     def from_file(path):
         """Get a DiskRepresentation instance appropriate to the given file.
@@ -69,6 +106,16 @@ class DiskRepresentation(object):
         """
         if not os.path.exists(path):
             raise IOError(2, "No such file or directory: {0}".format(path))
+        disk_format = DiskRepresentation.detect_format(path)
+        if disk_format is not None:
+            subclass = DiskRepresentation.class_for_format(disk_format)
+            if subclass is None:
+                raise NotImplementedError("No support for files of type '{0}'"
+                                          .format(disk_format))
+            logger.verbose("File %s is a %s, based on its header",
+                           path, disk_format)
+            return subclass(path)
+        # Nothing conclusive in the header, so ask each class to check.
         best_guess = None
         best_confidence = 0
         for subclass in DiskRepresentation.subclasses():
@@ -149,19 +196,55 @@ class DiskRepresentation(object):
     @property
     def capacity(self):
         """Capacity of this disk image, in bytes."""
-        # default implementation - qemu-img handles most types we need
         if self._capacity is None:
-            output = helpers['qemu-img'].call(['info', self.path])
-            match = re.search(r"(\d+) bytes", output)
-            if not match:
-                raise RuntimeError("Did not find byte count in the output "
-                                   "from qemu-img:\n{0}"
-                                   .format(output))
-            self._capacity = match.group(1)
+            capacity = self._read_capacity()
+            if capacity is None:
+                # Fall back to qemu-img, which handles most types we need
+                output = helpers['qemu-img'].call(['info', self.path])
+                match = re.search(r"(\d+) bytes", output)
+                if not match:
+                    raise RuntimeError("Did not find byte count in the output "
+                                       "from qemu-img:\n{0}"
+                                       .format(output))
+                capacity = match.group(1)
+            self._capacity = str(capacity)
             logger.debug("Disk %s capacity is %s bytes", self.path,
                          self._capacity)
         return self._capacity
 
+    def _read_capacity(self):
+        """Read the capacity of this disk image directly from the file.
+
+        Subclasses should implement this for their disk format if possible,
+        so that :attr:`capacity` doesn't need to run ``qemu-img``.
+
+        Returns:
+          int: Capacity in bytes, or ``None`` if not determined.
+        """
+        return None
+
+    def iter_data(self, block_size):
+        """Read the guest-visible contents of this disk image.
+
+        Subclasses should implement this for their disk format if possible,
+        so that conversions from this format can be done without helpers.
+        Any validation of the image should be done before returning, so that
+        errors are raised by this call rather than during iteration.
+
+        Args:
+          block_size (int): Preferred size, in bytes, of each piece of data.
+
+        Returns:
+          iterator: ``(offset, length, data)`` tuples in increasing order of
+          offset, where ``data`` is ``None`` for a run of zeros. Any range
+          not covered by these tuples also reads as zeros.
+
+        Raises:
+          NotImplementedError: if this disk format cannot be read natively.
+        """
+        raise NotImplementedError("Unable to read {0} image data natively"
+                                  .format(self.disk_format))
+
     @property
     def files(self):
         """List of files embedded in this disk image."""
@@ -234,6 +317,10 @@ class DiskRepresentation(object):
             raise HelperError(2, "No such file or directory: '{0}'"
                               .format(path))
 
+        disk_format = cls.detect_format(path)
+        if disk_format is not None:
+            return 100 if disk_format == cls.disk_format else 0
+
         # Default implementation using qemu-img
         logger.debug("Using 'qemu-img' to check whether %s is a %s",
                      path, cls.disk_format)
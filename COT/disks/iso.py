@@ -10,17 +10,478 @@
 # of COT, including this file, may be copied, modified, propagated, or
 # distributed except according to the terms contained in the LICENSE.txt file.
 
-"""Handling of ISO files."""
+"""Handling of ISO files.
+
+**Classes and functions**
+
+.. autosummary::
+  :nosignatures:
+
+  ISO
+  write_iso
+"""
 
 import logging
 import os
 import re
+import stat
+import struct
+import time
 
 from COT.disks.disk import DiskRepresentation
 from COT.helpers import helpers, HelperError, helper_select
+from COT.tar_file import COPY_BLOCK_SIZE
 
 logger = logging.getLogger(__name__)
 
+SECTOR_SIZE = 2048
+"""Size of an ISO 9660 logical sector, in bytes."""
+
+SUSP_ROCK_RIDGE_SIGNATURES = (b'RR', b'PX', b'PN', b'SL', b'NM', b'TF', b'ER')
+"""System Use Sharing Protocol entries that indicate Rock Ridge extensions."""
+
+ISO_PADDING_SECTORS = 150
+"""Zero sectors appended to each ISO we write, as ``mkisofs -pad`` does."""
+
+ISO_MAX_DEPTH = 8
+"""Maximum directory depth permitted by ISO 9660."""
+
+ISO_MAX_RECORD_LENGTH = 255
+"""Maximum length of an ISO 9660 directory record, in bytes."""
+
+# Rock Ridge "RR" entry flags
+RR_PX = 1 << 0
+RR_NM = 1 << 3
+RR_TF = 1 << 7
+
+RRIP_ID = b'RRIP_1991A'
+RRIP_DESCRIPTOR = (b'THE ROCK RIDGE INTERCHANGE PROTOCOL PROVIDES SUPPORT '
+                   b'FOR POSIX FILE SYSTEM SEMANTICS')
+RRIP_SOURCE = (b'PLEASE CONTACT DISC PUBLISHER FOR SPECIFICATION SOURCE.  '
+               b'SEE PUBLISHER IDENTIFIER IN PRIMARY VOLUME DESCRIPTOR FOR '
+               b'CONTACT INFORMATION.')
+
+
+def _both_endian16(value):
+    """Encode a 16-bit value in both byte orders, as ISO 9660 requires."""
+    return struct.pack("<H", value) + struct.pack(">H", value)
+
+
+def _both_endian32(value):
+    """Encode a 32-bit value in both byte orders, as ISO 9660 requires."""
+    return struct.pack("<I", value) + struct.pack(">I", value)
+
+
+def _record_date(timestamp):
+    """Encode a timestamp in the 7-byte directory record format."""
+    gmt = time.gmtime(timestamp)
+    return struct.pack("7B", gmt.tm_year - 1900, gmt.tm_mon, gmt.tm_mday,
+                       gmt.tm_hour, gmt.tm_min, gmt.tm_sec, 0)
+
+
+def _volume_date(timestamp):
+    """Encode a timestamp in the 17-byte volume descriptor format."""
+    return (time.strftime("%Y%m%d%H%M%S00", time.gmtime(timestamp))
+            .encode('ascii') + b'\0')
+
+
+def _pad_sector(data):
+    """Pad the given data to a whole number of sectors."""
+    return data + b'\0' * (-len(data) % SECTOR_SIZE)
+
+
+class _ISONode(object):
+    """A file or directory to be written into an ISO image."""
+
+    def __init__(self, name, source, parent, timestamp=None):
+        """Create a node for the given file or directory.
+
+        Args:
+          name (str): Name of this file or directory (as Rock Ridge name).
+          source (str): Path to the file or directory, or ``None`` for
+            an empty directory such as the root directory.
+          parent (_ISONode): Parent directory, or ``None`` for the root.
+          timestamp (float): Modification time, if ``source`` is ``None``.
+        """
+        self.name = name
+        self.source = source
+        self.parent = parent
+        self.children = []
+        self.depth = 1 if parent is None else parent.depth + 1
+        if source is None:
+            self.is_dir = True
+            self.size = 0
+            self.mtime = timestamp
+            self.mode = stat.S_IFDIR | 0o555
+        else:
+            stat_result = os.stat(source)
+            self.is_dir = stat.S_ISDIR(stat_result.st_mode)
+            self.size = 0 if self.is_dir else stat_result.st_size
+            self.mtime = stat_result.st_mtime
+            # As with 'mkisofs -r', everything is readable, nothing is
+            # writable, and anything executable by anyone is executable
+            # by everyone.
+            if self.is_dir:
+                self.mode = stat.S_IFDIR | 0o555
+            elif stat_result.st_mode & 0o111:
+                self.mode = stat.S_IFREG | 0o555
+            else:
+                self.mode = stat.S_IFREG | 0o444
+        self.identifier = b'\0'
+        self.sort_key = ()
+        self.extent = 0
+        self.data_length = 0
+        self.number = 0
+
+    @property
+    def nlink(self):
+        """Get the number of hard links to this node, for Rock Ridge PX."""
+        if not self.is_dir:
+            return 1
+        return 2 + len([child for child in self.children if child.is_dir])
+
+
+class _ISOImage(object):
+    """Layout and contents of an ISO 9660 image being written."""
+
+    def __init__(self, files, rock_ridge=True, volume_id="CDROM"):
+        """Lay out an ISO image containing the given files.
+
+        Args:
+          files (list): Paths to files to put into the root directory,
+            or to directories whose contents go into the root directory.
+          rock_ridge (bool): Whether to include Rock Ridge extensions.
+          volume_id (str): Volume identifier.
+
+        Raises:
+          ValueError: if two files would have the same name.
+          NotImplementedError: if the files can't be represented in the
+            subset of ISO 9660 that we support, such as directories
+            nested too deeply or file names too long for a single
+            directory record.
+        """
+        self.rock_ridge = rock_ridge
+        self.volume_id = volume_id
+        self.timestamp = time.time()
+        self.root = _ISONode("", None, None, self.timestamp)
+        for path in files:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    self._add(self.root, os.path.join(path, name))
+            else:
+                self._add(self.root, path)
+
+        # Directories in path table order - breadth-first by sorted name
+        self.directories = [self.root]
+        for directory in self.directories:
+            directory.children.sort(key=lambda child: child.sort_key)
+            self.directories.extend(child for child in directory.children
+                                    if child.is_dir)
+        self.files = [child for directory in self.directories
+                      for child in directory.children if not child.is_dir]
+
+        self.path_table = self._path_table_size()
+        sector = 18
+        self.l_path_table = sector
+        sector += -(-self.path_table // SECTOR_SIZE)
+        self.m_path_table = sector
+        sector += -(-self.path_table // SECTOR_SIZE)
+        # Continuation area goes after the directories, as streaming readers
+        # such as libarchive don't look backwards for it
+        self.continuation = 0
+        for (number, directory) in enumerate(self.directories, 1):
+            directory.number = number
+            directory.extent = sector
+            directory.data_length = len(self._directory_data(directory))
+            sector += directory.data_length // SECTOR_SIZE
+        if self.rock_ridge:
+            self.continuation = sector
+            sector += 1
+        for node in self.files:
+            if node.size:
+                node.extent = sector
+                node.data_length = node.size
+                sector += -(-node.size // SECTOR_SIZE)
+        self.volume_space_size = sector + ISO_PADDING_SECTORS
+
+    def _add(self, parent, path):
+        """Add the given file or directory (recursively) to the image.
+
+        Args:
+          parent (_ISONode): Parent directory node.
+          path (str): Path to file or directory to add.
+
+        Raises:
+          ValueError: if a file of the same name already exists.
+          NotImplementedError: if the directory depth is excessive.
+        """
+        name = os.path.basename(os.path.normpath(path))
+        if any(child.name == name for child in parent.children):
+            raise ValueError("Multiple files named '{0}' cannot be put into "
+                             "the same directory of an ISO".format(name))
+        node = _ISONode(name, path, parent)
+        (node.identifier, node.sort_key) = self._iso_identifier(
+            name, node.is_dir,
+            set(child.identifier for child in parent.children))
+        parent.children.append(node)
+        if node.is_dir:
+            if node.depth > ISO_MAX_DEPTH:
+                raise NotImplementedError(
+                    "Directory '{0}' is nested more than {1} levels deep"
+                    .format(path, ISO_MAX_DEPTH))
+            for child in sorted(os.listdir(path)):
+                self._add(node, os.path.join(path, child))
+
+    @staticmethod
+    def _iso_identifier(name, is_dir, taken):
+        """Construct a unique ISO 9660 (level 2) identifier for a file name.
+
+        As with ``mkisofs -full-iso9660-filenames -allow-lowercase``,
+        identifiers may be up to 31 characters long and may be lowercase.
+
+        Args:
+          name (str): Original file name.
+          is_dir (bool): Whether this is a directory.
+          taken (set): Identifiers already used in this directory.
+
+        Returns:
+          tuple: (identifier bytes, sort key)
+        """
+        name = re.sub(r'[^A-Za-z0-9_.]', '_', name)
+        if is_dir:
+            (base, ext) = (name.replace('.', '_'), None)
+        elif '.' in name:
+            (base, ext) = name.rsplit('.', 1)
+            (base, ext) = (base.replace('.', '_'), ext[:29])
+        else:
+            (base, ext) = (name, '')
+        suffix = ''
+        counter = 0
+        while True:
+            if is_dir:
+                candidate = base[:31 - len(suffix)] + suffix
+                identifier = candidate.encode('ascii')
+            else:
+                # Shorten the extension too, if needed to fit the suffix
+                ext = ext[:30 - len(suffix)]
+                limit = 30 - len(ext)
+                candidate = base[:max(0, limit - len(suffix))] + suffix
+                identifier = "{0}.{1};1".format(candidate, ext).encode('ascii')
+            if identifier not in taken:
+                return (identifier, (candidate, ext or ''))
+            suffix = "{0:03d}".format(counter)
+            counter += 1
+
+    def _path_table_size(self):
+        """Size of each path table, in bytes."""
+        return sum(8 + len(directory.identifier) +
+                   len(directory.identifier) % 2
+                   for directory in self.directories)
+
+    def _path_table(self, fmt):
+        """Construct a path table.
+
+        Args:
+          fmt (str): '<' for the type L table, '>' for the type M table.
+
+        Returns:
+          bytes: Path table, padded to whole sectors.
+        """
+        data = b''
+        for directory in self.directories:
+            identifier = directory.identifier
+            parent = directory.parent or directory
+            data += (struct.pack(fmt + "BBIH", len(identifier), 0,
+                                 directory.extent, parent.number) +
+                     identifier + b'\0' * (len(identifier) % 2))
+        return _pad_sector(data)
+
+    def _system_use(self, node, entry_type):
+        """Construct the Rock Ridge System Use area of a directory record.
+
+        Args:
+          node (_ISONode): File or directory described by the record.
+          entry_type (str): 'root' for the root directory's "." record,
+            'self' or 'parent' for other "." and ".." records, and
+            'child' for all other records.
+
+        Returns:
+          bytes: System Use area, possibly empty.
+        """
+        if not self.rock_ridge:
+            return b''
+        data = b''
+        flags = RR_PX | RR_TF
+        if entry_type == 'root':
+            data += b'SP' + struct.pack("BB", 7, 1) + b'\xbe\xef\0'
+        if entry_type == 'child':
+            flags |= RR_NM
+        data += b'RR' + struct.pack("BBB", 5, 1, flags)
+        if entry_type == 'child':
+            name = node.name.encode('utf-8')
+            data += b'NM' + struct.pack("BBB", 5 + len(name), 1, 0) + name
+        data += (b'PX' + struct.pack("BB", 36, 1) +
+                 _both_endian32(node.mode) + _both_endian32(node.nlink) +
+                 _both_endian32(0) + _both_endian32(0))
+        data += (b'TF' + struct.pack("BBB", 26, 1, 0x0e) +
+                 _record_date(node.mtime) * 3)
+        if entry_type == 'root':
+            data += (b'CE' + struct.pack("BB", 28, 1) +
+                     _both_endian32(self.continuation) + _both_endian32(0) +
+                     _both_endian32(len(self._continuation_area())))
+        return data
+
+    @staticmethod
+    def _continuation_area():
+        """Construct the SUSP "ER" entry identifying Rock Ridge."""
+        return (b'ER' +
+                struct.pack("BBBBBB", 8 + len(RRIP_ID) + len(RRIP_DESCRIPTOR) +
+                            len(RRIP_SOURCE), 1, len(RRIP_ID),
+                            len(RRIP_DESCRIPTOR), len(RRIP_SOURCE), 1) +
+                RRIP_ID + RRIP_DESCRIPTOR + RRIP_SOURCE)
+
+    @staticmethod
+    def _directory_record(node, identifier, system_use):
+        """Construct a directory record.
+
+        Args:
+          node (_ISONode): File or directory described by the record.
+          identifier (bytes): File identifier.
+          system_use (bytes): System Use area.
+
+        Returns:
+          bytes: Directory record.
+
+        Raises:
+          NotImplementedError: if the record would be too long.
+        """
+        padding = b'\0' * (1 - len(identifier) % 2)
+        length = 33 + len(identifier) + len(padding) + len(system_use)
+        system_use += b'\0' * (length % 2)
+        length += length % 2
+        if length > ISO_MAX_RECORD_LENGTH:
+            raise NotImplementedError("File name '{0}' is too long"
+                                      .format(node.name))
+        return (struct.pack("BB", length, 0) +
+                _both_endian32(node.extent) +
+                _both_endian32(node.data_length) +
+                _record_date(node.mtime) +
+                struct.pack("BBB", 2 if node.is_dir else 0, 0, 0) +
+                _both_endian16(1) +
+                struct.pack("B", len(identifier)) + identifier + padding +
+                system_use)
+
+    def _directory_data(self, directory):
+        """Construct the contents of a directory.
+
+        Args:
+          directory (_ISONode): Directory to construct.
+
+        Returns:
+          bytes: Directory records, padded to whole sectors.
+        """
+        parent = directory.parent or directory
+        records = [
+            self._directory_record(
+                directory, b'\0', self._system_use(
+                    directory, 'root' if parent is directory else 'self')),
+            self._directory_record(
+                parent, b'\1', self._system_use(parent, 'parent')),
+        ] + [self._directory_record(child, child.identifier,
+                                    self._system_use(child, 'child'))
+             for child in directory.children]
+        data = b''
+        for record in records:
+            # Records may not span sector boundaries
+            if len(data) % SECTOR_SIZE + len(record) > SECTOR_SIZE:
+                data = _pad_sector(data)
+            data += record
+        return _pad_sector(data)
+
+    def _primary_volume_descriptor(self):
+        """Construct the Primary Volume Descriptor."""
+        return _pad_sector(
+            b'\1CD001\1\0' +
+            b' ' * 32 +
+            self.volume_id.upper().encode('ascii')[:32].ljust(32) +
+            b'\0' * 8 +
+            _both_endian32(self.volume_space_size) +
+            b'\0' * 32 +
+            _both_endian16(1) +
+            _both_endian16(1) +
+            _both_endian16(SECTOR_SIZE) +
+            _both_endian32(self.path_table) +
+            struct.pack("<II", self.l_path_table, 0) +
+            struct.pack(">II", self.m_path_table, 0) +
+            self._directory_record(self.root, b'\0', b'') +
+            b' ' * 128 * 3 +
+            b'COMMON OVF TOOL (COT)'.ljust(128) +
+            b' ' * 37 * 3 +
+            _volume_date(self.timestamp) * 2 +
+            b'0' * 16 + b'\0' +
+            b'0' * 16 + b'\0' +
+            b'\1')
+
+    def write(self, fileobj):
+        """Write the ISO image.
+
+        Args:
+          fileobj (file): File object to write to.
+        """
+        fileobj.write(b'\0' * 16 * SECTOR_SIZE)
+        fileobj.write(self._primary_volume_descriptor())
+        fileobj.write(_pad_sector(b'\xffCD001\1'))
+        fileobj.write(self._path_table("<"))
+        fileobj.write(self._path_table(">"))
+        for directory in self.directories:
+            fileobj.write(self._directory_data(directory))
+        if self.rock_ridge:
+            fileobj.write(_pad_sector(self._continuation_area()))
+        for node in self.files:
+            if not node.size:
+                continue
+            remaining = node.size
+            with open(node.source, 'rb') as source:
+                while remaining > 0:
+                    data = source.read(min(COPY_BLOCK_SIZE, remaining))
+                    if not data:
+                        # File shrank since we looked at it
+                        data = b'\0' * remaining
+                    fileobj.write(data)
+                    remaining -= len(data)
+            fileobj.write(b'\0' * (-node.size % SECTOR_SIZE))
+        fileobj.write(b'\0' * ISO_PADDING_SECTORS * SECTOR_SIZE)
+
+
+def write_iso(output, files, rock_ridge=True, volume_id="CDROM"):
+    """Write an ISO 9660 (level 2) image, optionally with Rock Ridge.
+
+    This provides the subset of ``mkisofs -iso-level 2 -r`` functionality
+    that COT needs, without any helper programs. Each of ``files`` that is
+    a directory has its contents, rather than itself, placed into the root
+    directory of the image, as with ``mkisofs``.
+
+    Args:
+      output (object): Path to write the image to, or a file object
+        (such as :class:`io.BytesIO`) to write it into.
+      files (list): Files and/or directories to include.
+      rock_ridge (bool): Whether to include Rock Ridge extensions.
+      volume_id (str): Volume identifier.
+
+    Raises:
+      ValueError: if two files would have the same name.
+      NotImplementedError: if the files can't be represented in the
+        subset of ISO 9660 that we support. Nothing is written in this case.
+    """
+    image = _ISOImage(files, rock_ridge=rock_ridge, volume_id=volume_id)
+    if hasattr(output, 'write'):
+        image.write(output)
+        return
+    with open(output, 'wb') as fileobj:
+        image.write(fileobj)
+    logger.verbose("Wrote ISO image %s (%d sectors)",
+                   output, image.volume_space_size)
+
 
 class ISO(DiskRepresentation):
     """ISO 9660 disk image file representation."""
@@ -37,14 +498,94 @@ class ISO(DiskRepresentation):
         - "rockridge" - has Rock Ridge extensions
         """
         if self._disk_subformat is None:
-            output = helpers['isoinfo'].call(['-i', self.path, '-d'])
-            if re.search(r"Rock Ridge.*found", output):
-                self._disk_subformat = "rockridge"
-            else:
-                # At this time we don't care about Joliet extensions
-                self._disk_subformat = ""
+            rock_ridge = self._read_rock_ridge()
+            if rock_ridge is None:
+                output = helpers['isoinfo'].call(['-i', self.path, '-d'])
+                rock_ridge = bool(re.search(r"Rock Ridge.*found", output))
+            # At this time we don't care about Joliet extensions
+            self._disk_subformat = "rockridge" if rock_ridge else ""
         return self._disk_subformat
 
+    def _primary_volume_descriptor(self, fileobj):
+        """Find and read the Primary Volume Descriptor of this ISO.
+
+        Args:
+          fileobj (file): Open file object for this ISO.
+
+        Returns:
+          bytes: Contents of the PVD, or ``None`` if not found.
+        """
+        # Volume descriptors start at sector 16 and are terminated
+        # by a descriptor of type 255.
+        sector = 16
+        while True:
+            fileobj.seek(sector * SECTOR_SIZE)
+            descriptor = fileobj.read(SECTOR_SIZE)
+            if (len(descriptor) < SECTOR_SIZE or
+                    descriptor[1:6] != b'CD001' or
+                    descriptor[0:1] == b'\xff'):
+                logger.warning("No Primary Volume Descriptor found in %s",
+                               self.path)
+                return None
+            if descriptor[0:1] == b'\x01':
+                return descriptor
+            sector += 1
+
+    def _read_capacity(self):
+        """Read the volume size from the Primary Volume Descriptor.
+
+        Returns:
+          int: Capacity in bytes, or ``None`` if not determined.
+        """
+        with open(self.path, 'rb') as fileobj:
+            pvd = self._primary_volume_descriptor(fileobj)
+        if pvd is None:
+            return None
+        # Both-endian fields; we use the little-endian half of each
+        (volume_space_size,) = struct.unpack("<I", pvd[80:84])
+        (logical_block_size,) = struct.unpack("<H", pvd[128:130])
+        return volume_space_size * logical_block_size
+
+    def _read_rock_ridge(self):
+        """Check the root directory record for Rock Ridge extensions.
+
+        Rock Ridge entries are carried in the System Use area of each
+        directory record, starting with a SUSP "SP" entry in the
+        root directory's "." record.
+
+        Returns:
+          bool: Whether Rock Ridge extensions are present, or ``None``
+          if the ISO structure could not be parsed.
+        """
+        with open(self.path, 'rb') as fileobj:
+            pvd = self._primary_volume_descriptor(fileobj)
+            if pvd is None:
+                return None
+            (extent,) = struct.unpack("<I", pvd[158:162])
+            (logical_block_size,) = struct.unpack("<H", pvd[128:130])
+            fileobj.seek(extent * logical_block_size)
+            record = bytearray(fileobj.read(255))
+        if not record or len(record) < record[0] or record[0] < 34:
+            logger.warning("Invalid root directory record in %s", self.path)
+            return None
+        record = record[:record[0]]
+        name_length = record[32]
+        # The file identifier is padded to an even offset
+        offset = 33 + name_length + (1 - name_length % 2)
+        system_use = bytes(record[offset:])
+        if system_use[:2] != b'SP' or system_use[4:6] != b'\xbe\xef':
+            return False
+        offset = 0
+        while offset + 4 <= len(system_use):
+            signature = system_use[offset:offset + 2]
+            length = bytearray(system_use[offset + 2:offset + 3])[0]
+            if signature in SUSP_ROCK_RIDGE_SIGNATURES:
+                return True
+            if length < 4:
+                break
+            offset += length
+        return False
+
     @property
     def files(self):
         """Get the list of files contained in this ISO."""
@@ -92,6 +633,13 @@ class ISO(DiskRepresentation):
         """
         if not files:
             raise RuntimeError("Unable to create an empty ISO file")
+        try:
+            write_iso(path, files,
+                      rock_ridge=(disk_subformat == 'rockridge'))
+            return
+        except NotImplementedError as exc:
+            logger.info("Unable to create ISO natively (%s); "
+                        "using a helper program instead", exc)
         # We can use mkisofs, genisoimage, or xorriso, and fortunately
         # all three take similar parameters
         args = ['-output', path, '-full-iso9660-filenames',
@@ -120,22 +668,9 @@ class ISO(DiskRepresentation):
         if not os.path.exists(path):
             raise HelperError(2, "No such file or directory: '{0}'"
                               .format(path))
-        if helpers['isoinfo']:
-            logger.debug("Using 'isoinfo' to check whether %s is an ISO", path)
-            try:
-                helpers['isoinfo'].call(['-i', path, '-d'])
-                return 100
-            except HelperError:
-                # Not an ISO
-                return 0
-
-        # else, try to detect ISO files by file magic number
-        with open(path, 'rb') as fileobj:
-            for offset in (0x8001, 0x8801, 0x9001):
-                fileobj.seek(offset)
-                magic = fileobj.read(5).decode('ascii', 'ignore')
-                if magic == "CD001":
-                    return 100
+        # An ISO always has a volume descriptor, so no need for isoinfo
+        if cls.detect_format(path) == cls.disk_format:
+            return 100
         return 0
 
     @classmethod
@@ -12,17 +12,216 @@
 
 """Handling of QCOW2 files."""
 
+import logging
 import os
+import struct
+import zlib
 
 from COT.disks.disk import DiskRepresentation
 from COT.helpers import helpers, helper_select
 
+logger = logging.getLogger(__name__)
+
+QCOW2_OFFSET_MASK = 0x00fffffffffffe00
+QCOW2_COMPRESSED = 1 << 62
+QCOW2_INCOMPAT_DIRTY = 1 << 0
+
 
 class QCOW2(DiskRepresentation):
     """QCOW2 disk image file representation."""
 
     disk_format = "qcow2"
 
+    def _read_capacity(self):
+        """Read the virtual disk size from the QCOW2 header.
+
+        Returns:
+          int: Capacity in bytes, or ``None`` if the header is not valid.
+        """
+        with open(self.path, 'rb') as fileobj:
+            header = fileobj.read(32)
+        if len(header) < 32 or header[:4] != b'QFI\xfb':
+            logger.warning("File %s does not have a valid QCOW2 header",
+                           self.path)
+            return None
+        (size,) = struct.unpack(">Q", header[24:32])
+        return size
+
+    def _read_header(self):
+        """Read and validate the QCOW2 header for :meth:`iter_data`.
+
+        Returns:
+          dict: Header fields needed to read the image.
+
+        Raises:
+          RuntimeError: if the header is not valid.
+          NotImplementedError: if the image uses QCOW2 features that we
+            can't read natively, such as a backing file or encryption.
+        """
+        with open(self.path, 'rb') as fileobj:
+            header = fileobj.read(104)
+        if len(header) < 72 or header[:4] != b'QFI\xfb':
+            raise RuntimeError("File {0} does not have a valid QCOW2 header"
+                               .format(self.path))
+        (version, backing_file_offset, _, cluster_bits, size, crypt_method,
+         l1_size, l1_table_offset) = struct.unpack(">IQIIQIIQ", header[4:48])
+        if version not in (2, 3):
+            raise NotImplementedError("QCOW2 version {0} of {1} is not "
+                                      "supported".format(version, self.path))
+        if backing_file_offset:
+            raise NotImplementedError("QCOW2 image {0} has a backing file, "
+                                      "which is not supported"
+                                      .format(self.path))
+        if crypt_method:
+            raise NotImplementedError("QCOW2 image {0} is encrypted, which is "
+                                      "not supported".format(self.path))
+        if not 9 <= cluster_bits <= 21:
+            raise RuntimeError("QCOW2 image {0} has invalid cluster_bits {1}"
+                               .format(self.path, cluster_bits))
+        if version == 3:
+            if len(header) < 104:
+                raise RuntimeError("File {0} does not have a valid QCOW2 "
+                                   "version 3 header".format(self.path))
+            (incompatible_features,) = struct.unpack(">Q", header[72:80])
+            # Bit 0 (dirty) only concerns refcounts, which we don't need
+            if incompatible_features & ~QCOW2_INCOMPAT_DIRTY:
+                raise NotImplementedError(
+                    "QCOW2 image {0} uses unsupported incompatible features "
+                    "(0x{1:x}), such as an external data file or a "
+                    "compression type other than zlib"
+                    .format(self.path, incompatible_features))
+        return {
+            'version': version,
+            'cluster_bits': cluster_bits,
+            'size': size,
+            'l1_size': l1_size,
+            'l1_table_offset': l1_table_offset,
+        }
+
+    def iter_data(self, block_size):
+        """Read the contents of this QCOW2 image directly from its tables.
+
+        Unallocated and zero clusters are reported as runs of zeros without
+        reading anything; contiguous uncompressed clusters are read in
+        pieces of up to ``block_size`` bytes, and compressed clusters are
+        decompressed one at a time.
+
+        For the parameters, see :meth:`DiskRepresentation.iter_data`.
+
+        Raises:
+          RuntimeError: if the header is not valid.
+          NotImplementedError: if the image uses QCOW2 features that we
+            can't read natively, such as a backing file or encryption.
+        """
+        return self._iter_data(self._read_header(), block_size)
+
+    def _iter_clusters(self, fileobj, header):
+        """Walk the L1 and L2 tables of this image.
+
+        Args:
+          fileobj (file): Open file object for this image.
+          header (dict): As returned by :meth:`_read_header`.
+
+        Yields:
+          tuple: ``(offset, length, host_offset, compressed_length)`` for
+          each cluster, or range of clusters reading as zeros, in order.
+          ``host_offset`` is ``None`` for zeros, and ``compressed_length``
+          is ``None`` unless the cluster is compressed.
+        """
+        cluster_bits = header['cluster_bits']
+        cluster_size = 1 << cluster_bits
+        size = header['size']
+        l2_entries = cluster_size // 8
+        compressed_shift = 62 - (cluster_bits - 8)
+        compressed_offset_mask = (1 << compressed_shift) - 1
+        compressed_sectors_mask = (1 << (cluster_bits - 8)) - 1
+        zero_flag = 1 if header['version'] >= 3 else 0
+
+        fileobj.seek(header['l1_table_offset'])
+        l1_size = min(header['l1_size'],
+                      -(-size // (cluster_size * l2_entries)))
+        l1_table = struct.unpack(">{0}Q".format(l1_size),
+                                 fileobj.read(8 * l1_size))
+        for (l1_index, l1_entry) in enumerate(l1_table):
+            offset = l1_index * l2_entries * cluster_size
+            l2_offset = l1_entry & QCOW2_OFFSET_MASK
+            if not l2_offset:
+                yield (offset, min(l2_entries * cluster_size, size - offset),
+                       None, None)
+                continue
+            fileobj.seek(l2_offset)
+            l2_table = struct.unpack(">{0}Q".format(l2_entries),
+                                     fileobj.read(cluster_size))
+            for l2_entry in l2_table:
+                if offset >= size:
+                    return
+                length = min(cluster_size, size - offset)
+                if l2_entry & QCOW2_COMPRESSED:
+                    host_offset = l2_entry & compressed_offset_mask
+                    sectors = ((l2_entry >> compressed_shift) &
+                               compressed_sectors_mask) + 1
+                    yield (offset, length, host_offset,
+                           sectors * 512 - (host_offset & 511))
+                elif (l2_entry & zero_flag or
+                      not l2_entry & QCOW2_OFFSET_MASK):
+                    yield (offset, length, None, None)
+                else:
+                    yield (offset, length, l2_entry & QCOW2_OFFSET_MASK, None)
+                offset += cluster_size
+
+    def _iter_data(self, header, block_size):
+        """Yield the contents of this image for :meth:`iter_data`.
+
+        Args:
+          header (dict): As returned by :meth:`_read_header`.
+          block_size (int): Preferred size of each read, in bytes.
+
+        Yields:
+          tuple: ``(offset, length, data)``
+        """
+        cluster_size = 1 << header['cluster_bits']
+        with open(self.path, 'rb') as fileobj:
+
+            def read_run(run):
+                """Read a run of contiguous clusters, if any."""
+                if run is None:
+                    return None
+                (offset, host_offset, length) = run
+                if host_offset is None:
+                    return (offset, length, None)
+                fileobj.seek(host_offset)
+                return (offset, length,
+                        fileobj.read(length).ljust(length, b'\0'))
+
+            run = None
+            for (offset, length, host_offset, compressed_length) in \
+                    self._iter_clusters(fileobj, header):
+                if compressed_length is not None:
+                    item = read_run(run)
+                    if item:
+                        yield item
+                    run = None
+                    fileobj.seek(host_offset)
+                    # Compressed clusters are raw deflate streams
+                    data = zlib.decompressobj(-15).decompress(
+                        fileobj.read(compressed_length), cluster_size)
+                    yield (offset, length, data[:length].ljust(length, b'\0'))
+                    continue
+                if run is not None and run[0] + run[2] == offset and (
+                        (host_offset is None and run[1] is None) or
+                        (host_offset is not None and run[1] is not None and
+                         run[1] + run[2] == host_offset and
+                         run[2] + length <= max(block_size, cluster_size))):
+                    run[2] += length
+                    continue
+                item = read_run(run)
+                if item:
+                    yield item
+                run = [offset, host_offset, length]
+            item = read_run(run)
+            if item:
+                yield item
+
     @classmethod
     def from_other_image(cls, input_image, output_dir, output_subformat=None):
         """Convert the other disk image into an image of this type.
@@ -17,6 +17,7 @@ import os
 import re
 
 from COT.disks.disk import DiskRepresentation
+from COT.tar_file import COPY_BLOCK_SIZE
 from COT.helpers import helpers, helper_select
 
 logger = logging.getLogger(__name__)
@@ -55,6 +56,39 @@ class RAW(DiskRepresentation):
             self._files = result
         return self._files
 
+    def _read_capacity(self):
+        """Get the capacity of a RAW image, which is simply its size.
+
+        Returns:
+          int: Capacity in bytes.
+        """
+        return os.path.getsize(self.path)
+
+    def iter_data(self, block_size):
+        """Read the contents of this RAW image one block at a time.
+
+        For the parameters, see :meth:`DiskRepresentation.iter_data`.
+        """
+        return self._iter_data(block_size)
+
+    def _iter_data(self, block_size):
+        """Yield the contents of this image for :meth:`iter_data`.
+
+        Args:
+          block_size (int): Number of bytes to read at a time.
+
+        Yields:
+          tuple: ``(offset, length, data)``
+        """
+        offset = 0
+        with open(self.path, 'rb') as fileobj:
+            while True:
+                data = fileobj.read(block_size)
+                if not data:
+                    break
+                yield (offset, len(data), data)
+                offset += len(data)
+
     @classmethod
     def file_is_this_type(cls, path):
         """Whether this file is a RAW image.
@@ -134,6 +168,22 @@ class RAW(DiskRepresentation):
         file_name = os.path.basename(input_image.path)
         file_prefix, _ = os.path.splitext(file_name)
         output_path = os.path.join(output_dir, file_prefix + ".img")
+        try:
+            runs = input_image.iter_data(COPY_BLOCK_SIZE)
+        except NotImplementedError:
+            runs = None
+        if runs is not None:
+            logger.verbose("Copying contents of %s to %s",
+                           input_image.path, output_path)
+            with open(output_path, 'wb') as fileobj:
+                for (offset, _, data) in runs:
+                    # Leave runs of zeros as holes in the output file
+                    if data is not None:
+                        fileobj.seek(offset)
+                        fileobj.write(data)
+                fileobj.truncate(int(input_image.capacity))
+            return cls(output_path)
+
         if (input_image.disk_format == 'vmdk' and
                 input_image.disk_subformat == 'streamOptimized'):
             helper = helper_select([('qemu-img', '1.2.0'), 'vmdktool'])
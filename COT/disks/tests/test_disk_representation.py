@@ -18,10 +18,11 @@
 
 import logging
 import os
+import struct
 import mock
 
 from COT.tests import COTTestCase
-from COT.disks import DiskRepresentation
+from COT.disks import DiskRepresentation, ISO, QCOW2, RAW, VMDK
 from COT.helpers import helpers, HelperError
 
 logger = logging.getLogger(__name__)
@@ -86,15 +87,87 @@ class TestDiskRepresentation(COTTestCase):
                           None)
         with mock.patch('COT.helpers.helper.check_output') as mock_co:
             mock_co.return_value = "qemu-img info: unsupported command"
+            # No need for qemu-img to recognize a VMDK...
+            self.assertEqual(
+                "vmdk", DiskRepresentation.from_file(self.input_vmdk)
+                .disk_format)
+            # ...but we do need it for files with no recognizable header
             self.assertRaises(RuntimeError,
                               DiskRepresentation.from_file,
-                              self.input_vmdk)
+                              self.input_ovf)
         # We support QCOW2 but not QCOW at present
         temp_path = os.path.join(self.temp_dir, "foo.qcow")
         helpers['qemu-img'].call(['create', '-f', 'qcow', temp_path, '8M'])
         self.assertRaises(NotImplementedError,
                           DiskRepresentation.from_file, temp_path)
 
+    def test_detect_format(self):
+        """Recognize disk image formats from their headers alone."""
+        def make_file(name, data, offset=0):
+            path = os.path.join(self.temp_dir, name)
+            with open(path, 'wb') as fileobj:
+                fileobj.seek(offset)
+                fileobj.write(data)
+                fileobj.truncate(0x10000)
+            return path
+
+        with mock.patch('COT.helpers.helper.check_output') as mock_co:
+            self.assertEqual("vmdk", DiskRepresentation.detect_format(
+                self.input_vmdk))
+            self.assertEqual("vmdk", DiskRepresentation.detect_format(
+                self.blank_vmdk))
+            self.assertEqual("iso", DiskRepresentation.detect_format(
+                self.input_iso))
+            self.assertEqual("qcow2", DiskRepresentation.detect_format(
+                make_file("v2.qcow2", b'QFI\xfb\0\0\0\x02')))
+            self.assertEqual("qcow2", DiskRepresentation.detect_format(
+                make_file("v3.qcow2", b'QFI\xfb\0\0\0\x03')))
+            self.assertEqual("qcow", DiskRepresentation.detect_format(
+                make_file("v1.qcow", b'QFI\xfb\0\0\0\x01')))
+            self.assertEqual("vmdk", DiskRepresentation.detect_format(
+                make_file("descriptor.vmdk",
+                          b'# Disk DescriptorFile\nversion=1\n'
+                          b'createType="monolithicFlat"\n')))
+            self.assertEqual("iso", DiskRepresentation.detect_format(
+                make_file("supplementary.iso", b'\x02CD001', 0x8800)))
+            self.assertEqual(None, DiskRepresentation.detect_format(
+                make_file("foo.img", b'')))
+            self.assertEqual(None, DiskRepresentation.detect_format(
+                self.input_ovf))
+            mock_co.assert_not_called()
+
+    def test_capacity_native(self):
+        """Read disk capacity from image headers without qemu-img."""
+        def make_file(name, data, size=0x10000):
+            path = os.path.join(self.temp_dir, name)
+            with open(path, 'wb') as fileobj:
+                fileobj.write(data)
+                fileobj.truncate(size)
+            return path
+
+        with mock.patch('COT.helpers.helper.check_output') as mock_co:
+            self.assertEqual("536870912", VMDK(self.blank_vmdk).capacity)
+            self.assertEqual("1073741824", VMDK(self.input_vmdk).capacity)
+            self.assertEqual(str(self.FILE_SIZE['input.iso']),
+                             ISO(self.input_iso).capacity)
+            self.assertEqual("12345678", RAW(make_file(
+                "foo.img", b'', 12345678)).capacity)
+            self.assertEqual(str(64 << 30), QCOW2(make_file(
+                "foo.qcow2", b'QFI\xfb\0\0\0\x03' + b'\0' * 16 +
+                struct.pack(">Q", 64 << 30))).capacity)
+            self.assertEqual(str(1000 * 512), VMDK(make_file(
+                "cowd.vmdk", b'COWD\x01\0\0\0\x03\0\0\0' +
+                struct.pack("<I", 1000))).capacity)
+            self.assertEqual(str((4192256 + 2048) * 512), VMDK(make_file(
+                "descriptor.vmdk",
+                b'# Disk DescriptorFile\nversion=1\n'
+                b'createType="twoGbMaxExtentSparse"\n\n'
+                b'# Extent description\n'
+                b'RW 4192256 SPARSE "descriptor-s001.vmdk"\n'
+                b'RW 2048 SPARSE "descriptor-s002.vmdk"\n',
+                size=None)).capacity)
+            mock_co.assert_not_called()
+
     @mock.patch('COT.helpers.helper.check_output')
     def test_capacity_qemu_error(self, mock_check_output):
         """Test error handline if qemu-img reports an error."""
@@ -16,12 +16,27 @@
 
 """Unit test cases for ISO subclass of DiskRepresentation."""
 
+import io
 import logging
 import os
+import re
+import shutil
+import struct
 import mock
 
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+try:
+    import pycdlib
+except ImportError:
+    pycdlib = None
+
 from COT.tests import COTTestCase
 from COT.disks import ISO
+from COT.disks.iso import write_iso
 from COT.helpers import (
     helpers, HelperError, HelperNotFoundError,
 )
@@ -115,8 +130,10 @@ Setting input-charset to 'UTF-8' from locale.
                           path=os.path.join(self.temp_dir, "out.iso"),
                           capacity="100")
 
+    @mock.patch("COT.disks.iso.write_iso",
+                side_effect=NotImplementedError)
     @mock.patch("COT.helpers.mkisofs.MkISOFS.call")
-    def test_create_with_mkisofs(self, mock_call):
+    def test_create_with_mkisofs(self, mock_call, _):
         """Creation of an ISO with mkisofs (default)."""
         helpers['mkisofs']._installed = True
         ISO.create_file(path=self.foo_iso, files=[self.input_ovf])
@@ -124,8 +141,10 @@ Setting input-charset to 'UTF-8' from locale.
             ['-output', self.foo_iso, '-full-iso9660-filenames',
              '-iso-level', '2', '-allow-lowercase', '-r', self.input_ovf])
 
+    @mock.patch("COT.disks.iso.write_iso",
+                side_effect=NotImplementedError)
     @mock.patch("COT.helpers.mkisofs.GenISOImage.call")
-    def test_create_with_genisoimage(self, mock_call):
+    def test_create_with_genisoimage(self, mock_call, _):
         """Creation of an ISO with genisoimage if mkisofs is unavailable."""
         helpers['mkisofs']._installed = False
         helpers['genisoimage']._installed = True
@@ -134,8 +153,10 @@ Setting input-charset to 'UTF-8' from locale.
             ['-output', self.foo_iso, '-full-iso9660-filenames',
              '-iso-level', '2', '-allow-lowercase', '-r', self.input_ovf])
 
+    @mock.patch("COT.disks.iso.write_iso",
+                side_effect=NotImplementedError)
     @mock.patch("COT.helpers.mkisofs.XorrISO.call")
-    def test_create_with_xorriso(self, mock_call):
+    def test_create_with_xorriso(self, mock_call, _):
         """Creation of an ISO with xorriso as last resort."""
         helpers['mkisofs']._installed = False
         helpers['genisoimage']._installed = False
@@ -146,7 +167,8 @@ Setting input-charset to 'UTF-8' from locale.
              '-full-iso9660-filenames', '-iso-level', '2', '-allow-lowercase',
              '-r', self.input_ovf])
 
-    def test_create_no_helpers_available(self):
+    @mock.patch("COT.disks.iso.write_iso", side_effect=NotImplementedError)
+    def test_create_no_helpers_available(self, _):
         """Creation of ISO should fail if no helpers are install[ed|able]."""
         helpers['mkisofs']._installed = False
         helpers['genisoimage']._installed = False
@@ -160,8 +182,10 @@ Setting input-charset to 'UTF-8' from locale.
                           path=self.foo_iso,
                           files=[self.input_ovf])
 
+    @mock.patch("COT.disks.iso.write_iso",
+                side_effect=NotImplementedError)
     @mock.patch("COT.helpers.mkisofs.MkISOFS.call")
-    def test_create_with_mkisofs_non_rockridge(self, mock_call):
+    def test_create_with_mkisofs_non_rockridge(self, mock_call, _):
         """Creation of a non-Rock-Ridge ISO with mkisofs (default)."""
         helpers['mkisofs']._installed = True
         ISO.create_file(path=self.foo_iso, files=[self.input_ovf],
@@ -176,18 +200,12 @@ Setting input-charset to 'UTF-8' from locale.
                           ISO.file_is_this_type, "/foo/bar")
 
     def test_file_is_this_type_isoinfo(self):
-        """The file_is_this_type API should use isoinfo if available."""
-        if helpers['isoinfo']:
+        """The file_is_this_type API doesn't need isoinfo even if available."""
+        helpers['isoinfo']._installed = True
+        with mock.patch.object(helpers['isoinfo'], "call") as mock_call:
             self.assertTrue(ISO.file_is_this_type(self.input_iso))
             self.assertFalse(ISO.file_is_this_type(self.blank_vmdk))
-        else:
-            # Fake it til you make it
-            helpers['isoinfo']._installed = True
-            with mock.patch.object(helpers['isoinfo'], "call"):
-                self.assertTrue(ISO.file_is_this_type(self.input_iso))
-            with mock.patch.object(helpers['isoinfo'], "call",
-                                   side_effect=HelperError):
-                self.assertFalse(ISO.file_is_this_type(self.blank_vmdk))
+            mock_call.assert_not_called()
 
     def test_file_is_this_type_noisoinfo(self):
         """The file_is_this_type API should work if isoinfo isn't available."""
@@ -204,3 +222,181 @@ Setting input-charset to 'UTF-8' from locale.
         self.assertRaises(NotImplementedError,
                           ISO.from_other_image,
                           self.blank_vmdk, self.temp_dir)
+
+    def test_disk_subformat_native(self):
+        """Detect Rock Ridge extensions without using isoinfo."""
+        def make_iso(name, system_use):
+            path = os.path.join(self.temp_dir, name)
+            pvd = bytearray(2048)
+            pvd[0:6] = b'\x01CD001'
+            pvd[80:84] = struct.pack("<I", 20)
+            pvd[128:130] = struct.pack("<H", 2048)
+            # Root directory record, with its extent at sector 18
+            pvd[156] = 34
+            pvd[158:162] = struct.pack("<I", 18)
+            record = bytearray(34) + bytearray(system_use)
+            record[0] = len(record)
+            record[32] = 1
+            with open(path, 'wb') as fileobj:
+                fileobj.seek(16 * 2048)
+                fileobj.write(pvd)
+                fileobj.write(b'\xffCD001' + b'\0' * 2042)
+                fileobj.write(record)
+                fileobj.truncate(20 * 2048)
+            return path
+
+        with mock.patch.object(helpers['isoinfo'], "call") as mock_call:
+            self.assertEqual(ISO(self.input_iso).disk_subformat, "")
+            self.assertEqual(ISO(make_iso(
+                "rr.iso",
+                b'SP\x07\x01\xbe\xef\x00' + b'RR\x05\x01\x81' +
+                b'PX\x24\x01' + b'\0' * 32)).disk_subformat, "rockridge")
+            self.assertEqual(ISO(make_iso(
+                "susp.iso", b'SP\x07\x01\xbe\xef\x00')).disk_subformat, "")
+            mock_call.assert_not_called()
+
+    @staticmethod
+    def read_iso(data):
+        """Read the directory tree out of an ISO image.
+
+        Args:
+          data (bytes): ISO image contents.
+
+        Returns:
+          dict: {path: file contents or None for directories}, using
+          Rock Ridge names if present, else ISO 9660 identifiers.
+        """
+        def read_directory(extent, length, prefix, result):
+            position = extent * 2048
+            end = position + length
+            while position < end:
+                record_length = bytearray(data[position:position + 1])[0]
+                if record_length == 0:
+                    # Skip padding to the next sector
+                    position = (position // 2048 + 1) * 2048
+                    continue
+                record = data[position:position + record_length]
+                position += record_length
+                (child_extent,) = struct.unpack("<I", record[2:6])
+                (child_length,) = struct.unpack("<I", record[10:14])
+                name_length = bytearray(record[32:33])[0]
+                name = record[33:33 + name_length]
+                if name in (b'\0', b'\1'):
+                    continue
+                system_use = record[33 + name_length + 1 - name_length % 2:]
+                match = re.search(b'NM(.)\x01\x00', system_use, re.DOTALL)
+                if match:
+                    nm_length = bytearray(match.group(1))[0]
+                    name = system_use[match.end():match.start() + nm_length]
+                path = prefix + name.decode('utf-8')
+                if bytearray(record[25:26])[0] & 2:
+                    result[path] = None
+                    read_directory(child_extent, child_length, path + "/",
+                                   result)
+                else:
+                    result[path] = data[child_extent * 2048:
+                                        child_extent * 2048 + child_length]
+            return result
+
+        root = data[16 * 2048 + 156:16 * 2048 + 190]
+        return read_directory(struct.unpack("<I", root[2:6])[0],
+                              struct.unpack("<I", root[10:14])[0], "", {})
+
+    def test_write_iso(self):
+        """Write a Rock Ridge ISO without any helper programs."""
+        extra_dir = os.path.join(self.temp_dir, "extra")
+        os.makedirs(os.path.join(extra_dir, "sub.dir", "deeper"))
+        shutil.copy(self.input_ovf, extra_dir)
+        with open(os.path.join(extra_dir, "sub.dir", "deeper",
+                               "a file with a long name.tar.gz"), 'wb') as f:
+            f.write(b'x' * 5000)
+        for i in range(100):
+            with open(os.path.join(extra_dir, "sub.dir",
+                                   "file{0}.txt".format(i)), 'wb') as f:
+                f.write(str(i).encode())
+        with open(self.input_ovf, 'rb') as f:
+            ovf_data = f.read()
+
+        with mock.patch('COT.helpers.helper.check_output') as mock_co:
+            ISO.create_file(self.foo_iso,
+                            files=[self.minimal_ovf, extra_dir])
+            iso = ISO(self.foo_iso)
+            self.assertEqual(iso.disk_subformat, "rockridge")
+            self.assertEqual(iso.capacity,
+                             str(os.path.getsize(self.foo_iso)))
+            mock_co.assert_not_called()
+
+        with open(self.foo_iso, 'rb') as f:
+            contents = self.read_iso(f.read())
+        self.assertEqual(contents['input.ovf'], ovf_data)
+        self.assertEqual(contents['sub.dir'], None)
+        self.assertEqual(contents['sub.dir/file42.txt'], b'42')
+        self.assertEqual(
+            contents['sub.dir/deeper/a file with a long name.tar.gz'],
+            b'x' * 5000)
+        self.assertEqual(len(contents), 105)
+        self.assertIn('minimal.ovf', contents)
+
+    def test_write_iso_non_rockridge(self):
+        """Write a plain ISO 9660 level 2 image into memory."""
+        buf = io.BytesIO()
+        write_iso(buf, [self.input_ovf, self.minimal_ovf, self.input_iso],
+                  rock_ridge=False)
+        data = buf.getvalue()
+        self.assertEqual(len(data) % 2048, 0)
+        self.assertEqual(sorted(self.read_iso(data)),
+                         ['input.iso;1', 'input.ovf;1', 'minimal.ovf;1'])
+
+        with open(self.foo_iso, 'wb') as f:
+            f.write(data)
+        self.assertEqual(ISO(self.foo_iso).disk_subformat, "")
+
+    @unittest.skipUnless(pycdlib, "Only applicable when pycdlib is installed")
+    def test_write_iso_pycdlib(self):
+        """Read back an ISO we wrote, using an independent implementation."""
+        extra_dir = os.path.join(self.temp_dir, "extra")
+        long_dir = "a directory name longer than thirty-one characters"
+        os.makedirs(os.path.join(extra_dir, long_dir))
+        # Names whose identifiers collide, with extensions long and short
+        names = (["file.{0}{1}".format("e" * 30, i) for i in range(12)] +
+                 ["{0}{1}.txt".format("x" * 40, i) for i in range(12)] +
+                 ["{0}{1}".format(long_dir, i) for i in range(12)])
+        for name in names:
+            with open(os.path.join(extra_dir, long_dir, name), 'wb') as f:
+                f.write(name.encode())
+
+        buf = io.BytesIO()
+        write_iso(buf, [extra_dir])
+        buf.seek(0)
+        iso = pycdlib.PyCdlib()
+        iso.open_fp(buf)
+        try:
+            identifiers = set()
+            for child in iso.list_children(
+                    iso_path="/" + long_dir.replace(" ", "_")[:31]):
+                identifier = child.file_identifier()
+                if identifier in (b'.', b'..'):
+                    continue
+                self.assertLessEqual(len(identifier.split(b';')[0]), 31)
+                self.assertLessEqual(child.dr_len, 255)
+                identifiers.add(identifier)
+            self.assertEqual(len(identifiers), len(names))
+            for name in names:
+                out = io.BytesIO()
+                iso.get_file_from_iso_fp(
+                    out, rr_path="/{0}/{1}".format(long_dir, name))
+                self.assertEqual(out.getvalue(), name.encode())
+        finally:
+            iso.close()
+
+    def test_write_iso_errors(self):
+        """Conflicting file names, and fallback for unsupported content."""
+        self.assertRaises(ValueError, write_iso, io.BytesIO(),
+                          [self.input_ovf, self.input_ovf])
+
+        deep_dir = os.path.join(self.temp_dir, *["d"] * 9)
+        os.makedirs(deep_dir)
+        self.assertRaises(NotImplementedError, write_iso, io.BytesIO(),
+                          [os.path.join(self.temp_dir, "d")])
+        # Eight levels, including the root directory, is permitted
+        write_iso(io.BytesIO(), [os.path.join(self.temp_dir, "d", "d")])
@@ -18,6 +18,8 @@
 
 import logging
 import os
+import struct
+import zlib
 
 from distutils.version import StrictVersion
 import mock
@@ -97,3 +99,136 @@ class TestQCOW2(COTTestCase):
         mock_qemuimg.assert_called_with([
             'convert', '-O', 'qcow2', self.blank_vmdk,
             os.path.join(self.temp_dir, "blank.qcow2")])
+
+
+class TestQCOW2Reader(COTTestCase):
+    """Test cases for reading QCOW2 image contents natively."""
+
+    CLUSTER = 65536
+
+    def make_qcow2(self, version=3, backing_file_offset=0, crypt_method=0,
+                   incompatible_features=0):
+        """Construct a small QCOW2 image by hand.
+
+        Guest clusters 0, 9 and 10 are stored uncompressed (9 and 10
+        contiguously), guest cluster 5 is compressed, guest cluster 7
+        has the zero flag, and the last, partial, cluster has data too.
+
+        Returns:
+          tuple: (path, expected guest contents)
+        """
+        cluster = self.CLUSTER
+        size = 127 * cluster + 1000
+        contents = bytearray(size)
+        host = bytearray(7 * cluster)
+        # Header in cluster 0, L1 table in cluster 1, L2 table in cluster 2
+        header = struct.pack(">4sIQIIQIIQQIIQ", b'QFI\xfb', version,
+                             backing_file_offset, 0, 16, size, crypt_method,
+                             1, cluster, 0, 0, 0, 0)
+        if version == 3:
+            header += struct.pack(">QQQII", incompatible_features, 0, 0,
+                                  4, 104)
+        host[0:len(header)] = header
+        host[cluster:cluster + 8] = struct.pack(">Q", 2 * cluster | 1 << 63)
+        l2_table = [0] * (cluster // 8)
+
+        def store(guest, host_cluster, data):
+            contents[guest * cluster:guest * cluster + len(data)] = data
+            host[host_cluster * cluster:
+                 host_cluster * cluster + len(data)] = data
+            l2_table[guest] = host_cluster * cluster | 1 << 63
+
+        store(0, 3, b'first cluster' * 100)
+        store(9, 5, os.urandom(cluster))
+        store(10, 6, os.urandom(cluster))
+        # Compressed cluster is stored mid-sector in host cluster 4
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -12)
+        compressed = (compressor.compress(b'compressed' * 6553) +
+                      compressor.flush())
+        contents[5 * cluster:5 * cluster + 65530] = b'compressed' * 6553
+        start = 4 * cluster + 100
+        host[start:start + len(compressed)] = compressed
+        sectors = (100 + len(compressed) - 1) // 512
+        l2_table[5] = 1 << 62 | sectors << 54 | start
+        # Zero flag set on an allocated cluster whose data is nonzero
+        l2_table[7] = 3 * cluster | 1
+        # Last cluster is appended after the others
+        host += b'\xff' * cluster
+        contents[127 * cluster:] = b'\xff' * 1000
+        l2_table[127] = 7 * cluster | 1 << 63
+        host[2 * cluster:3 * cluster] = struct.pack(
+            ">{0}Q".format(len(l2_table)), *l2_table)
+
+        path = os.path.join(self.temp_dir, "foo.qcow2")
+        with open(path, 'wb') as fileobj:
+            fileobj.write(host)
+        return (path, bytes(contents))
+
+    @staticmethod
+    def contents(runs, size):
+        """Assemble the contents described by iter_data runs."""
+        contents = bytearray(size)
+        last = 0
+        for (offset, length, data) in runs:
+            assert offset >= last
+            last = offset + length
+            if data is not None:
+                assert len(data) == length
+                contents[offset:offset + length] = data
+        return bytes(contents)
+
+    def test_iter_data(self):
+        """Read allocated, compressed, and zero clusters of a QCOW2."""
+        (path, expected) = self.make_qcow2()
+        qcow2 = QCOW2(path)
+        runs = list(qcow2.iter_data(2 * self.CLUSTER))
+        self.assertEqual(self.contents(runs, len(expected)), expected)
+        # Contiguous clusters 9 and 10 are read together,
+        # and unallocated clusters aren't read at all
+        self.assertIn(9 * self.CLUSTER, [run[0] for run in runs])
+        self.assertNotIn(10 * self.CLUSTER, [run[0] for run in runs])
+        self.assertEqual(sum(run[1] for run in runs if run[2] is not None),
+                         4 * self.CLUSTER + 1000)
+
+        (path, expected) = self.make_qcow2(version=2)
+        contents = self.contents(QCOW2(path).iter_data(self.CLUSTER),
+                                 len(expected))
+        # Version 2 has no zero flag, so cluster 7 maps to host cluster 3
+        self.assertEqual(contents[7 * self.CLUSTER:8 * self.CLUSTER],
+                         expected[:self.CLUSTER])
+
+    def test_iter_data_unsupported(self):
+        """Backing files and encryption are rejected before reading."""
+        (path, _) = self.make_qcow2(backing_file_offset=200)
+        with self.assertRaises(NotImplementedError) as catcher:
+            QCOW2(path).iter_data(self.CLUSTER)
+        self.assertIn("backing file", str(catcher.exception))
+
+        (path, _) = self.make_qcow2(crypt_method=1)
+        with self.assertRaises(NotImplementedError) as catcher:
+            QCOW2(path).iter_data(self.CLUSTER)
+        self.assertIn("encrypted", str(catcher.exception))
+
+        (path, _) = self.make_qcow2(incompatible_features=1 << 2)
+        self.assertRaises(NotImplementedError,
+                          QCOW2(path).iter_data, self.CLUSTER)
+
+        # Dirty refcounts don't matter for reading
+        (path, expected) = self.make_qcow2(incompatible_features=1)
+        self.assertEqual(self.contents(QCOW2(path).iter_data(self.CLUSTER),
+                                       len(expected)), expected)
+
+        self.assertRaises(RuntimeError,
+                          QCOW2(self.blank_vmdk).iter_data, self.CLUSTER)
+
+    def test_convert_without_helpers(self):
+        """Convert QCOW2 to RAW and streamOptimized VMDK without qemu-img."""
+        (path, expected) = self.make_qcow2()
+        with mock.patch('COT.helpers.helper.check_output') as mock_co:
+            raw = RAW.from_other_image(QCOW2(path), self.temp_dir)
+            vmdk = VMDK.from_other_image(QCOW2(path), self.temp_dir)
+            self.assertEqual(int(vmdk.capacity),
+                             -(-len(expected) // 512) * 512)
+            mock_co.assert_not_called()
+        with open(raw.path, 'rb') as fileobj:
+            self.assertEqual(fileobj.read(), expected)
@@ -18,12 +18,15 @@
 
 import logging
 import os
+import struct
+import zlib
 
 from distutils.version import StrictVersion
 import mock
 
 from COT.tests import COTTestCase
-from COT.disks import VMDK, DiskRepresentation
+from COT.disks import VMDK, RAW, DiskRepresentation
+from COT.disks.vmdk import write_stream_optimized, SPARSE_HEADER, GD_AT_END
 from COT.helpers import helpers, HelperError
 
 logger = logging.getLogger(__name__)
@@ -129,7 +132,7 @@ class TestVMDKConversion(COTTestCase):
 
     @mock.patch('COT.helpers.qemu_img.QEMUImg.version',
                 new_callable=mock.PropertyMock,
-                return_value=StrictVersion("1.2.0"))
+                return_value=StrictVersion("2.1.0"))
     @mock.patch('COT.helpers.qemu_img.QEMUImg.call',
                 wraps=helpers["qemu-img"].call)
     @mock.patch('COT.helpers.vmdktool.VMDKTool.call',
@@ -138,101 +141,52 @@ class TestVMDKConversion(COTTestCase):
                                       mock_vmdktool_call, mock_qemu_call, _):
         """Test disk conversion flows with old qemu-img version.
 
-        This version doesn't support streamOptimized output at all,
-        so we'll use vmdktool instead.
+        This version produces streamOptimized VMDKs but they're version 1
+        rather than version 3, which makes ESXi unhappy. Therefore, we convert
+        images we can't read ourselves to RAW, then write the VMDK ourselves.
         """
         for disk_format in ["raw", "qcow2", "vmdk"]:
             self.other_format_to_vmdk_test(disk_format)
 
-            if disk_format != "raw":
+            if disk_format == "vmdk":
                 # use qemu-img to convert to raw
                 mock_qemu_call.assert_called_once_with(
                     ['convert', '-O', 'raw',
                      self.input_disks[disk_format].path, mock.ANY])
             else:
                 mock_qemu_call.assert_not_called()
-
-            mock_vmdktool_call.assert_called_once()
+            mock_vmdktool_call.assert_not_called()
+            self.assertNoLogsOver(logging.INFO)
 
             mock_qemu_call.reset_mock()
-            mock_vmdktool_call.reset_mock()
 
     @mock.patch('COT.helpers.qemu_img.QEMUImg.version',
                 new_callable=mock.PropertyMock,
-                return_value=StrictVersion("1.2.0"))
+                return_value=StrictVersion("2.1.0"))
     def test_disk_conversion_old_qemu_error(self, *_):
-        """Error recovery/cleanup during multi-step conversion with vmdktool.
+        """Error recovery/cleanup during multi-step conversion.
 
         https://github.com/glennmatthews/cot/issues/67
         """
-        # Error in conversion from qcow2 to raw
+        # Error in conversion from vmdk to raw
         with mock.patch('COT.helpers.qemu_img.QEMUImg.call',
                         side_effect=HelperError):
             self.assertRaises(HelperError,
                               VMDK.from_other_image,
-                              self.input_disks['qcow2'], self.temp_dir)
+                              self.input_disks['vmdk'], self.temp_dir)
 
         # Error in conversion from raw to vmdk
-        with mock.patch('COT.helpers.vmdktool.VMDKTool.call',
-                        side_effect=HelperError):
-            self.assertRaises(HelperError,
+        with mock.patch('COT.disks.vmdk.write_stream_optimized',
+                        side_effect=IOError):
+            self.assertRaises(IOError,
                               VMDK.from_other_image,
-                              self.input_disks['qcow2'], self.temp_dir)
+                              self.input_disks['vmdk'], self.temp_dir)
 
         # Make sure we didn't leave the temporary image behind
         temp_image = os.path.join(self.temp_dir, 'foo.img')
         self.assertFalse(os.path.exists(temp_image),
                          "Temporary image {0} not deleted".format(temp_image))
 
-    @mock.patch('COT.helpers.qemu_img.QEMUImg.version',
-                new_callable=mock.PropertyMock,
-                return_value=StrictVersion("2.1.0"))
-    @mock.patch('COT.helpers.qemu_img.QEMUImg.call',
-                wraps=helpers["qemu-img"].call)
-    @mock.patch('COT.helpers.vmdktool.VMDKTool.call',
-                wraps=helpers["vmdktool"].call)
-    def test_disk_conversion_med_qemu(self,
-                                      mock_vmdktool_call, mock_qemu_call, _):
-        """Test disk conversion flows with intermediate qemu-img version.
-
-        This version produces streamOptimized VMDKs but they're version 1
-        rather than version 3, which makes ESXi unhappy. Therefore,
-        we still prefer vmdktool, but fall back to qemu-img with a warning
-        if vmdktool is not available.
-        """
-        # First, with vmdktool, same as test_disk_conversion_old_qemu
-        for disk_format in ["raw", "qcow2", "vmdk"]:
-            self.other_format_to_vmdk_test(disk_format)
-
-            if disk_format != "raw":
-                # use qemu-img to convert to raw
-                mock_qemu_call.assert_called_once_with(
-                    ['convert', '-O', 'raw',
-                     self.input_disks[disk_format].path, mock.ANY])
-            else:
-                mock_qemu_call.assert_not_called()
-            mock_vmdktool_call.assert_called_once()
-
-            mock_qemu_call.reset_mock()
-            mock_vmdktool_call.reset_mock()
-
-        # Now, disable vmdktool
-        with mock.patch("COT.helpers.vmdktool.VMDKTool.installed",
-                        new_callable=mock.PropertyMock, return_value=False),\
-            mock.patch("COT.helpers.vmdktool.VMDKTool.installable",
-                       new_callable=mock.PropertyMock, return_value=False):
-            for disk_format in ["raw", "qcow2", "vmdk"]:
-                self.other_format_to_vmdk_test(disk_format)
-
-                # Since we lack vmdktool, and we have a technically
-                # new enough version of qemu-img, we call it, under protest.
-                mock_qemu_call.assert_called_once()
-                self.assertLogged(**QEMU_VERSION_WARNING)
-                mock_vmdktool_call.assert_not_called()
-
-                mock_qemu_call.reset_mock()
-                mock_vmdktool_call.reset_mock()
-
     @mock.patch('COT.helpers.qemu_img.QEMUImg.version',
                 new_callable=mock.PropertyMock,
                 return_value=StrictVersion("2.5.1"))
@@ -245,12 +199,18 @@ class TestVMDKConversion(COTTestCase):
         """Test disk conversion flows with newer qemu-img version.
 
         This version produces version 3 streamOptimized VMDKs,
-        so we don't need to use vmdktool.
+        so we use it directly for images we can't read ourselves.
         """
         for disk_format in ["raw", "qcow2", "vmdk"]:
             self.other_format_to_vmdk_test(disk_format)
 
-            mock_qemu_call.assert_called_once()
+            if disk_format == "vmdk":
+                mock_qemu_call.assert_called_once_with(
+                    ['convert', '-O', 'vmdk',
+                     '-o', 'subformat=streamOptimized',
+                     self.input_disks[disk_format].path, mock.ANY])
+            else:
+                mock_qemu_call.assert_not_called()
             mock_vmdktool_call.assert_not_called()
 
             mock_qemu_call.reset_mock()
@@ -260,3 +220,99 @@ class TestVMDKConversion(COTTestCase):
         self.assertRaises(HelperError,
                           self.other_format_to_vmdk_test,
                           'qcow2', output_subformat="foobar")
+
+
+class TestStreamOptimizedWriter(COTTestCase):
+    """Test cases for the native streamOptimized VMDK writer."""
+
+    @staticmethod
+    def read_stream_optimized(path):
+        """Read back the contents of a streamOptimized VMDK.
+
+        Args:
+          path (str): VMDK file to read.
+
+        Returns:
+          tuple: (capacity, contents)
+        """
+        with open(path, 'rb') as fileobj:
+            vmdk = fileobj.read()
+        header = SPARSE_HEADER.unpack(vmdk[:SPARSE_HEADER.size])
+        assert header[0:3] == (b'KDMV', 3, 0x30001)
+        assert header[9] == GD_AT_END
+        capacity = header[3] * 512
+        # Trailer is footer marker, footer, end-of-stream marker
+        assert vmdk[-1536:-1024].startswith(struct.pack("<QII", 1, 0, 3))
+        assert vmdk[-512:] == b'\0' * 512
+        footer = SPARSE_HEADER.unpack(vmdk[-1024:-1024 + SPARSE_HEADER.size])
+        assert footer[3:9] == header[3:9]
+        gd_offset = footer[9] * 512
+        assert vmdk[gd_offset - 512:gd_offset].startswith(
+            struct.pack("<QII", 1, 0, 2))
+        gt_count = -(-capacity // (512 * 65536))
+        contents = bytearray(capacity)
+        grain_directory = struct.unpack(
+            "<{0}I".format(gt_count), vmdk[gd_offset:gd_offset + gt_count * 4])
+        for gt_sector in grain_directory:
+            if not gt_sector:
+                continue
+            assert vmdk[gt_sector * 512 - 512:gt_sector * 512].startswith(
+                struct.pack("<QII", 4, 0, 1))
+            for grain_sector in struct.unpack(
+                    "<512I", vmdk[gt_sector * 512:gt_sector * 512 + 2048]):
+                if not grain_sector:
+                    continue
+                (lba, size) = struct.unpack(
+                    "<QI", vmdk[grain_sector * 512:grain_sector * 512 + 12])
+                start = grain_sector * 512 + 12
+                data = zlib.decompress(vmdk[start:start + size])
+                # Grains are whole sectors, and don't go past the capacity
+                assert len(data) % 512 == 0
+                assert lba * 512 + len(data) <= capacity
+                contents[lba * 512:lba * 512 + len(data)] = data
+        return (capacity, bytes(contents))
+
+    def test_from_raw_image(self):
+        """Convert a RAW image to streamOptimized VMDK without helpers."""
+        raw_path = os.path.join(self.temp_dir, "foo.img")
+        with open(raw_path, 'wb') as fileobj:
+            fileobj.write(b'hello' * 1000)
+            # Spanning two grains, in the second grain table
+            fileobj.seek(33 * 1024 * 1024 - 7)
+            fileobj.write(os.urandom(100000))
+            # Last sector of the disk
+            fileobj.seek(40 * 1024 * 1024 - 4)
+            fileobj.write(b'end!')
+        with open(raw_path, 'rb') as fileobj:
+            raw_data = fileobj.read()
+
+        with mock.patch('COT.helpers.helper.check_output') as mock_co:
+            vmdk = VMDK.from_other_image(RAW(raw_path), self.temp_dir)
+            self.assertEqual(vmdk.disk_subformat, "streamOptimized")
+            self.assertEqual(vmdk.capacity, str(len(raw_data)))
+            mock_co.assert_not_called()
+
+        (capacity, contents) = self.read_stream_optimized(vmdk.path)
+        self.assertEqual(capacity, len(raw_data))
+        self.assertEqual(contents, raw_data)
+        # All-zero grains are not stored
+        self.assertLess(os.path.getsize(vmdk.path), 256 * 1024)
+
+    def test_unaligned_runs_multiple_workers(self):
+        """Data not aligned to grains, compressed by several threads."""
+        data = os.urandom(100000)
+        runs = [(0, 3, b'abc'),
+                (3, 50000, None),
+                (70000, 100000, data),
+                (300000, 1000, b'\0' * 1000),
+                (999990, 10, b'0123456789')]
+        path = os.path.join(self.temp_dir, "foo.vmdk")
+        write_stream_optimized(path, 1000000, iter(runs), workers=3, level=1)
+        (capacity, contents) = self.read_stream_optimized(path)
+        self.assertEqual(capacity, 1000448)
+        self.assertEqual(contents[:3], b'abc')
+        self.assertEqual(contents[70000:170000], data)
+        self.assertEqual(contents[3:70000], b'\0' * 69997)
+        self.assertEqual(contents[170000:999990], b'\0' * 829990)
+        self.assertEqual(contents[999990:1000000], b'0123456789')
+        self.assertEqual(contents[1000000:], b'\0' * 448)
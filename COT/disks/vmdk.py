@@ -10,19 +10,333 @@
 # of COT, including this file, may be copied, modified, propagated, or
 # distributed except according to the terms contained in the LICENSE.txt file.
 
-"""Handling of VMDK files."""
+"""Handling of VMDK files.
 
+**Classes and functions**
+
+.. autosummary::
+  :nosignatures:
+
+  VMDK
+  write_stream_optimized
+"""
+
+import collections
 import logging
+import multiprocessing
 import os
+import random
 import re
+import struct
+import zlib
 
 from distutils.version import StrictVersion
+from multiprocessing.pool import ThreadPool
 
 from COT.disks.disk import DiskRepresentation
-from COT.helpers import helpers, helper_select
+from COT.helpers import helpers
 
 logger = logging.getLogger(__name__)
 
+STREAM_WORKERS = None
+"""Default number of threads compressing streamOptimized VMDK grains.
+
+If ``None``, the number of CPUs in the system.
+"""
+
+STREAM_COMPRESSION_LEVEL = 6
+"""Default zlib compression level (1-9) for streamOptimized VMDK grains."""
+
+SECTOR_SIZE = 512
+GRAIN_SECTORS = 128
+GRAIN_SIZE = GRAIN_SECTORS * SECTOR_SIZE
+"""Size of each grain (unit of allocation and compression), in bytes."""
+GTES_PER_GT = 512
+GT_SECTORS = GTES_PER_GT * 4 // SECTOR_SIZE
+
+GRAINS_PER_TASK = 16
+"""Number of grains compressed by a worker thread in a single task."""
+
+# Sparse extent header flags
+FLAG_VALID_NEWLINE_TEST = 1 << 0
+FLAG_COMPRESSED = 1 << 16
+FLAG_MARKERS = 1 << 17
+COMPRESSION_DEFLATE = 1
+GD_AT_END = 0xffffffffffffffff
+
+# Stream marker types
+MARKER_EOS = 0
+MARKER_GT = 1
+MARKER_GD = 2
+MARKER_FOOTER = 3
+
+SPARSE_HEADER = struct.Struct("<4sIIQQQQIQQQB4sH")
+
+STREAM_DESCRIPTOR = """\
+# Disk DescriptorFile
+version=1
+CID={cid:08x}
+parentCID=ffffffff
+createType="streamOptimized"
+
+# Extent description
+RW {sectors} SPARSE "{name}"
+
+# The Disk Data Base
+#DDB
+
+ddb.virtualHWVersion = "4"
+ddb.geometry.cylinders = "{cylinders}"
+ddb.geometry.heads = "16"
+ddb.geometry.sectors = "63"
+ddb.adapterType = "ide"
+"""
+
+
+def _sparse_header(capacity_sectors, descriptor_sectors, overhead,
+                   gd_offset):
+    """Construct a version 3 streamOptimized sparse extent header.
+
+    Args:
+      capacity_sectors (int): Disk capacity in sectors.
+      descriptor_sectors (int): Size of the embedded descriptor in sectors.
+      overhead (int): Number of sectors before the first grain.
+      gd_offset (int): Sector offset of the grain directory.
+
+    Returns:
+      bytes: Header, padded to a full sector.
+    """
+    header = SPARSE_HEADER.pack(
+        b'KDMV', 3,
+        FLAG_VALID_NEWLINE_TEST | FLAG_COMPRESSED | FLAG_MARKERS,
+        capacity_sectors, GRAIN_SECTORS, 1, descriptor_sectors, GTES_PER_GT,
+        0, gd_offset, overhead, 0, b'\n \r\n', COMPRESSION_DEFLATE)
+    return header.ljust(SECTOR_SIZE, b'\0')
+
+
+def _metadata_marker(sectors, marker_type):
+    """Construct a stream marker preceding a block of metadata.
+
+    Args:
+      sectors (int): Size of the following metadata in sectors.
+      marker_type (int): One of the ``MARKER_*`` constants.
+
+    Returns:
+      bytes: Marker, padded to a full sector.
+    """
+    return struct.pack("<QII", sectors, 0, marker_type).ljust(SECTOR_SIZE,
+                                                              b'\0')
+
+
+def _iter_grains(runs, capacity):
+    """Regroup (offset, length, data) runs into whole grains.
+
+    Args:
+      runs (iterator): See :meth:`DiskRepresentation.iter_data`.
+      capacity (int): Disk capacity in bytes, a multiple of the sector size.
+
+    Yields:
+      tuple: ``(grain_number, data)`` for each grain with any data in it.
+      Every grain but the last is :data:`GRAIN_SIZE` bytes long; the last
+      grain is truncated at ``capacity``.
+    """
+    current = None
+    buf = None
+    for (offset, length, data) in runs:
+        if data is None:
+            continue
+        pos = 0
+        while pos < length:
+            (grain, within) = divmod(offset + pos, GRAIN_SIZE)
+            grain_length = min(GRAIN_SIZE, capacity - grain * GRAIN_SIZE)
+            if grain_length <= 0:
+                return
+            count = min(grain_length - within, length - pos)
+            if within == 0 and count == grain_length:
+                # Fast path - a whole grain, no need to copy it
+                if current is not None:
+                    yield (current, bytes(buf))
+                    current = None
+                yield (grain, data[pos:pos + count] if (pos or count < length)
+                       else data)
+            else:
+                if grain != current:
+                    if current is not None:
+                        yield (current, bytes(buf))
+                    current = grain
+                    buf = bytearray(grain_length)
+                buf[within:within + count] = data[pos:pos + count]
+            pos += count
+    if current is not None:
+        yield (current, bytes(buf))
+
+
+def _compress_grains(args):
+    """Compress a batch of grains, discarding any that are all zeros.
+
+    Args:
+      args (tuple): ``(grains, level)``, where ``grains`` is a list of
+        ``(grain_number, data)`` and ``level`` is the zlib level.
+
+    Returns:
+      list: ``(grain_number, compressed_data)`` for each non-zero grain.
+    """
+    (grains, level) = args
+    result = []
+    for (grain, data) in grains:
+        if data.count(b'\0') == len(data):
+            continue
+        result.append((grain, zlib.compress(data, level)))
+    return result
+
+
+def _batches(grains, level):
+    """Group grains into tasks for :func:`_compress_grains`.
+
+    Args:
+      grains (iterator): ``(grain_number, data)`` tuples.
+      level (int): zlib compression level.
+
+    Yields:
+      tuple: ``(grains, level)`` task arguments.
+    """
+    batch = []
+    for grain in grains:
+        batch.append(grain)
+        if len(batch) >= GRAINS_PER_TASK:
+            yield (batch, level)
+            batch = []
+    if batch:
+        yield (batch, level)
+
+
+def _compressed_grains(runs, capacity, workers, level):
+    """Compress the non-zero grains of a disk, in order, using many threads.
+
+    :mod:`zlib` releases the GIL while compressing, so the work is spread
+    across several CPUs, while the number of batches in flight is bounded
+    so that memory usage doesn't depend on the size of the disk.
+
+    Args:
+      runs (iterator): See :meth:`DiskRepresentation.iter_data`.
+      capacity (int): Disk capacity in bytes.
+      workers (int): Number of compression threads.
+      level (int): zlib compression level.
+
+    Yields:
+      tuple: ``(grain_number, compressed_data)`` in order of grain number.
+    """
+    tasks = _batches(_iter_grains(runs, capacity), level)
+    if workers <= 1:
+        for task in tasks:
+            for item in _compress_grains(task):
+                yield item
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_compress_grains, (task,)))
+            if len(pending) >= 2 * workers:
+                for item in pending.popleft().get():
+                    yield item
+        while pending:
+            for item in pending.popleft().get():
+                yield item
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_stream_optimized(path, capacity, runs, workers=None, level=None):
+    """Write a streamOptimized (version 3) VMDK file.
+
+    Each non-zero grain of data is compressed and written, in order,
+    followed by the grain table covering it once the stream moves past
+    that table's range, then by the grain directory, the footer,
+    and the end-of-stream marker.
+
+    Args:
+      path (str): Path of the VMDK file to create.
+      capacity (int): Disk capacity in bytes.
+      runs (iterator): Disk contents as ``(offset, length, data)`` tuples,
+        as returned by :meth:`DiskRepresentation.iter_data`.
+      workers (int): Number of threads compressing grains.
+        Defaults to :data:`STREAM_WORKERS`.
+      level (int): zlib compression level.
+        Defaults to :data:`STREAM_COMPRESSION_LEVEL`.
+    """
+    if workers is None:
+        workers = STREAM_WORKERS
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if level is None:
+        level = STREAM_COMPRESSION_LEVEL
+
+    capacity_sectors = -(-int(capacity) // SECTOR_SIZE)
+    grain_count = -(-capacity_sectors // GRAIN_SECTORS)
+    gt_count = -(-grain_count // GTES_PER_GT)
+    grain_directory = [0] * gt_count
+
+    descriptor = STREAM_DESCRIPTOR.format(
+        cid=random.randint(0, 0xfffffffe),
+        sectors=capacity_sectors,
+        name=os.path.basename(path),
+        cylinders=min(capacity_sectors // (16 * 63), 16383),
+    ).encode('ascii')
+    descriptor_sectors = -(-len(descriptor) // SECTOR_SIZE)
+    # Grains start after the header and descriptor, grain-aligned
+    overhead = -(-(1 + descriptor_sectors) // GRAIN_SECTORS) * GRAIN_SECTORS
+
+    logger.verbose("Writing streamOptimized VMDK %s using %d threads",
+                   path, workers)
+    with open(path, 'wb') as fileobj:
+        fileobj.write(_sparse_header(capacity_sectors, descriptor_sectors,
+                                     overhead, GD_AT_END))
+        fileobj.write(descriptor.ljust(
+            (overhead - 1) * SECTOR_SIZE, b'\0'))
+        sector = overhead
+
+        def write_grain_table(sector, table_number, table):
+            """Write a grain table and add it to the grain directory."""
+            fileobj.write(_metadata_marker(GT_SECTORS, MARKER_GT))
+            fileobj.write(struct.pack("<{0}I".format(GTES_PER_GT), *table))
+            grain_directory[table_number] = sector + 1
+            return sector + 1 + GT_SECTORS
+
+        table_number = None
+        table = None
+        for (grain, compressed) in _compressed_grains(
+                runs, capacity_sectors * SECTOR_SIZE, workers, level):
+            if grain // GTES_PER_GT != table_number:
+                if table_number is not None:
+                    sector = write_grain_table(sector, table_number, table)
+                table_number = grain // GTES_PER_GT
+                table = [0] * GTES_PER_GT
+            table[grain % GTES_PER_GT] = sector
+            # Grain marker is the grain's LBA and the compressed length
+            length = 12 + len(compressed)
+            padding = -length % SECTOR_SIZE
+            fileobj.write(struct.pack("<QI", grain * GRAIN_SECTORS,
+                                      len(compressed)))
+            fileobj.write(compressed)
+            fileobj.write(b'\0' * padding)
+            sector += (length + padding) // SECTOR_SIZE
+        if table_number is not None:
+            sector = write_grain_table(sector, table_number, table)
+
+        gd_sectors = -(-gt_count * 4 // SECTOR_SIZE)
+        fileobj.write(_metadata_marker(gd_sectors, MARKER_GD))
+        fileobj.write(struct.pack("<{0}I".format(gt_count), *grain_directory)
+                      .ljust(gd_sectors * SECTOR_SIZE, b'\0'))
+        gd_offset = sector + 1
+
+        fileobj.write(_metadata_marker(1, MARKER_FOOTER))
+        fileobj.write(_sparse_header(capacity_sectors, descriptor_sectors,
+                                     overhead, gd_offset))
+        fileobj.write(_metadata_marker(0, MARKER_EOS))
+
 
 class VMDK(DiskRepresentation):
     """VMDK disk image file representation."""
@@ -50,6 +364,36 @@ class VMDK(DiskRepresentation):
             self._disk_subformat = vmdk_format
         return self._disk_subformat
 
+    def _read_capacity(self):
+        """Read the capacity of this VMDK from its header or descriptor.
+
+        For a sparse extent, this is the capacity given in its header;
+        for a descriptor file, it's the total size of all listed extents.
+
+        Returns:
+          int: Capacity in bytes, or ``None`` if not determined.
+        """
+        with open(self.path, 'rb') as fileobj:
+            header = fileobj.read(20)
+            if header[:4] == b'KDMV' and len(header) == 20:
+                (sectors,) = struct.unpack("<Q", header[12:20])
+                return sectors * 512
+            if header[:4] == b'COWD' and len(header) >= 16:
+                (sectors,) = struct.unpack("<I", header[12:16])
+                return sectors * 512
+            # Maybe a descriptor file, which should be small
+            fileobj.seek(0)
+            descriptor = fileobj.read(65536).decode('ascii', 'ignore')
+        # Extent lines look like:
+        # RW 4192256 SPARSE "foo-s001.vmdk"
+        sectors = [int(match.group(1)) for match in re.finditer(
+            r'^\s*(?:RW|RDONLY|NOACCESS)\s+(\d+)\s', descriptor, re.MULTILINE)]
+        if not sectors:
+            logger.warning("Did not find a sparse VMDK header or any extent "
+                           "descriptions in %s", self.path)
+            return None
+        return sum(sectors) * 512
+
     @classmethod
     def from_other_image(cls, input_image, output_dir,
                          output_subformat="streamOptimized"):
@@ -67,69 +411,43 @@ class VMDK(DiskRepresentation):
         .. note::
 
           Creation of streamOptimized subformat VMDKs (ESXi's preferred
-          subformat for OVAs, hence COT's default subformat) is more complex
-          than it seems due to the underlying helpers required.
-
-          - Prior to QEMU 2.1.0, ``qemu-img`` effectively can't write
-            streamOptimized subformat at all (it tends to error out).
-          - In QEMU 2.1.0 through 2.5.0, ``qemu-img`` supports output to
-            streamOptimized subformat, but it outputs VMDK images declaring
-            version 1 of the VMDK format, which newer versions of ESXi
-            (and probably other VMware products) reject with the message
-            ``"Not a supported disk format (sparse VMDK version too old)"``.
-          - In QEMU 2.5.1 and later, ``qemu-img`` produces "version 3" VMDK
-            images, which suffices to make ESXi happy.
-          - ``vmdktool`` (any released version) also makes "version 3" VMDKs,
-            but is less likely to be available on most user systems, and it
-            can only convert from RAW format images to streamOptimized VMDK.
-
-          So, when creating streamOptimized VMDKs, if we have QEMU 2.5.1+,
-          we're golden. Else, if we have ``vmdktool``, use it, after
-          converting the :attr:`input_image` to RAW format first if necessary.
-          Else, fail back to QEMU 2.1.0+ but warn the user that the resulting
-          image may not be usable with ESXi.
+          subformat for OVAs, hence COT's default subformat) is done natively
+          by :func:`write_stream_optimized`, which compresses grains on
+          multiple CPUs and always produces "version 3" VMDK images, as newer
+          versions of ESXi reject older versions with the message
+          ``"Not a supported disk format (sparse VMDK version too old)"``.
+
+          If the :attr:`input_image` can't be read natively
+          (see :meth:`~COT.disks.disk.DiskRepresentation.iter_data`),
+          QEMU 2.5.1 and later can convert it directly, as they also produce
+          "version 3" VMDKs. Otherwise, it's converted to RAW format first.
         """
         file_name = os.path.basename(input_image.path)
         (file_prefix, _) = os.path.splitext(file_name)
         output_path = os.path.join(output_dir, file_prefix + ".vmdk")
         if output_subformat == "streamOptimized":
-            helper = helper_select([
-                ('qemu-img', '2.5.1'),  # best option, all needed functionality
-                'vmdktool',  # supports VMDK v.3, but only converts from RAW
-                ('qemu-img', '2.1.0'),  # fallback - produces VMDK v.1
-            ])
-            if helper.name == 'vmdktool':
-                if input_image.disk_format != 'raw':
-                    # vmdktool needs a raw image as input
-                    from COT.disks import RAW
-                    temp_image = None
-                    try:
-                        temp_image = RAW.from_other_image(input_image,
-                                                          output_dir)
-                        return cls.from_other_image(temp_image,
-                                                    output_dir,
-                                                    output_subformat)
-                    finally:
-                        if temp_image is not None:
-                            os.remove(temp_image.path)
-                            temp_image = None
-
-                # Note that vmdktool takes its arguments in unusual order -
-                # output file comes before input file
-                helper.call(['-z9', '-v', output_path, input_image.path])
+            try:
+                runs = input_image.iter_data(GRAIN_SIZE)
+            except NotImplementedError:
+                runs = None
+            if runs is not None:
+                write_stream_optimized(output_path, int(input_image.capacity),
+                                       runs)
                 return cls(output_path)
 
-            # else, fall through to default (qemu-img), with one extra:
-            if helpers['qemu-img'].version < StrictVersion("2.5.1"):
-                logger.warning(
-                    "QEMU version %s produces 'version 1' VMDK images, which"
-                    " newer versions of VMware ESXi will reject with the"
-                    " message '%s'.\nIn order to generate the preferred"
-                    " 'version 3' images, please upgrade to QEMU 2.5.1 or"
-                    " later, or install vmdktool.",
-                    str(helpers['qemu-img'].version),
-                    "Not a supported disk format"
-                    " (sparse VMDK version too old)")
+            if not (helpers['qemu-img'].installed and
+                    helpers['qemu-img'].version >= StrictVersion("2.5.1")):
+                from COT.disks import RAW
+                temp_image = None
+                try:
+                    temp_image = RAW.from_other_image(input_image, output_dir)
+                    return cls.from_other_image(temp_image,
+                                                output_dir,
+                                                output_subformat)
+                finally:
+                    if temp_image is not None:
+                        os.remove(temp_image.path)
+                        temp_image = None
 
         helpers['qemu-img'].call([
             'convert',
@@ -150,8 +468,7 @@ class VMDK(DiskRepresentation):
         """
         if (disk_subformat == "streamOptimized" and
                 helpers['qemu-img'].version < StrictVersion("2.5.1")):
-            # Slightly different warning from the one in from_other_image,
-            # as vmdktool doesn't help us with this case.
+            # Unlike from_other_image, we rely on qemu-img here.
             logger.warning(
                 "QEMU version %s produces 'version 1' VMDK images, which newer"
                 " versions of VMware ESXi will reject with the message '%s'."
@@ -27,19 +27,43 @@
 """
 
 import logging
+import multiprocessing
 import os
 import shutil
 import tarfile
 
 from contextlib import contextmanager, closing
+from multiprocessing.pool import ThreadPool
 
-from COT.data_validation import file_checksum
+from COT.data_validation import checksum_hash, file_checksums
+from COT.utilities import file_fingerprint
+from COT.tar_file import COPY_BLOCK_SIZE, TarIndex, TarMemberReader
 
 logger = logging.getLogger(__name__)
 
+CHECKSUM_WORKERS = None
+"""Default number of files to checksum concurrently.
+
+If ``None``, the number of CPUs in the system, up to a maximum of 8.
+"""
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+"""Default size of each read, in bytes, when checksumming a file."""
+
+CHECKSUM_CACHE = None
+"""Optional :class:`~COT.checksum_cache.ChecksumCache` to consult and update.
+
+If ``None`` (the default), checksums are not persisted between runs.
+"""
+
 
 class FileReference(object):
-    """Semi-abstract base class for file references."""
+    """Semi-abstract base class for file references.
+
+    The checksum of a file is computed at most once for any given
+    :attr:`fingerprint` of the file; it is only recomputed if the file
+    appears to have been modified since it was last checksummed.
+    """
 
     @classmethod
     def create(cls, container_path, filename, **kwargs):
@@ -98,9 +122,10 @@ class FileReference(object):
         self.container_path = container_path
         self.filename = os.path.normpath(filename)
         self.checksum_algorithm = checksum_algorithm
-        self._checksum = None
+        # Checksums, by algorithm, of the file as of _checksums_fingerprint
+        self._checksums = {}
+        self._checksums_fingerprint = None
         self._size = None
-        self.force_refresh = False
 
         logger.spam("Initing for file %s, expected_size %s,"
                     " expected_checksum %s",
@@ -110,15 +135,8 @@ class FileReference(object):
             raise IOError("File '{0}' does not exist in {1}"
                           .format(self.filename, self.container_path))
 
-        if expected_checksum is not None and (self.checksum !=
-                                              expected_checksum):
-            logger.error("The %s checksum for file '%s' is expected to be:"
-                         "\n%s\nbut is actually:\n%s\n"
-                         "This file may have been tampered with!",
-                         self.checksum_algorithm,
-                         self.filename,
-                         expected_checksum,
-                         self.checksum)
+        if expected_checksum is not None:
+            self.check_checksum(expected_checksum)
 
         if expected_size is not None and self.size != int(expected_size):
             logger.warning("The size of file '%s' is expected to be %s bytes,"
@@ -133,11 +151,255 @@ class FileReference(object):
         """Checksum of the referenced file."""
         if self.checksum_algorithm is None:
             return None
-        if self._checksum is None or self.force_refresh:
+        return self.get_checksum(self.checksum_algorithm)
+
+    def get_checksum(self, algorithm):
+        """Get the checksum of the referenced file using any algorithm.
+
+        Args:
+          algorithm (str): 'sha1', 'sha256', etc.
+
+        Returns:
+          str: Hexadecimal file checksum
+        """
+        checksum = self._known_checksum(algorithm)
+        if checksum is None:
+            checksum = self._compute_checksums([algorithm])[algorithm]
+        return checksum
+
+    def _known_checksum(self, algorithm):
+        """Get the given checksum, if known and the file hasn't since changed.
+
+        Args:
+          algorithm (str): 'sha1', 'sha256', etc.
+
+        Returns:
+          str: Checksum, or ``None`` if not known to be valid.
+        """
+        checksum = self._checksums.get(algorithm)
+        if checksum is None:
+            return None
+        try:
+            if self.fingerprint != self._checksums_fingerprint:
+                return None
+        except (IOError, OSError):
+            return None
+        return checksum
+
+    def _checksum_is_current(self):
+        """Check whether the file has changed since it was last checksummed.
+
+        Returns:
+          bool: True if :attr:`checksum` is known without reading the file.
+        """
+        return self._known_checksum(self.checksum_algorithm) is not None
+
+    def _compute_checksums(self, algorithms, blocksize=CHECKSUM_BLOCK_SIZE):
+        """Compute any of the given checksums that aren't already known.
+
+        Checksums are looked up in :data:`CHECKSUM_CACHE` if possible; any
+        others are computed together in a single pass through the file.
+
+        Args:
+          algorithms (list): Checksum algorithms such as 'sha1', 'sha256'.
+          blocksize (int): Number of bytes to read from the file at a time.
+
+        Returns:
+          dict: Algorithm --> hexadecimal file checksum
+        """
+        # Fingerprint *before* reading, so that any concurrent modification
+        # will invalidate the checksums we compute.
+        fingerprint = self.fingerprint
+        result = {}
+        needed = []
+        for algorithm in set(algorithms):
+            checksum = self._known_checksum(algorithm)
+            if checksum is None:
+                checksum = self._load_cached_checksum(fingerprint, algorithm)
+            if checksum is None:
+                needed.append(algorithm)
+            else:
+                result[algorithm] = checksum
+        if needed:
+            logger.debug("Computing %s checksum(s) of '%s'",
+                         ", ".join(sorted(needed)), self.filename)
             with self.open('rb') as file_obj:
-                self._checksum = file_checksum(file_obj,
-                                               self.checksum_algorithm)
-        return self._checksum
+                checksums = file_checksums(file_obj, needed, blocksize)
+            for algorithm, checksum in checksums.items():
+                self._store_checksum(fingerprint, algorithm, checksum)
+            result.update(checksums)
+        return result
+
+    def _load_cached_checksum(self, fingerprint, algorithm):
+        """Look up our checksum in the :data:`CHECKSUM_CACHE`, if any.
+
+        Args:
+          fingerprint (tuple): Current :attr:`fingerprint` of the file.
+          algorithm (str): Checksum algorithm.
+
+        Returns:
+          str: Checksum (now remembered), or ``None`` if not found.
+        """
+        if CHECKSUM_CACHE is None:
+            return None
+        checksum = CHECKSUM_CACHE.get(self.cache_key, fingerprint, algorithm)
+        if checksum is not None:
+            self._remember_checksum(fingerprint, algorithm, checksum)
+        return checksum
+
+    def _remember_checksum(self, fingerprint, algorithm, checksum):
+        """Remember a checksum of the file, as of the given fingerprint.
+
+        Args:
+          fingerprint (tuple): :attr:`fingerprint` at the time the file data
+            was read.
+          algorithm (str): Checksum algorithm.
+          checksum (str): Checksum computed from that data.
+        """
+        if fingerprint != self._checksums_fingerprint:
+            # Any other checksums we knew of are now out of date
+            self._checksums = {}
+            self._checksums_fingerprint = fingerprint
+        self._checksums[algorithm] = checksum
+
+    def _store_checksum(self, fingerprint, algorithm, checksum):
+        """Remember a newly computed checksum, and add it to any cache.
+
+        Args:
+          fingerprint (tuple): :attr:`fingerprint` at the time the file data
+            was read.
+          algorithm (str): Checksum algorithm.
+          checksum (str): Checksum computed from that data.
+        """
+        self._remember_checksum(fingerprint, algorithm, checksum)
+        if CHECKSUM_CACHE is not None:
+            CHECKSUM_CACHE.put(self.cache_key, fingerprint, algorithm,
+                               checksum)
+
+    def add_to_archive(self, tarf, compute_checksum=False):
+        """Copy this file into the given TAR archive.
+
+        Args:
+          tarf: :class:`~COT.tar_file.TarWriter` or
+            :class:`tarfile.TarFile` to add this file to.
+          compute_checksum (bool): If True, and the :attr:`checksum` of this
+            file isn't already known, compute it from the file data as it's
+            written to ``tarf`` (which must be a
+            :class:`~COT.tar_file.TarWriter`) rather than reading the file
+            a second time later.
+        """
+        hash_obj = None
+        algorithm = self.checksum_algorithm
+        if (compute_checksum and algorithm is not None and
+                not self._checksum_is_current()):
+            fingerprint = self.fingerprint
+            if self._load_cached_checksum(fingerprint, algorithm) is None:
+                logger.debug("Computing %s checksum of '%s' while copying it",
+                             algorithm, self.filename)
+                hash_obj = checksum_hash(algorithm)
+        self._add_to_archive(tarf, hash_obj)
+        if hash_obj is not None:
+            self._store_checksum(fingerprint, algorithm, hash_obj.hexdigest())
+
+    def _add_to_archive(self, tarf, hash_obj=None):
+        """Subclass-specific implementation of :meth:`add_to_archive`.
+
+        Args:
+          tarf: :class:`~COT.tar_file.TarWriter` or
+            :class:`tarfile.TarFile` to add this file to.
+          hash_obj (object): :mod:`hashlib` object to update with the file
+            data as it is written, if any.
+        """
+        raise NotImplementedError
+
+    def check_checksum(self, expected_checksum, algorithm=None):
+        """Compare the checksum of this file against the expected value.
+
+        Args:
+          expected_checksum (str): Expected checksum of the file.
+          algorithm (str): Algorithm of ``expected_checksum``, if other than
+            :attr:`checksum_algorithm`.
+
+        Returns:
+          bool: True if the checksum matches, else False (and logs an error).
+        """
+        if algorithm is None:
+            algorithm = self.checksum_algorithm
+        actual_checksum = self.get_checksum(algorithm)
+        if actual_checksum == expected_checksum:
+            return True
+        logger.error("The %s checksum for file '%s' is expected to be:"
+                     "\n%s\nbut is actually:\n%s\n"
+                     "This file may have been tampered with!",
+                     algorithm,
+                     self.filename,
+                     expected_checksum,
+                     actual_checksum)
+        return False
+
+    @staticmethod
+    def compute_checksums(file_refs, workers=None, blocksize=None,
+                          algorithms=None):
+        """Compute the checksums of many files concurrently.
+
+        Files are read and hashed by a pool of threads; as :mod:`hashlib`
+        releases the GIL while hashing, this can use multiple CPUs at once.
+        Files whose checksum is already known are not re-read, and each
+        file is read at most once regardless of how many checksum
+        algorithms are requested.
+
+        Args:
+          file_refs (list): :class:`FileReference` objects to checksum.
+          workers (int): Maximum number of files to checksum concurrently.
+            Defaults to :data:`CHECKSUM_WORKERS`.
+          blocksize (int): Number of bytes to read from each file at a time.
+            Defaults to :data:`CHECKSUM_BLOCK_SIZE`.
+          algorithms (list): For each file reference, a list of checksum
+            algorithms to compute (which should normally include its
+            :attr:`checksum_algorithm`). Defaults to just the
+            :attr:`checksum_algorithm` of each file.
+
+        Returns:
+          list: Checksum (or ``None``) of each file, in the same order as
+          ``file_refs``.
+        """
+        if workers is None:
+            workers = CHECKSUM_WORKERS
+        if workers is None:
+            workers = min(multiprocessing.cpu_count(), 8)
+        if blocksize is None:
+            blocksize = CHECKSUM_BLOCK_SIZE
+
+        if algorithms is None:
+            algorithms = [[ref.checksum_algorithm] for ref in file_refs]
+
+        pending = []
+        for ref, algos in zip(file_refs, algorithms):
+            algos = [algo for algo in algos if algo is not None and
+                     ref._known_checksum(algo) is None]
+            if algos:
+                pending.append((ref, algos))
+
+        def compute(args):
+            """Compute the checksums of one file."""
+            (ref, algos) = args
+            ref._compute_checksums(algos, blocksize)
+
+        workers = min(workers, len(pending))
+        if workers > 1:
+            logger.verbose("Computing checksums of %d files using %d threads",
+                           len(pending), workers)
+            pool = ThreadPool(workers)
+            try:
+                pool.map(compute, pending, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for args in pending:
+                compute(args)
+
+        return [ref.checksum for ref in file_refs]
 
     @property
     def exists(self):
@@ -149,6 +411,20 @@ class FileReference(object):
         """Actual path to a real file, if any."""
         return None
 
+    @property
+    def fingerprint(self):
+        """Tuple that changes whenever the file's contents may have changed.
+
+        Raises:
+          IOError: if the file does not exist.
+        """
+        raise NotImplementedError
+
+    @property
+    def cache_key(self):
+        """Get the unique path identifying this file in a checksum cache."""
+        raise NotImplementedError
+
     @property
     def size(self):
         """Size of the referenced file, in bytes."""
@@ -169,20 +445,24 @@ class FileReference(object):
         raise NotImplementedError
 
     def refresh(self):
-        """Make sure all information in this reference is still valid."""
+        """Make sure all information in this reference is still valid.
+
+        The file is only re-checksummed if its checksum was previously
+        computed and its :attr:`fingerprint` has since changed.
+
+        Returns:
+          bool: True if the file is unchanged, else False.
+        """
         # Cache the previously known values
-        exp_size = self.size
-        exp_checksum = self.checksum
+        exp_size = self._size
+        exp_checksum = self._checksums.get(self.checksum_algorithm)
         logger.spam("Refreshing FileReference for '%s', "
                     "expected size %s, cksum %s",
                     self.filename, exp_size, exp_checksum)
         result = True
 
-        self.force_refresh = True
-
         if not self.exists:
             logger.error("File '%s' no longer exists!", self.filename)
-            # keep force_refresh as True since we're in a bad state
             return False
 
         # Refresh the attributes and see if they've changed
@@ -192,7 +472,8 @@ class FileReference(object):
                            self.filename, exp_size, self.size)
             result = False
 
-        if self.checksum != exp_checksum and exp_checksum is not None:
+        # If the checksum was never needed before, don't compute it now
+        if exp_checksum is not None and self.checksum != exp_checksum:
             logger.error("The %s checksum of file '%s' has changed"
                          " from\n%s\nto\n%s\n"
                          "This file may have been tampered with!",
@@ -216,11 +497,23 @@ class FileOnDisk(FileReference):
         """Return True if the file exists on disk, else False."""
         return os.path.exists(self.file_path)
 
+    @property
+    def fingerprint(self):
+        """Device, inode, size, and modification time of the file."""
+        try:
+            return file_fingerprint(self.file_path)
+        except OSError as exc:
+            raise IOError(exc.errno, exc.strerror, self.file_path)
+
+    @property
+    def cache_key(self):
+        """Real path to this file."""
+        return os.path.realpath(self.file_path)
+
     @property
     def size(self):
         """Get the size of this file, in bytes."""
-        if self._size is None or self.force_refresh:
-            self._size = os.path.getsize(self.file_path)
+        self._size = os.path.getsize(self.file_path)
         return self._size
 
     @contextmanager
@@ -246,19 +539,30 @@ class FileOnDisk(FileReference):
         logger.debug("Copying %s to %s", self.file_path, dest_dir)
         shutil.copy(self.file_path, dest_dir)
 
-    def add_to_archive(self, tarf):
-        """Copy this file into the given tarfile object.
+    def _add_to_archive(self, tarf, hash_obj=None):
+        """Add this file to the given TAR archive.
 
         Args:
-          tarf (tarfile.TarFile): Add this file to that archive.
+          tarf: :class:`~COT.tar_file.TarWriter` or
+            :class:`tarfile.TarFile` to add this file to.
+          hash_obj (object): :mod:`hashlib` object to update with the file
+            data as it is written, if any.
         """
         logger.debug("Adding %s to TAR file as %s",
                      self.file_path, self.filename)
-        tarf.add(self.file_path, self.filename)
+        if hash_obj is None:
+            tarf.add(self.file_path, self.filename)
+        else:
+            tarf.add(self.file_path, self.filename, hash_obj=hash_obj)
 
 
 class FileInTAR(FileReference):
-    """Wrapper for a file inside a TAR archive or OVA."""
+    """Wrapper for a file inside a TAR archive or OVA.
+
+    All references to files within a given archive share a single
+    :class:`~COT.tar_file.TarIndex`, so the archive headers are only walked
+    once, no matter how many files are referenced or how often.
+    """
 
     def __init__(self, tarfile_path, filename, **kwargs):
         """Create a reference to a file contained in a TAR archive.
@@ -278,40 +582,71 @@ class FileInTAR(FileReference):
                            "\nAttempting to convert it to an absolute path.",
                            tarfile_path)
             tarfile_path = os.path.abspath(tarfile_path)
-        if not tarfile.is_tarfile(tarfile_path):
-            raise IOError("{0} is not a valid TAR file.".format(tarfile_path))
+        # Raises an IOError if this isn't a TAR file
+        TarIndex.for_path(tarfile_path)
         self.tarf = None
         super(FileInTAR, self).__init__(tarfile_path, filename, **kwargs)
 
+    @property
+    def index(self):
+        """Get the (shared) :class:`~COT.tar_file.TarIndex` for our archive."""
+        return TarIndex.for_path(self.container_path)
+
+    @property
+    def member(self):
+        """Get the :class:`~COT.tar_file.TarMember` describing this file.
+
+        Raises:
+          IOError: if the file no longer exists in the TAR archive.
+        """
+        member = self.index.lookup(self.filename)
+        if member is None:
+            raise IOError("File '{0}' does not exist in {1}"
+                          .format(self.filename, self.container_path))
+        return member
+
     @property
     def exists(self):
         """Return True if the file exists in the TAR archive, else False."""
-        with tarfile.open(self.container_path, 'r') as tarf:
-            try:
-                tarf.getmember(self.filename)
-                return True
-            except KeyError:
-                # Perhaps an issue with 'foo.txt' versus './foo.txt'?
-                for mem in tarf.getmembers():
-                    if os.path.normpath(mem.name) == self.filename:
-                        logger.debug("Found %s at %s in TAR file",
-                                     self.filename, mem.name)
-                        self.filename = mem.name
-                        return True
-                return False
+        try:
+            member = self.index.lookup(self.filename)
+        except IOError:
+            return False
+        if member is None:
+            return False
+        if member.name != self.filename:
+            # Perhaps an issue with 'foo.txt' versus './foo.txt'?
+            logger.debug("Found %s at %s in TAR file",
+                         self.filename, member.name)
+            self.filename = member.name
+        return True
+
+    @property
+    def fingerprint(self):
+        """Fingerprint of the TAR archive plus the location of this file."""
+        member = self.member
+        return self.index.fingerprint + (member.offset_data, member.size)
+
+    @property
+    def cache_key(self):
+        """Real path to the TAR archive, joined with the name of this file."""
+        return os.path.join(os.path.realpath(self.container_path),
+                            self.member.name)
 
     @property
     def size(self):
         """Get the size of this file in bytes."""
-        if self._size is None or self.force_refresh:
-            with tarfile.open(self.container_path, 'r') as tarf:
-                self._size = tarf.getmember(self.filename).size
+        self._size = self.member.size
         return self._size
 
     @contextmanager
     def open(self, mode):
         """Open the TAR and return a reference to the relevant file object.
 
+        Unless the file is stored sparsely in the TAR, the returned object
+        is a :class:`~COT.tar_file.TarMemberReader` reading directly from the
+        archive at the file's data offset.
+
         Args:
           mode (str): Only 'r' and 'rb' modes are supported.
         Yields:
@@ -322,10 +657,18 @@ class FileInTAR(FileReference):
         # We can only extract a file object from a TAR file in read mode.
         if mode != 'r' and mode != 'rb':
             raise ValueError("FileInTar.open() only supports 'r'/'rb' mode")
-        # actually tarf.extractfile is always a binary object...
+        member = self.member
+        if not member.tarinfo.issparse():
+            # Always a binary object, regardless of mode
+            with closing(TarMemberReader(self.container_path,
+                                         member)) as obj:
+                yield obj
+            return
+        # Sparse file data isn't contiguous in the TAR, so we have to let
+        # the tarfile module reassemble it for us.
         with tarfile.open(self.container_path, 'r') as tarf:
             self.tarf = tarf
-            with closing(tarf.extractfile(self.filename)) as obj:
+            with closing(tarf.extractfile(member.tarinfo)) as obj:
                 yield obj
         self.tarf = None
 
@@ -335,18 +678,38 @@ class FileInTAR(FileReference):
         Args:
           dest_dir (str): Destination directory or filename.
         """
-        with tarfile.open(self.container_path, 'r') as tarf:
-            logger.debug("Extracting %s from %s to %s",
-                         self.filename, self.container_path, dest_dir)
-            tarf.extract(self.filename, dest_dir)
-
-    def add_to_archive(self, tarf):
-        """Copy this file into the given tarfile object.
+        member = self.member
+        logger.debug("Extracting %s from %s to %s",
+                     self.filename, self.container_path, dest_dir)
+        if not member.tarinfo.isreg():
+            # Links, directories, etc. have no data for us to copy, so let
+            # the tarfile module recreate them appropriately.
+            with tarfile.open(self.container_path, 'r') as tarf:
+                tarf.extract(member.tarinfo, dest_dir)
+            return
+        dest_path = os.path.join(dest_dir, member.name)
+        if not os.path.isdir(os.path.dirname(dest_path)):
+            os.makedirs(os.path.dirname(dest_path))
+        with self.open('rb') as obj:
+            with open(dest_path, 'wb') as dest_obj:
+                shutil.copyfileobj(obj, dest_obj, COPY_BLOCK_SIZE)
+        os.chmod(dest_path, member.mode)
+        os.utime(dest_path, (member.tarinfo.mtime, member.tarinfo.mtime))
+
+    def _add_to_archive(self, tarf, hash_obj=None):
+        """Copy this file from its TAR archive into the given TAR archive.
 
         Args:
-          tarf (tarfile.TarFile): Add this file to that archive.
+          tarf: :class:`~COT.tar_file.TarWriter` or
+            :class:`tarfile.TarFile` to add this file to.
+          hash_obj (object): :mod:`hashlib` object to update with the file
+            data as it is written, if any.
         """
-        with self.open('r') as obj:
+        member = self.member
+        with self.open('rb') as obj:
             logger.debug("Copying %s directly from %s to TAR file",
                          self.filename, self.container_path)
-            tarf.addfile(self.tarf.getmember(self.filename), obj)
+            if hash_obj is None:
+                tarf.addfile(member.tarinfo, obj)
+            else:
+                tarf.addfile(member.tarinfo, obj, hash_obj=hash_obj)
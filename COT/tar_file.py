@@ -0,0 +1,826 @@
+#!/usr/bin/env python
+#
+# tar_file.py - Helpers for efficiently reading TAR archives such as OVAs
+#
+# October 2026, the COT project developers.
+# Copyright (c) 2026 the COT project developers.
+# See the COPYRIGHT.txt file at the top-level directory of this distribution
+# and at https://github.com/glennmatthews/cot/blob/master/COPYRIGHT.txt.
+#
+# This file is part of the Common OVF Tool (COT) project.
+# It is subject to the license terms in the LICENSE.txt file found in the
+# top-level directory of this distribution and at
+# https://github.com/glennmatthews/cot/blob/master/LICENSE.txt. No part
+# of COT, including this file, may be copied, modified, propagated, or
+# distributed except according to the terms contained in the LICENSE.txt file.
+
+"""Helpers for efficiently reading and writing TAR archives such as OVAs.
+
+Multi-gigabyte OVA files are expensive to scan, so rather than repeatedly
+re-opening the archive and walking its headers, COT builds a
+:class:`TarIndex` once per archive and shares it between all users.
+
+Similarly, when writing an OVA, :class:`TarWriter` moves file contents into
+the new archive using kernel-side copies wherever possible, rather than
+passing every byte through Python.
+
+**Classes**
+
+.. autosummary::
+  :nosignatures:
+
+  TarIndex
+  TarMember
+  TarMemberReader
+  TarWriter
+
+**Functions**
+
+.. autosummary::
+  :nosignatures:
+
+  copy_file_data
+"""
+
+import errno
+import io
+import logging
+import os
+import stat
+import sys
+import tarfile
+import tempfile
+import time
+from collections import namedtuple
+
+try:
+    import grp
+    import pwd
+except ImportError:
+    # Windows
+    grp = pwd = None
+
+from COT.utilities import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# os.replace() is Python 3.3+; on POSIX, os.rename() is equivalent
+_replace = getattr(os, 'replace', os.rename)
+
+COPY_BLOCK_SIZE = 1024 * 1024
+"""Size of each read, in bytes, when copying data through Python."""
+
+# sendfile() can only write to a socket on platforms other than Linux,
+# such as macOS, which fails with ENOTSOCK for a regular output file.
+_SPLICE_UNSUPPORTED_ERRNOS = frozenset(
+    code for code in (getattr(errno, name, None) for name in (
+        'EXDEV', 'ENOSYS', 'EINVAL', 'EOPNOTSUPP', 'ENOTSUP', 'ETXTBSY',
+        'ENOTSOCK'))
+    if code is not None)
+"""Errors that indicate a kernel-side copy isn't possible for these files."""
+
+
+TarMember = namedtuple('TarMember', ['name', 'offset', 'offset_data',
+                                     'size', 'mode', 'tarinfo'])
+"""Location and attributes of a single file within a TAR archive.
+
+Fields:
+  name (str): Name of the member as recorded in the archive.
+  offset (int): Offset of the member's (first) header within the archive.
+  offset_data (int): Offset of the member's data within the archive.
+  size (int): Size of the member's data, in bytes.
+  mode (int): Permission bits of the member.
+  tarinfo (tarfile.TarInfo): Full header information, as parsed by
+    :mod:`tarfile`, for use when re-archiving this member.
+"""
+
+
+class TarIndex(object):
+    """Index of the members of a TAR archive, built by a single header pass.
+
+    Instances should be obtained with :meth:`for_path` rather than by calling
+    the constructor directly, so that all users of a given archive share
+    the same index::
+
+      >>> from pkg_resources import resource_filename
+      >>> tar_path = resource_filename('COT.tests', 'test.tar')
+      >>> index = TarIndex.for_path(tar_path)
+      >>> index is TarIndex.for_path(tar_path)
+      True
+      >>> index.names
+      ['input.mf', 'sample_cfg.txt']
+      >>> index.lookup('./sample_cfg.txt').size
+      78
+      >>> index.lookup('nonexistent.txt') is None
+      True
+    """
+
+    _cache = {}
+    """Mapping of real archive path to previously built TarIndex."""
+
+    @classmethod
+    def for_path(cls, path):
+        """Get the (possibly cached) index for the given TAR archive.
+
+        The cached index is discarded and rebuilt if the archive has been
+        modified (as judged by :func:`~COT.utilities.file_fingerprint`)
+        since the index was built.
+
+        Args:
+          path (str): Path to a TAR archive.
+
+        Returns:
+          TarIndex: Index of this archive.
+
+        Raises:
+          IOError: if the file does not exist or is not a valid TAR archive.
+        """
+        real_path = os.path.realpath(path)
+        try:
+            fingerprint = file_fingerprint(real_path)
+        except OSError as exc:
+            raise IOError(exc.errno, exc.strerror, path)
+        index = cls._cache.get(real_path)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+        if index is not None:
+            logger.debug("TAR file %s has changed since it was indexed",
+                         path)
+        index = cls(real_path, fingerprint)
+        cls._cache[real_path] = index
+        return index
+
+    @classmethod
+    def invalidate(cls, path):
+        """Discard any cached index for the given TAR archive.
+
+        Args:
+          path (str): Path to a TAR archive.
+        """
+        cls._cache.pop(os.path.realpath(path), None)
+
+    def __init__(self, path, fingerprint):
+        """Walk the headers of the given TAR archive and index its members.
+
+        Args:
+          path (str): Path to a TAR archive.
+          fingerprint (tuple): Stat fingerprint of the archive at this time.
+
+        Raises:
+          IOError: if the file is not a valid TAR archive.
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.members = []
+        """List of :class:`TarMember` in archive order."""
+        self._by_name = {}
+        self._by_normpath = {}
+
+        logger.debug("Indexing members of TAR file %s", path)
+        try:
+            with tarfile.open(path, 'r') as tarf:
+                for tarinfo in tarf:
+                    self._add(tarinfo)
+        except (EOFError, tarfile.TarError) as exc:
+            raise IOError("{0} is not a valid TAR file: {1}"
+                          .format(path, exc))
+        logger.debug("Indexed %d members of TAR file %s",
+                     len(self.members), path)
+
+    def _add(self, tarinfo):
+        """Add the given TAR header to this index.
+
+        Args:
+          tarinfo (tarfile.TarInfo): Header to add.
+        """
+        member = TarMember(name=tarinfo.name,
+                           offset=tarinfo.offset,
+                           offset_data=tarinfo.offset_data,
+                           size=tarinfo.size,
+                           mode=tarinfo.mode,
+                           tarinfo=tarinfo)
+        self.members.append(member)
+        # As with tarfile.getmember(), the last occurrence of a name wins
+        self._by_name[member.name] = member
+        self._by_normpath[os.path.normpath(member.name)] = member
+
+    @property
+    def names(self):
+        """List of member names, in archive order."""
+        return [member.name for member in self.members]
+
+    def lookup(self, filename):
+        """Find the member corresponding to the given file name.
+
+        Names are compared exactly first, then after normalization, so that
+        ``foo.txt`` will match an archive member named ``./foo.txt``.
+
+        Args:
+          filename (str): File name to look up.
+
+        Returns:
+          TarMember: Matching member, or ``None`` if not found.
+        """
+        member = self._by_name.get(filename)
+        if member is None:
+            member = self._by_normpath.get(os.path.normpath(filename))
+        return member
+
+
+class TarMemberReader(io.RawIOBase):
+    r"""Raw, seekable, read-only view of a single member of a TAR archive.
+
+    Reads are served directly from the underlying archive at the member's
+    data offset (using :func:`os.preadv` or :func:`os.pread` where
+    available), without the intermediate buffering and seeking done by
+    :meth:`tarfile.TarFile.extractfile`. Reads are bounded so that they
+    never extend past the end of the member's data.
+
+    Supports :meth:`readinto` with caller-supplied buffers, so that large
+    members can be hashed or copied without a new allocation per read::
+
+      >>> from pkg_resources import resource_filename
+      >>> tar_path = resource_filename('COT.tests', 'test.tar')
+      >>> member = TarIndex.for_path(tar_path).lookup('sample_cfg.txt')
+      >>> with TarMemberReader(tar_path, member) as reader:
+      ...     buf = bytearray(16)
+      ...     reader.readinto(buf)
+      ...     buf[:2] == b'!\n'
+      ...     _ = reader.seek(-4, io.SEEK_END)
+      ...     reader.read(100) == b'end\n'
+      16
+      True
+      True
+    """
+
+    def __init__(self, path, member):
+        """Open the given TAR archive for reading the given member.
+
+        Args:
+          path (str): Path to the TAR archive.
+          member (TarMember): Member of this archive to read.
+        """
+        super(TarMemberReader, self).__init__()
+        self.name = member.name
+        self._file = io.open(path, 'rb', buffering=0)
+        self._start = member.offset_data
+        self._size = member.size
+        self._pos = 0
+
+    def close(self):
+        """Close this reader and the underlying archive file."""
+        if not self.closed:
+            self._file.close()
+        super(TarMemberReader, self).close()
+
+    def fileno(self):
+        """Get the file descriptor of the underlying *archive*.
+
+        Note that positions in this file are relative to the start of the
+        archive, not the member; see :attr:`archive_offset`.
+
+        Returns:
+          int: File descriptor
+        """
+        return self._file.fileno()
+
+    @property
+    def archive_offset(self):
+        """Offset within the archive corresponding to the current position."""
+        return self._start + self._pos
+
+    @property
+    def remaining(self):
+        """Get the number of member data bytes after the current position."""
+        return max(self._size - self._pos, 0)
+
+    def readable(self):
+        """Report that this object supports reading.
+
+        Returns:
+          bool: always ``True``
+        """
+        return True
+
+    def seekable(self):
+        """Report that this object supports random access.
+
+        Returns:
+          bool: always ``True``
+        """
+        return True
+
+    def tell(self):
+        """Get the current position relative to the start of the member.
+
+        Returns:
+          int: Current position.
+        """
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Change the current position within the member.
+
+        Args:
+          offset (int): Position, relative to ``whence``.
+          whence (int): :data:`io.SEEK_SET`, :data:`io.SEEK_CUR`,
+            or :data:`io.SEEK_END`.
+
+        Returns:
+          int: New absolute position.
+
+        Raises:
+          ValueError: if ``whence`` is invalid or the new position would
+            be negative.
+        """
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("Invalid whence ({0})".format(whence))
+        if pos < 0:
+            raise ValueError("Negative seek position {0}".format(pos))
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, buf):
+        """Read data from the member into the given pre-allocated buffer.
+
+        Args:
+          buf (bytearray): Writable buffer (or other object supporting
+            the buffer protocol) to read into.
+
+        Returns:
+          int: Number of bytes read, or 0 at the end of the member.
+        """
+        remaining = self._size - self._pos
+        if remaining <= 0:
+            return 0
+        view = memoryview(buf)
+        if view.format != 'B' or view.ndim != 1:
+            view = view.cast('B')
+        if len(view) > remaining:
+            view = view[:remaining]
+        count = self._pread_into(view, self._start + self._pos)
+        self._pos += count
+        return count
+
+    def readall(self):
+        """Read all data from the current position to the end of the member.
+
+        Returns:
+          bytes: Data read.
+        """
+        buf = bytearray(max(self._size - self._pos, 0))
+        view = memoryview(buf)
+        total = 0
+        while total < len(buf):
+            count = self.readinto(view[total:])
+            if not count:
+                break
+            total += count
+        del view
+        return bytes(buf[:total])
+
+    if hasattr(os, 'preadv'):
+        def _pread_into(self, view, offset):
+            """Read from the archive at the given offset into the buffer.
+
+            Args:
+              view (memoryview): Buffer to read into.
+              offset (int): Absolute offset within the archive.
+
+            Returns:
+              int: Number of bytes read.
+            """
+            return os.preadv(self._file.fileno(), [view], offset)
+    elif hasattr(os, 'pread'):
+        def _pread_into(self, view, offset):  # noqa: D102
+            data = os.pread(self._file.fileno(), len(view), offset)
+            view[:len(data)] = data
+            return len(data)
+    else:
+        def _pread_into(self, view, offset):  # noqa: D102
+            # Python 2.7 - no pread/preadv, so seek and read instead
+            self._file.seek(offset)
+            return self._file.readinto(view)
+
+
+def _write_all(fd, data):
+    """Write all of the given data to the given file descriptor.
+
+    Args:
+      fd (int): File descriptor to write to.
+      data (bytes): Data to write.
+    """
+    view = memoryview(data)
+    while view:
+        count = os.write(fd, view)
+        view = view[count:]
+
+
+def _copy_in_kernel(src_fd, src_offset, dst_fd, count):
+    """Copy data between files using kernel-side copy functions if possible.
+
+    Args:
+      src_fd (int): File descriptor to read from.
+      src_offset (int): Offset within the source file to start reading at.
+      dst_fd (int): File descriptor to write to, at its current position.
+      count (int): Number of bytes to copy.
+
+    Returns:
+      int: Number of bytes copied, which may be less than ``count``
+      (including zero) if kernel-side copying is unavailable for these files.
+    """
+    copied = 0
+    for method in (getattr(os, 'copy_file_range', None),
+                   getattr(os, 'sendfile', None)):
+        if method is None:
+            continue
+        try:
+            while copied < count:
+                if method is os.sendfile:
+                    done = os.sendfile(dst_fd, src_fd, src_offset + copied,
+                                       count - copied)
+                else:
+                    done = method(src_fd, dst_fd, count - copied,
+                                  src_offset + copied)
+                if done == 0:
+                    break
+                copied += done
+            break
+        except OSError as exc:
+            if exc.errno not in _SPLICE_UNSUPPORTED_ERRNOS:
+                raise
+            logger.debug("%s not supported here (%s), trying another way",
+                         method.__name__, exc.strerror)
+    return copied
+
+
+def _copy_buffered(src_fd, src_offset, dst_fd, count):
+    """Copy data between files by reading and writing through a buffer.
+
+    Args:
+      src_fd (int): File descriptor to read from.
+      src_offset (int): Offset within the source file to start reading at.
+      dst_fd (int): File descriptor to write to, at its current position.
+      count (int): Number of bytes to copy.
+
+    Returns:
+      int: Number of bytes copied, which is less than ``count`` only if
+      the source file ended first.
+    """
+    copied = 0
+    buf = bytearray(min(COPY_BLOCK_SIZE, count))
+    with io.open(src_fd, 'rb', buffering=0, closefd=False) as src:
+        while copied < count:
+            src.seek(src_offset + copied)
+            view = memoryview(buf)[:min(len(buf), count - copied)]
+            done = src.readinto(view)
+            if not done:
+                break
+            _write_all(dst_fd, view[:done])
+            copied += done
+    return copied
+
+
+def copy_file_data(src_fd, src_offset, dst_fd, count):
+    """Copy data from one file to the current position of another.
+
+    Uses :func:`os.copy_file_range` if available, else :func:`os.sendfile`,
+    so that the data is copied within the kernel (or, on filesystems that
+    support it, not copied at all). Falls back to a buffered copy if neither
+    is supported for the given files.
+
+    Args:
+      src_fd (int): File descriptor to read from.
+      src_offset (int): Offset within the source file to start reading at.
+        The source file's current position is not used or changed.
+      dst_fd (int): File descriptor to write to, at its current position.
+      count (int): Number of bytes to copy.
+
+    Raises:
+      IOError: if the source file does not contain ``count`` bytes
+        after ``src_offset``.
+    """
+    copied = _copy_in_kernel(src_fd, src_offset, dst_fd, count)
+    if copied < count:
+        copied += _copy_buffered(src_fd, src_offset + copied, dst_fd,
+                                 count - copied)
+
+    if copied < count:
+        raise IOError("Expected to copy {0} bytes but only {1} available"
+                      .format(count, copied))
+
+
+class TarWriter(object):
+    """Writer for uncompressed TAR archives such as OVAs.
+
+    Implements the :meth:`add` and :meth:`addfile` subset of the
+    :class:`tarfile.TarFile` API, producing equivalent output, plus
+    :meth:`addbytes` for data that's already in memory, but writes
+    the TAR headers itself so that file contents can be moved into the
+    archive with :func:`copy_file_data` instead of being read and
+    written in Python. In particular, contents of an existing archive
+    being read through a :class:`TarMemberReader` are spliced directly
+    from that archive.
+
+    Symbolic and hard links are always dereferenced.
+
+    With ``replace=True``, an existing archive (typically the very archive
+    whose members are being carried over) is atomically replaced. The new
+    archive is written to a temporary file in the same directory, reading
+    from the original as needed, and is only renamed over the original
+    once complete. If an error occurs, the original is left untouched.
+    """
+
+    def __init__(self, path, replace=False):
+        """Create a new TAR archive at the given path.
+
+        Args:
+          path (str): Path of archive to create (or overwrite).
+          replace (bool): If ``True``, write to a temporary file and
+            atomically rename it to ``path`` (or, if ``path`` is a link,
+            to the file it links to) on :meth:`close`.
+        """
+        self.path = path
+        self.format = tarfile.DEFAULT_FORMAT
+        self.encoding = tarfile.ENCODING
+        self.errors = ('surrogateescape' if sys.version_info[0] >= 3
+                       else 'strict')
+        self.offset = 0
+        if replace:
+            self._target = os.path.realpath(path)
+            (fd, self._temp_path) = tempfile.mkstemp(
+                prefix=".{0}.".format(os.path.basename(self._target)),
+                suffix=".tmp",
+                dir=os.path.dirname(self._target))
+            logger.debug("Writing replacement for %s to %s",
+                         self._target, self._temp_path)
+            self._file = io.open(fd, 'wb', buffering=0)
+            if os.path.exists(self._target):
+                os.chmod(self._temp_path,
+                         stat.S_IMODE(os.stat(self._target).st_mode))
+        else:
+            self._target = None
+            self._temp_path = None
+            TarIndex.invalidate(path)
+            self._file = io.open(path, 'wb', buffering=0)
+
+    def __enter__(self):
+        """Use this writer as a context manager.
+
+        Returns:
+          TarWriter: self
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        """Finish the archive, or discard it if an error occurred.
+
+        For the parameters, see :mod:`contextlib`.
+        """
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def closed(self):
+        """Whether the archive has been closed."""
+        return self._file.closed
+
+    def close(self):
+        """Write the end-of-archive marker and close the archive file.
+
+        If replacing an existing archive, this is when the replacement
+        actually takes place.
+        """
+        if self.closed:
+            return
+        # Two zero-filled blocks, then pad to a full record, as tarfile does
+        end = self.offset + 2 * tarfile.BLOCKSIZE
+        end += (tarfile.RECORDSIZE - end) % tarfile.RECORDSIZE
+        try:
+            self._write(tarfile.NUL * (end - self.offset))
+            if self._temp_path is not None:
+                os.fsync(self._file.fileno())
+        except Exception:
+            self.abort()
+            raise
+        self._file.close()
+        if self._temp_path is not None:
+            logger.debug("Replacing %s with %s",
+                         self._target, self._temp_path)
+            _replace(self._temp_path, self._target)
+            self._temp_path = None
+            TarIndex.invalidate(self._target)
+        TarIndex.invalidate(self.path)
+
+    def abort(self):
+        """Close the archive file without completing it.
+
+        If replacing an existing archive, the partial replacement is
+        deleted and the existing archive is left as-is.
+        """
+        self._file.close()
+        if self._temp_path is not None:
+            logger.debug("Discarding incomplete %s", self._temp_path)
+            os.remove(self._temp_path)
+            self._temp_path = None
+        else:
+            TarIndex.invalidate(self.path)
+
+    def _write(self, data):
+        """Write the given data to the archive at the current offset.
+
+        Args:
+          data (bytes): Data to write
+        """
+        _write_all(self._file.fileno(), data)
+        self.offset += len(data)
+
+    def _write_header(self, tarinfo):
+        """Write the header(s) describing the given member.
+
+        Args:
+          tarinfo (tarfile.TarInfo): Member to write header(s) for.
+        """
+        self._write(tarinfo.tobuf(self.format, self.encoding, self.errors))
+
+    def _pad(self, size):
+        """Write any padding needed after member data of the given size.
+
+        Args:
+          size (int): Size of the member data just written.
+        """
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            self._write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    def _splice(self, src_fd, src_offset, size):
+        """Copy member data from the given file into the archive.
+
+        Args:
+          src_fd (int): File descriptor to read from.
+          src_offset (int): Offset within the source file of the data.
+          size (int): Number of bytes to copy.
+        """
+        copy_file_data(src_fd, src_offset, self._file.fileno(), size)
+        self.offset += size
+        self._pad(size)
+
+    def gettarinfo(self, name, arcname=None):
+        """Create a TarInfo describing the given regular file on disk.
+
+        Args:
+          name (str): Path to a file, or link to a file.
+          arcname (str): Name of the file within the archive. Defaults to
+            ``name``.
+
+        Returns:
+          tarfile.TarInfo: Header information for this file.
+
+        Raises:
+          ValueError: if ``name`` is not (a link to) a regular file.
+        """
+        if arcname is None:
+            arcname = name
+        statres = os.stat(name)
+        if not stat.S_ISREG(statres.st_mode):
+            raise ValueError("{0} is not a regular file".format(name))
+        tarinfo = tarfile.TarInfo(arcname)
+        tarinfo.mode = statres.st_mode
+        tarinfo.uid = statres.st_uid
+        tarinfo.gid = statres.st_gid
+        tarinfo.size = statres.st_size
+        tarinfo.mtime = statres.st_mtime
+        tarinfo.type = tarfile.REGTYPE
+        self._set_owner_names(tarinfo)
+        return tarinfo
+
+    @staticmethod
+    def _set_owner_names(tarinfo):
+        """Fill in the user and group names for the given TarInfo, if known.
+
+        Args:
+          tarinfo (tarfile.TarInfo): Header information with ``uid`` and
+            ``gid`` already set.
+        """
+        if pwd is not None:
+            try:
+                tarinfo.uname = pwd.getpwuid(tarinfo.uid)[0]
+            except KeyError:
+                pass
+        if grp is not None:
+            try:
+                tarinfo.gname = grp.getgrgid(tarinfo.gid)[0]
+            except KeyError:
+                pass
+
+    def _copy(self, fileobj, tarinfo, hash_obj=None):
+        """Copy member data from the given file object through Python.
+
+        Args:
+          fileobj (file): File object to read ``tarinfo.size`` bytes from.
+          tarinfo (tarfile.TarInfo): Header information for the member.
+          hash_obj (object): :mod:`hashlib` object to update with the data.
+
+        Raises:
+          IOError: if ``fileobj`` does not supply enough data.
+        """
+        buf = bytearray(min(COPY_BLOCK_SIZE, tarinfo.size))
+        remaining = tarinfo.size
+        while remaining:
+            view = memoryview(buf)[:min(len(buf), remaining)]
+            if hasattr(fileobj, 'readinto'):
+                count = fileobj.readinto(view)
+            else:
+                data = fileobj.read(len(view))
+                count = len(data)
+                view[:count] = data
+            if not count:
+                raise IOError("Unexpected end of data for {0}"
+                              .format(tarinfo.name))
+            if hash_obj is not None:
+                hash_obj.update(view[:count])
+            self._write(view[:count])
+            remaining -= count
+        self._pad(tarinfo.size)
+
+    def add(self, name, arcname=None, hash_obj=None):
+        """Add the given file on disk to the archive.
+
+        Args:
+          name (str): Path to a file, or link to a file.
+          arcname (str): Name of the file within the archive. Defaults to
+            ``name``.
+          hash_obj (object): If set, a :mod:`hashlib` object to update with
+            the file's contents as they are written to the archive.
+        """
+        tarinfo = self.gettarinfo(name, arcname)
+        logger.spam("Adding %s to %s as %s", name, self.path, tarinfo.name)
+        with io.open(name, 'rb', buffering=0) as fileobj:
+            self._write_header(tarinfo)
+            if hash_obj is not None:
+                self._copy(fileobj, tarinfo, hash_obj)
+            else:
+                self._splice(fileobj.fileno(), 0, tarinfo.size)
+
+    def addbytes(self, data, arcname):
+        """Add the given in-memory data to the archive as a regular file.
+
+        The member is owned by the current user, with permissions ``0644``
+        and the current time as its modification time.
+
+        Args:
+          data (bytes): Contents of the file.
+          arcname (str): Name of the file within the archive.
+        """
+        tarinfo = tarfile.TarInfo(arcname)
+        tarinfo.mode = 0o644
+        if hasattr(os, 'getuid'):
+            tarinfo.uid = os.getuid()
+            tarinfo.gid = os.getgid()
+        tarinfo.size = len(data)
+        # An integer mtime, as a float would need an extra PAX header
+        tarinfo.mtime = int(time.time())
+        tarinfo.type = tarfile.REGTYPE
+        self._set_owner_names(tarinfo)
+        logger.spam("Adding %d bytes of data to %s as %s",
+                    len(data), self.path, arcname)
+        self._write_header(tarinfo)
+        self._write(data)
+        self._pad(len(data))
+
+    def addfile(self, tarinfo, fileobj=None, hash_obj=None):
+        """Add a member described by the given TarInfo to the archive.
+
+        Args:
+          tarinfo (tarfile.TarInfo): Header information for the member.
+          fileobj (file): File object to read ``tarinfo.size`` bytes of data
+            from, starting at its current position. If this is a
+            :class:`TarMemberReader` the data is spliced directly from the
+            archive it's reading from (unless ``hash_obj`` is set).
+          hash_obj (object): If set, a :mod:`hashlib` object to update with
+            the member data as it is written to the archive.
+
+        Raises:
+          IOError: if ``fileobj`` does not supply enough data.
+        """
+        self._write_header(tarinfo)
+        if fileobj is None or not tarinfo.isreg():
+            return
+        if isinstance(fileobj, TarMemberReader) and hash_obj is None:
+            if fileobj.remaining < tarinfo.size:
+                raise IOError("Unexpected end of data for {0}"
+                              .format(tarinfo.name))
+            self._splice(fileobj.fileno(), fileobj.archive_offset,
+                         tarinfo.size)
+            fileobj.seek(tarinfo.size, io.SEEK_CUR)
+            return
+        # Generic file-like object, or we need to see the data to hash it
+        self._copy(fileobj, tarinfo, hash_obj)
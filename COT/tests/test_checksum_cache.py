@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# test_checksum_cache.py - Unit test cases for COT persistent checksum cache
+#
+# October 2026, the COT project developers.
+# Copyright (c) 2026 the COT project developers.
+# See the COPYRIGHT.txt file at the top-level directory of this distribution
+# and at https://github.com/glennmatthews/cot/blob/master/COPYRIGHT.txt.
+#
+# This file is part of the Common OVF Tool (COT) project.
+# It is subject to the license terms in the LICENSE.txt file found in the
+# top-level directory of this distribution and at
+# https://github.com/glennmatthews/cot/blob/master/LICENSE.txt. No part
+# of COT, including this file, may be copied, modified, propagated, or
+# distributed except according to the terms contained in the LICENSE.txt file.
+
+"""Unit test cases for COT.checksum_cache module."""
+
+import os
+
+import mock
+from pkg_resources import resource_filename
+
+import COT.file_reference
+from COT.tests import COTTestCase
+from COT.checksum_cache import ChecksumCache
+from COT.data_validation import file_checksum
+from COT.file_reference import FileOnDisk, FileInTAR
+
+
+class TestChecksumCache(COTTestCase):
+    """Test cases for ChecksumCache class."""
+
+    def setUp(self):
+        """Test case setup function called automatically prior to each test."""
+        super(TestChecksumCache, self).setUp()
+        self.cache_path = os.path.join(self.temp_dir, "cot", "cache.sqlite")
+        self.cache = ChecksumCache(self.cache_path, max_entries=3)
+
+    def tearDown(self):
+        """Test case cleanup function called automatically."""
+        self.cache.close()
+        super(TestChecksumCache, self).tearDown()
+
+    def test_default_path(self):
+        """Cache location honors $XDG_CACHE_HOME."""
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '/foo/cache'}):
+            self.assertEqual(ChecksumCache.default_path(),
+                             "/foo/cache/cot/checksums.sqlite")
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '',
+                                          'HOME': '/home/bar'}):
+            self.assertEqual(ChecksumCache.default_path(),
+                             "/home/bar/.cache/cot/checksums.sqlite")
+
+    def test_persistent(self):
+        """Entries persist across instances, keyed by all identifiers."""
+        self.cache.put("/a", (1, 2, 3, 4), "sha1", "aaaa")
+        self.cache.put("/a", (1, 2, 3, 4), "sha256", "bbbb")
+        self.cache.close()
+        self.cache = ChecksumCache(self.cache_path)
+        self.assertEqual(self.cache.get("/a", (1, 2, 3, 4), "sha1"), "aaaa")
+        self.assertEqual(self.cache.get("/a", (1, 2, 3, 4), "sha256"),
+                         "bbbb")
+        self.assertIsNone(self.cache.get("/a", (1, 2, 3, 4), "md5"))
+        self.assertIsNone(self.cache.get("/b", (1, 2, 3, 4), "sha1"))
+        self.assertIsNone(self.cache.get("/a", (1, 2, 3, 5), "sha1"))
+        # A changed fingerprint replaces the old entry
+        self.cache.put("/a", (1, 2, 3, 5), "sha1", "cccc")
+        self.assertEqual(self.cache.get("/a", (1, 2, 3, 5), "sha1"), "cccc")
+        self.assertIsNone(self.cache.get("/a", (1, 2, 3, 4), "sha1"))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_lru_eviction(self):
+        """Least recently used entries are evicted when the cache is full."""
+        for name in ["/a", "/b", "/c"]:
+            self.cache.put(name, (1,), "sha1", name)
+        # Touch /a so that /b is now the least recently used
+        self.assertEqual(self.cache.get("/a", (1,), "sha1"), "/a")
+        self.cache.put("/d", (1,), "sha1", "/d")
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get("/b", (1,), "sha1"))
+        for name in ["/a", "/c", "/d"]:
+            self.assertEqual(self.cache.get(name, (1,), "sha1"), name)
+
+    def test_unusable_path(self):
+        """IOError if the cache can't be created."""
+        self.assertRaises(IOError, ChecksumCache,
+                          os.path.join(self.input_ovf, "cache.sqlite"))
+
+
+class TestFileReferenceWithCache(COTTestCase):
+    """Test cases for FileReference use of a ChecksumCache."""
+
+    def setUp(self):
+        """Test case setup function called automatically prior to each test."""
+        super(TestFileReferenceWithCache, self).setUp()
+        self.cache = ChecksumCache(os.path.join(self.temp_dir, "cache.sqlite"))
+        patcher = mock.patch.object(COT.file_reference, 'CHECKSUM_CACHE',
+                                    self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache.close)
+
+    def test_cache_used(self):
+        """Checksums are read from the cache rather than recomputed."""
+        tar_path = resource_filename(__name__, "test.tar")
+        refs = [
+            lambda: FileOnDisk(os.path.dirname(self.input_ovf),
+                               os.path.basename(self.input_ovf),
+                               checksum_algorithm='sha1'),
+            lambda: FileInTAR(tar_path, 'sample_cfg.txt',
+                              checksum_algorithm='sha1'),
+        ]
+        expected = [file_checksum(self.input_ovf, 'sha1'),
+                    file_checksum(self.sample_cfg, 'sha1')]
+        for make_ref, checksum in zip(refs, expected):
+            self.assertEqual(make_ref().checksum, checksum)
+        self.assertEqual(len(self.cache), 2)
+
+        with mock.patch('COT.file_reference.file_checksums') as compute:
+            for make_ref, checksum in zip(refs, expected):
+                self.assertEqual(make_ref().checksum, checksum)
+            compute.assert_not_called()
@@ -19,7 +19,7 @@
 import re
 
 from COT.data_validation import (
-    match_or_die, file_checksum,
+    match_or_die, file_checksum, file_checksums,
     canonicalize_helper, canonicalize_nic_subtype, NIC_TYPES,
     mac_address, device_address, no_whitespace, truth_value,
     validate_int, non_negative_int, positive_int,
@@ -54,6 +54,17 @@ class TestFileChecksum(COTTestCase):
                          "0d25f7544be720ec07d9a7e09516d07b"
                          "a89d2efdc53f8b4c76a8375854d3a578")
 
+    def test_file_checksums(self):
+        """Test case for file_checksums() with several algorithms at once."""
+        with open(self.input_ovf, 'rb') as file_obj:
+            checksums = file_checksums(file_obj, ['md5', 'sha1', 'sha512'],
+                                       blocksize=1000)
+        self.assertEqual(checksums, {
+            'md5': "4e7a3ba0b70f6784a3a91b18336296c7",
+            'sha1': "c3bd2579c2edc76ea35b5bde7d4f4e41eab08963",
+            'sha512': file_checksum(self.input_ovf, 'sha512'),
+        })
+
     def test_file_checksum_unsupported(self):
         """Test invalid options to file_checksum()."""
         self.assertRaises(NotImplementedError,
@@ -31,6 +31,8 @@ def load_tests(*_):
     For the parameters, see :mod:`unittest`. The parameters are unused here.
     """
     suite = TestSuite()
+    suite.addTests(DocTestSuite('COT.checksum_cache'))
     suite.addTests(DocTestSuite('COT.data_validation'))
+    suite.addTests(DocTestSuite('COT.tar_file'))
     suite.addTests(DocTestSuite('COT.utilities'))
     return suite
@@ -17,12 +17,16 @@
 """Unit test cases for COT.file_reference classes."""
 
 import os
+import shutil
 import tarfile
 
+import mock
 from pkg_resources import resource_filename
 
 from COT.tests import COTTestCase
+from COT.data_validation import file_checksum, file_checksums
 from COT.file_reference import FileReference, FileOnDisk, FileInTAR
+from COT.tar_file import TarMemberReader, TarWriter
 
 
 class TestFileReference(COTTestCase):
@@ -59,6 +63,125 @@ class TestFileReference(COTTestCase):
         self.assertRaises(NotImplementedError, FileReference.create,
                           self.input_vmdk, "config.txt")
 
+    def test_compute_checksums(self):
+        """Test compute_checksums() API, serially and in parallel."""
+        tar_path = resource_filename(__name__, "test.tar")
+        for workers in [1, 4]:
+            refs = [
+                FileOnDisk(os.path.dirname(path), os.path.basename(path),
+                           checksum_algorithm='sha256')
+                for path in [self.input_ovf, self.input_vmdk, self.input_iso]
+            ]
+            refs.append(FileInTAR(tar_path, "sample_cfg.txt",
+                                  checksum_algorithm='sha256'))
+            refs.append(FileInTAR(tar_path, "input.mf"))
+            checksums = FileReference.compute_checksums(refs,
+                                                        workers=workers,
+                                                        blocksize=1000)
+            self.assertEqual(checksums, [
+                file_checksum(self.input_ovf, 'sha256'),
+                file_checksum(self.input_vmdk, 'sha256'),
+                file_checksum(self.input_iso, 'sha256'),
+                file_checksum(self.sample_cfg, 'sha256'),
+                None,
+            ])
+            # Already known checksums are not recomputed
+            with mock.patch.object(FileOnDisk, '_compute_checksums') as comp:
+                self.assertEqual(
+                    FileReference.compute_checksums(refs, workers=workers),
+                    checksums)
+                comp.assert_not_called()
+
+    def test_multiple_algorithms(self):
+        """Several checksums of one file are computed in a single read."""
+        ref = FileOnDisk(os.path.dirname(self.input_ovf),
+                         os.path.basename(self.input_ovf),
+                         checksum_algorithm='sha1')
+        with mock.patch('COT.file_reference.file_checksums',
+                        wraps=file_checksums) as checksum:
+            self.assertEqual(
+                FileReference.compute_checksums(
+                    [ref], algorithms=[['sha1', 'sha256', 'md5']]),
+                [file_checksum(self.input_ovf, 'sha1')])
+            self.assertEqual(checksum.call_count, 1)
+            self.assertEqual(ref.get_checksum('sha256'),
+                             file_checksum(self.input_ovf, 'sha256'))
+            self.assertEqual(ref.get_checksum('md5'),
+                             file_checksum(self.input_ovf, 'md5'))
+            self.assertTrue(ref.check_checksum(
+                file_checksum(self.input_ovf, 'sha256'), 'sha256'))
+            self.assertEqual(checksum.call_count, 1)
+        self.assertFalse(ref.check_checksum("12345", 'md5'))
+        self.assertLogged(levelname="ERROR",
+                          msg="The %s checksum for file '%s' is expected to "
+                          "be:", args=('md5', 'input.ovf', '12345',
+                                       file_checksum(self.input_ovf, 'md5')))
+
+    def test_check_checksum(self):
+        """Test check_checksum() API and checksum mismatch on creation."""
+        ref = FileOnDisk(os.path.dirname(self.input_ovf),
+                         os.path.basename(self.input_ovf),
+                         checksum_algorithm='sha1')
+        self.assertTrue(ref.check_checksum(
+            file_checksum(self.input_ovf, 'sha1')))
+        self.assertFalse(ref.check_checksum("12345"))
+        self.assertLogged(levelname="ERROR",
+                          msg="The %s checksum for file '%s' is expected to "
+                          "be:", args=('sha1', 'input.ovf', '12345'))
+        FileOnDisk(os.path.dirname(self.input_ovf),
+                   os.path.basename(self.input_ovf),
+                   checksum_algorithm='sha1', expected_checksum="12345")
+        self.assertLogged(levelname="ERROR",
+                          msg="The %s checksum for file '%s' is expected to "
+                          "be:", args=('sha1', 'input.ovf', '12345'))
+
+    def test_add_to_archive_checksum(self):
+        """Checksums can be computed while adding files to an archive."""
+        tar_path = resource_filename(__name__, "test.tar")
+        refs = [FileOnDisk(os.path.dirname(self.input_ovf),
+                           os.path.basename(self.input_ovf),
+                           checksum_algorithm='sha1'),
+                FileInTAR(tar_path, "sample_cfg.txt",
+                          checksum_algorithm='sha1')]
+        with mock.patch('COT.file_reference.file_checksums') as checksum:
+            with TarWriter(os.path.join(self.temp_dir, "out.tar")) as tarw:
+                for ref in refs:
+                    ref.add_to_archive(tarw, compute_checksum=True)
+            self.assertEqual([ref.checksum for ref in refs],
+                             [file_checksum(self.input_ovf, 'sha1'),
+                              file_checksum(self.sample_cfg, 'sha1')])
+            checksum.assert_not_called()
+
+    def test_refresh_hashes_once(self):
+        """refresh() only recomputes the checksum if the file has changed."""
+        path = os.path.join(self.temp_dir, "input.ovf")
+        shutil.copy(self.input_ovf, path)
+        ref = FileOnDisk(self.temp_dir, "input.ovf",
+                         checksum_algorithm='sha1',
+                         expected_checksum=file_checksum(path, 'sha1'))
+        with mock.patch('COT.file_reference.file_checksums',
+                        wraps=file_checksums) as checksum:
+            self.assertTrue(ref.refresh())
+            self.assertTrue(ref.refresh())
+            self.assertEqual(ref.checksum, file_checksum(path, 'sha1'))
+            checksum.assert_not_called()
+
+            with open(path, 'ab') as fileobj:
+                fileobj.write(b'\n')
+            self.assertFalse(ref.refresh())
+            self.assertEqual(checksum.call_count, 1)
+            self.assertLogged(levelname="WARNING",
+                              msg="Size of file '%s' has changed")
+            self.assertLogged(levelname="ERROR",
+                              msg="The %s checksum of file '%s' has changed")
+            self.assertTrue(ref.refresh())
+            self.assertEqual(checksum.call_count, 1)
+
+        os.remove(path)
+        self.assertFalse(ref.refresh())
+        self.assertLogged(levelname="ERROR",
+                          msg="File '%s' no longer exists!")
+
 
 class TestFileOnDisk(COTTestCase):
     """Test cases for FileOnDisk class."""
@@ -150,6 +273,11 @@ class TestFileInTAR(COTTestCase):
         self.assertTrue(relative_ref.exists)
         self.assertLogged(**self.FILE_REF_RELATIVE)
 
+    def test_shared_index(self):
+        """All references into the same TAR file share one member index."""
+        other_ref = FileInTAR(self.tarfile, "input.mf")
+        self.assertIs(self.valid_ref.index, other_ref.index)
+
     def test_size(self):
         """Test the size property."""
         self.assertEqual(self.valid_ref.size,
@@ -174,6 +302,11 @@ class TestFileInTAR(COTTestCase):
         # obj should be closed now
         self.assertRaises(ValueError, obj.read)
 
+    def test_open_direct(self):
+        """Non-sparse files are read directly from the TAR."""
+        with self.valid_ref.open('rb') as obj:
+            self.assertIsInstance(obj, TarMemberReader)
+
     def test_copy_to(self):
         """Test the copy_to() API."""
         self.valid_ref.copy_to(self.temp_dir)
@@ -181,6 +314,23 @@ class TestFileInTAR(COTTestCase):
                         file1=resource_filename(__name__, 'sample_cfg.txt'),
                         file2=os.path.join(self.temp_dir, 'sample_cfg.txt'))
 
+    def test_copy_to_symlink(self):
+        """A symlink member is extracted as a symlink, not as a file."""
+        tar_path = os.path.join(self.temp_dir, 'links.tar')
+        with tarfile.open(tar_path, 'w') as tarf:
+            tarf.add(resource_filename(__name__, 'sample_cfg.txt'),
+                     'sample_cfg.txt')
+            info = tarfile.TarInfo('link.txt')
+            info.type = tarfile.SYMTYPE
+            info.linkname = 'sample_cfg.txt'
+            tarf.addfile(info)
+        dest_dir = os.path.join(self.temp_dir, 'out')
+        os.makedirs(dest_dir)
+        FileInTAR(tar_path, 'link.txt').copy_to(dest_dir)
+        link_path = os.path.join(dest_dir, 'link.txt')
+        self.assertTrue(os.path.islink(link_path))
+        self.assertEqual(os.readlink(link_path), 'sample_cfg.txt')
+
     def test_add_to_archive(self):
         """Test the add_to_archive() API."""
         output_tarfile = os.path.join(self.temp_dir, 'test_output.tar')
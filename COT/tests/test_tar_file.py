@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+#
+# test_tar_file.py - Unit test cases for COT TAR archive helpers
+#
+# October 2026, the COT project developers.
+# Copyright (c) 2026 the COT project developers.
+# See the COPYRIGHT.txt file at the top-level directory of this distribution
+# and at https://github.com/glennmatthews/cot/blob/master/COPYRIGHT.txt.
+#
+# This file is part of the Common OVF Tool (COT) project.
+# It is subject to the license terms in the LICENSE.txt file found in the
+# top-level directory of this distribution and at
+# https://github.com/glennmatthews/cot/blob/master/LICENSE.txt. No part
+# of COT, including this file, may be copied, modified, propagated, or
+# distributed except according to the terms contained in the LICENSE.txt file.
+
+"""Unit test cases for COT.tar_file module."""
+
+import errno
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+
+import mock
+from pkg_resources import resource_filename
+
+from COT.tests import COTTestCase
+from COT.data_validation import file_checksum
+from COT.tar_file import (
+    TarIndex, TarMemberReader, TarWriter, copy_file_data,
+)
+
+
+class TestTarIndex(COTTestCase):
+    """Test cases for TarIndex class."""
+
+    def setUp(self):
+        """Test case setup function called automatically prior to each test."""
+        super(TestTarIndex, self).setUp()
+        self.tarfile = os.path.join(self.temp_dir, "test.tar")
+        shutil.copy(resource_filename(__name__, "test.tar"), self.tarfile)
+
+    def test_members(self):
+        """Member offsets and sizes are consistent with the archive."""
+        index = TarIndex.for_path(self.tarfile)
+        self.assertEqual(index.names, ['input.mf', 'sample_cfg.txt'])
+        member = index.lookup('sample_cfg.txt')
+        self.assertEqual(member.offset_data, member.offset + 512)
+        self.assertEqual(member.size, 78)
+        with open(self.tarfile, 'rb') as fileobj:
+            fileobj.seek(member.offset_data)
+            data = fileobj.read(member.size)
+        with open(resource_filename(__name__, "sample_cfg.txt"),
+                  'rb') as fileobj:
+            self.assertEqual(data, fileobj.read())
+
+    def test_shared(self):
+        """The same index is returned for the same (unchanged) file."""
+        index = TarIndex.for_path(self.tarfile)
+        self.assertIs(index, TarIndex.for_path(self.tarfile))
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            self.assertIs(index, TarIndex.for_path("test.tar"))
+        finally:
+            os.chdir(cwd)
+
+    def test_invalidated_on_change(self):
+        """The index is rebuilt if the archive is modified."""
+        index = TarIndex.for_path(self.tarfile)
+        with tarfile.open(self.tarfile, 'a') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+        new_index = TarIndex.for_path(self.tarfile)
+        self.assertIsNot(index, new_index)
+        self.assertIsNone(index.lookup('input.ovf'))
+        self.assertIsNotNone(new_index.lookup('input.ovf'))
+
+    def test_invalidate(self):
+        """Explicit invalidation discards the cached index."""
+        index = TarIndex.for_path(self.tarfile)
+        TarIndex.invalidate(self.tarfile)
+        self.assertIsNot(index, TarIndex.for_path(self.tarfile))
+
+    def test_not_tarfile(self):
+        """Error handling for invalid or missing files."""
+        self.assertRaises(IOError, TarIndex.for_path, self.input_ovf)
+        self.assertRaises(IOError, TarIndex.for_path, "/foo/bar.tar")
+
+
+class TestTarMemberReader(COTTestCase):
+    """Test cases for TarMemberReader class."""
+
+    def setUp(self):
+        """Test case setup function called automatically prior to each test."""
+        super(TestTarMemberReader, self).setUp()
+        self.tarfile = resource_filename(__name__, "test.tar")
+        self.member = TarIndex.for_path(self.tarfile).lookup("sample_cfg.txt")
+        with open(resource_filename(__name__, "sample_cfg.txt"),
+                  'rb') as fileobj:
+            self.expected = fileobj.read()
+
+    def test_read(self):
+        """Reads are bounded by the end of the member."""
+        with TarMemberReader(self.tarfile, self.member) as reader:
+            self.assertEqual(reader.read(), self.expected)
+            self.assertEqual(reader.read(), b'')
+            reader.seek(0)
+            self.assertEqual(reader.read(10), self.expected[:10])
+            self.assertEqual(reader.read(1000), self.expected[10:])
+            self.assertEqual(reader.tell(), len(self.expected))
+
+    def test_readinto(self):
+        """Reads into a caller-supplied buffer, never past the member end."""
+        buf = bytearray(1024)
+        with TarMemberReader(self.tarfile, self.member) as reader:
+            self.assertEqual(reader.readinto(buf), len(self.expected))
+            self.assertEqual(bytes(buf[:len(self.expected)]), self.expected)
+            # Rest of the buffer (and rest of the TAR) is untouched
+            self.assertEqual(buf[len(self.expected):],
+                             bytearray(1024 - len(self.expected)))
+            self.assertEqual(reader.readinto(buf), 0)
+
+    def test_seek(self):
+        """Seek relative to start, current position, and end."""
+        with TarMemberReader(self.tarfile, self.member) as reader:
+            self.assertTrue(reader.seekable())
+            self.assertEqual(reader.seek(5), 5)
+            self.assertEqual(reader.seek(5, io.SEEK_CUR), 10)
+            self.assertEqual(reader.read(5), self.expected[10:15])
+            self.assertEqual(reader.seek(-4, io.SEEK_END),
+                             len(self.expected) - 4)
+            self.assertEqual(reader.read(), self.expected[-4:])
+            self.assertRaises(ValueError, reader.seek, -1)
+            self.assertRaises(ValueError, reader.seek, 0, 42)
+            # Seeking past the end is permitted but reads nothing
+            reader.seek(1000)
+            self.assertEqual(reader.read(), b'')
+        self.assertTrue(reader.closed)
+
+
+class TestTarWriter(COTTestCase):
+    """Test cases for TarWriter class and copy_file_data function."""
+
+    def setUp(self):
+        """Test case setup function called automatically prior to each test."""
+        super(TestTarWriter, self).setUp()
+        self.output = os.path.join(self.temp_dir, "out.tar")
+        self.input_tar = resource_filename(__name__, "test.tar")
+
+    def test_same_as_tarfile(self):
+        """Output is byte-for-byte identical to that of tarfile."""
+        expected = os.path.join(self.temp_dir, "expected.tar")
+        with tarfile.open(expected, 'w', dereference=True) as tarf:
+            tarf.add(self.input_ovf, "input.ovf")
+            tarf.add(self.minimal_ovf, "minimal.ovf")
+        with TarWriter(self.output) as tarw:
+            tarw.add(self.input_ovf, "input.ovf")
+            tarw.add(self.minimal_ovf, "minimal.ovf")
+        with open(expected, 'rb') as exp, open(self.output, 'rb') as act:
+            self.assertEqual(exp.read(), act.read())
+
+    def test_splice_from_archive(self):
+        """Members of another archive are copied directly from it."""
+        index = TarIndex.for_path(self.input_tar)
+        with TarWriter(self.output) as tarw:
+            for member in index.members:
+                with TarMemberReader(self.input_tar, member) as reader:
+                    tarw.addfile(member.tarinfo, reader)
+                    self.assertEqual(reader.read(), b'')
+            # Ordinary file objects work too
+            with open(self.input_ovf, 'rb') as fileobj:
+                tarw.addfile(tarw.gettarinfo(self.input_ovf, "input.ovf"),
+                             fileobj)
+        self.assertEqual(os.path.getsize(self.output) % tarfile.RECORDSIZE,
+                         0)
+        with tarfile.open(self.output, 'r') as tarf:
+            self.assertEqual(tarf.getnames(),
+                             ['input.mf', 'sample_cfg.txt', 'input.ovf'])
+            with open(resource_filename(__name__, "sample_cfg.txt"),
+                      'rb') as fileobj:
+                self.assertEqual(
+                    tarf.extractfile('sample_cfg.txt').read(),
+                    fileobj.read())
+
+    def test_hash_while_writing(self):
+        """Data can be hashed as it's written, instead of being spliced."""
+        member = TarIndex.for_path(self.input_tar).lookup("sample_cfg.txt")
+        ovf_hash = hashlib.sha1()
+        cfg_hash = hashlib.sha1()
+        with TarWriter(self.output) as tarw:
+            tarw.add(self.input_ovf, "input.ovf", hash_obj=ovf_hash)
+            with TarMemberReader(self.input_tar, member) as reader:
+                tarw.addfile(member.tarinfo, reader, hash_obj=cfg_hash)
+        self.assertEqual(ovf_hash.hexdigest(),
+                         file_checksum(self.input_ovf, 'sha1'))
+        self.assertEqual(cfg_hash.hexdigest(),
+                         file_checksum(self.sample_cfg, 'sha1'))
+        with tarfile.open(self.output, 'r') as tarf:
+            self.assertEqual(tarf.getnames(), ['input.ovf', 'sample_cfg.txt'])
+            with open(self.sample_cfg, 'rb') as fileobj:
+                self.assertEqual(tarf.extractfile('sample_cfg.txt').read(),
+                                 fileobj.read())
+
+    def test_addbytes(self):
+        """In-memory data can be added as a file."""
+        with TarWriter(self.output) as tarw:
+            tarw.addbytes(b"hello world\n", "hello.txt")
+            tarw.add(self.input_ovf, "input.ovf")
+        with tarfile.open(self.output, 'r') as tarf:
+            self.assertEqual(tarf.getnames(), ['hello.txt', 'input.ovf'])
+            member = tarf.getmember('hello.txt')
+            self.assertTrue(member.isfile())
+            self.assertEqual(member.mode, 0o644)
+            # Just a single header block, with no PAX extended header
+            self.assertEqual(member.offset, 0)
+            self.assertEqual(member.offset_data, tarfile.BLOCKSIZE)
+            self.assertEqual(member.pax_headers, {})
+            self.assertEqual(tarf.extractfile(member).read(),
+                             b"hello world\n")
+            with open(self.input_ovf, 'rb') as fileobj:
+                self.assertEqual(tarf.extractfile('input.ovf').read(),
+                                 fileobj.read())
+
+    def test_short_data(self):
+        """Error if the provided file object runs out of data."""
+        member = TarIndex.for_path(self.input_tar).lookup("sample_cfg.txt")
+        with TarWriter(self.output) as tarw:
+            with TarMemberReader(self.input_tar, member) as reader:
+                reader.seek(10)
+                self.assertRaises(IOError, tarw.addfile, member.tarinfo,
+                                  reader)
+            with open(self.input_ovf, 'rb') as fileobj:
+                tarinfo = tarw.gettarinfo(self.input_ovf, "input.ovf")
+                tarinfo.size += 1
+                self.assertRaises(IOError, tarw.addfile, tarinfo, fileobj)
+
+    def test_not_regular_file(self):
+        """Only regular files can be added from disk."""
+        with TarWriter(self.output) as tarw:
+            self.assertRaises(ValueError, tarw.add, self.temp_dir)
+
+    def test_replace(self):
+        """Replace an archive with one built from its own contents."""
+        shutil.copy(self.input_tar, self.output)
+        os.chmod(self.output, 0o640)
+        index = TarIndex.for_path(self.output)
+        with TarWriter(self.output, replace=True) as tarw:
+            tarw.add(self.input_ovf, "input.ovf")
+            for member in index.members:
+                with TarMemberReader(self.output, member) as reader:
+                    tarw.addfile(member.tarinfo, reader)
+        self.assertEqual(os.listdir(self.temp_dir), ["out.tar"])
+        self.assertEqual(os.stat(self.output).st_mode & 0o777, 0o640)
+        new_index = TarIndex.for_path(self.output)
+        self.assertIsNot(index, new_index)
+        self.assertEqual(new_index.names,
+                         ['input.ovf', 'input.mf', 'sample_cfg.txt'])
+        with tarfile.open(self.output, 'r') as tarf:
+            with open(resource_filename(__name__, "sample_cfg.txt"),
+                      'rb') as fileobj:
+                self.assertEqual(
+                    tarf.extractfile('sample_cfg.txt').read(),
+                    fileobj.read())
+
+    def test_replace_error(self):
+        """The original archive is untouched if replacing it fails."""
+        shutil.copy(self.input_tar, self.output)
+        with self.assertRaises(ValueError):
+            with TarWriter(self.output, replace=True) as tarw:
+                tarw.add(self.input_ovf, "input.ovf")
+                tarw.add(self.temp_dir)
+        self.assertEqual(os.listdir(self.temp_dir), ["out.tar"])
+        with open(self.input_tar, 'rb') as exp, \
+                open(self.output, 'rb') as act:
+            self.assertEqual(exp.read(), act.read())
+
+    def test_copy_file_data_fallback(self):
+        """Buffered copy is used if kernel-side copies aren't possible."""
+        def unsupported(*_args):
+            raise OSError(errno.ENOSYS, "Function not implemented")
+
+        with open(self.input_ovf, 'rb') as fileobj:
+            expected = fileobj.read()
+        with mock.patch('os.copy_file_range', unsupported, create=True), \
+                mock.patch('os.sendfile', unsupported, create=True):
+            with open(self.input_ovf, 'rb') as src, \
+                    open(self.output, 'wb') as dst:
+                copy_file_data(src.fileno(), 100, dst.fileno(), 1000)
+                self.assertRaises(IOError, copy_file_data, src.fileno(),
+                                  len(expected) - 10, dst.fileno(), 20)
+        with open(self.output, 'rb') as fileobj:
+            self.assertEqual(fileobj.read(1000), expected[100:1100])
+
+    def test_copy_file_data_sendfile_not_socket(self):
+        """Without copy_file_range, sendfile to a file may need a socket."""
+        def not_socket(*_args):
+            raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+        with open(self.input_ovf, 'rb') as fileobj:
+            expected = fileobj.read()
+        # As on macOS, which has no copy_file_range()
+        with mock.patch('os.copy_file_range', None, create=True), \
+                mock.patch('os.sendfile', not_socket, create=True):
+            with open(self.input_ovf, 'rb') as src, \
+                    open(self.output, 'wb') as dst:
+                copy_file_data(src.fileno(), 100, dst.fileno(), 1000)
+        with open(self.output, 'rb') as fileobj:
+            self.assertEqual(fileobj.read(), expected[100:1100])
+
+    def test_copy_file_data_error(self):
+        """Errors other than lack of kernel-side copy support are raised."""
+        def bad_fd(*_args):
+            raise OSError(errno.EBADF, "Bad file descriptor")
+
+        with mock.patch('os.copy_file_range', bad_fd, create=True), \
+                mock.patch('os.sendfile', bad_fd, create=True):
+            with open(self.input_ovf, 'rb') as src, \
+                    open(self.output, 'wb') as dst:
+                with self.assertRaises(OSError) as catcher:
+                    copy_file_data(src.fileno(), 0, dst.fileno(), 1000)
+        self.assertEqual(catcher.exception.errno, errno.EBADF)
+        self.assertEqual(os.path.getsize(self.output), 0)
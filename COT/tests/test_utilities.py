@@ -52,3 +52,22 @@ class TestUtilities(COTTestCase):
 
         self.assertEqual(COT.utilities.directory_size(self.temp_dir),
                          256 << 10)
+
+    def test_file_fingerprint(self):
+        """File fingerprint changes when (and only when) the file changes."""
+        path = os.path.join(self.temp_dir, "file.txt")
+        with open(path, 'w') as fileobj:
+            fileobj.write("hello")
+        fingerprint = COT.utilities.file_fingerprint(path)
+        self.assertEqual(fingerprint, COT.utilities.file_fingerprint(path))
+        # Links are followed
+        os.symlink(path, os.path.join(self.temp_dir, "link.txt"))
+        self.assertEqual(fingerprint, COT.utilities.file_fingerprint(
+            os.path.join(self.temp_dir, "link.txt")))
+
+        with open(path, 'a') as fileobj:
+            fileobj.write(" world")
+        self.assertNotEqual(fingerprint,
+                            COT.utilities.file_fingerprint(path))
+
+        self.assertRaises(OSError, COT.utilities.file_fingerprint, "/bar/foo")
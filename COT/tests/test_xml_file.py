@@ -14,7 +14,14 @@
 
 """Unit test cases for the COT.xml_file.XML class."""
 
-from COT.xml_file import XML
+import os
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from COT.xml_file import ET, LXML, XML
 from COT.tests import COTTestCase
 
 
@@ -107,3 +114,64 @@ class TestXMLInstance(COTTestCase):
         )
         self.assertLogged(levelname="WARNING",
                           msg="Found unexpected child element")
+
+    def test_write_xml(self):
+        """Written XML is reindented and namespaces declared on the root."""
+        cim = "http://schemas.dmtf.org/wbem/wscim/1/cim-schema/2/"
+        XML.register_namespace('ovf', self.OVF[1:-1])
+        XML.register_namespace('rasd',
+                               cim + "CIM_ResourceAllocationSettingData")
+        XML.register_namespace('vssd', cim + "CIM_VirtualSystemSettingData")
+        XML.register_namespace('vmw', "http://www.vmware.com/schema/ovf")
+        out_file = os.path.join(self.temp_dir, "out.ovf")
+        self.xml.write_xml(out_file)
+        self.check_diff('', file2=out_file)
+
+        pasd = cim + "CIM_ProcessorAllocationSettingData"
+        XML.register_namespace('pasd', pasd)
+        child = ET.SubElement(
+            self.xml.find_child(self.xml.root, self.OVF + "References"),
+            "{" + pasd + "}Foo", attrib={"{" + pasd + "}bar": "x/>y"})
+        ET.SubElement(child, self.OVF + "Baz")
+        self.xml.write_xml(out_file)
+        with open(out_file) as fileobj:
+            lines = fileobj.readlines()
+        self.assertIn('xmlns:pasd="{0}"'.format(pasd), lines[1])
+        self.assertEqual(lines[5:9], [
+            '    <ovf:File ovf:href="sample_cfg.txt" ovf:id="textfile" '
+            'ovf:size="78" />\n',
+            '    <pasd:Foo pasd:bar="x/&gt;y">\n',
+            '      <ovf:Baz />\n',
+            '    </pasd:Foo>\n',
+        ])
+
+    def test_write_xml_attribute_order(self):
+        """Attributes are written in sorted order, however they were set."""
+        references = self.xml.find_child(self.xml.root,
+                                         self.OVF + "References")
+        elem = ET.SubElement(references, self.OVF + "File")
+        elem.set(self.OVF + "size", "1")
+        elem.set(self.OVF + "id", "foo")
+        elem.set(self.OVF + "href", "foo.txt")
+        out_file = os.path.join(self.temp_dir, "out.ovf")
+        self.xml.write_xml(out_file)
+        with open(out_file) as fileobj:
+            self.assertIn('<ovf:File ovf:href="foo.txt" ovf:id="foo" '
+                          'ovf:size="1" />', fileobj.read())
+
+    @unittest.skipUnless(LXML, "Only applicable when lxml is installed")
+    def test_default_namespace_round_trip(self):
+        """With lxml, a default namespace is preserved when writing XML."""
+        out_file = os.path.join(self.temp_dir, "out.ovf")
+        XML(self.v20_vbox_ovf).write_xml(out_file)
+        with open(out_file) as fileobj:
+            contents = fileobj.read()
+        self.assertIn('<Envelope ', contents)
+        self.assertIn('xmlns="http://schemas.dmtf.org/ovf/envelope/2"',
+                      contents)
+        self.assertNotIn('ns0:', contents)
+
+        # Re-reading and re-writing the output should not change it
+        out_file_2 = os.path.join(self.temp_dir, "out2.ovf")
+        XML(out_file).write_xml(out_file_2)
+        self.check_diff('', file1=out_file, file2=out_file_2)
@@ -45,7 +45,9 @@ try:
 except ImportError:
     from backports.shutil_get_terminal_size import get_terminal_size
 
+import COT.file_reference
 from COT import __version_long__
+from COT.checksum_cache import ChecksumCache
 from COT.data_validation import InvalidInputError, ValueMismatchError
 from COT.commands import command_classes
 from .ui import UI
@@ -431,6 +433,11 @@ class CLI(UI):
                             action='store_true',
                             help="""Perform requested actions without """
                             """prompting for confirmation""")
+        parser.add_argument('--checksum-cache', dest='_checksum_cache',
+                            action='store_true',
+                            help="""Remember file checksums between runs """
+                            """(in $XDG_CACHE_HOME/cot/) so that unchanged """
+                            """files don't need to be checksummed again""")
 
         debug_group = parser.add_mutually_exclusive_group()
         debug_group.add_argument(
@@ -526,6 +533,7 @@ class CLI(UI):
         arg_dict = vars(args)
         del arg_dict["_verbosity"]
         del arg_dict["_force"]
+        del arg_dict["_checksum_cache"]
         del arg_dict["_subcommand"]
         for (arg, value) in arg_dict.items():
             # When argparse is using both "nargs='+'" and "action=append",
@@ -557,6 +565,28 @@ class CLI(UI):
             if not arg[0].isupper() and value is not None:
                 setattr(arg_dict["instance"], arg, value)
 
+    @staticmethod
+    def open_checksum_cache(enabled):
+        """Open the persistent checksum cache, if requested and possible.
+
+        Args:
+          enabled (bool): Whether the user requested the checksum cache.
+        """
+        if not enabled:
+            return
+        try:
+            COT.file_reference.CHECKSUM_CACHE = ChecksumCache()
+        except IOError as exc:
+            logger.warning("Not using checksum cache: %s", exc)
+
+    @staticmethod
+    def close_checksum_cache():
+        """Close the persistent checksum cache, if it was opened."""
+        cache = COT.file_reference.CHECKSUM_CACHE
+        if cache is not None:
+            COT.file_reference.CHECKSUM_CACHE = None
+            cache.close()
+
     def main(self, args):
         """Invoke the main worker logic for COT when invoked from the CLI.
 
@@ -595,6 +625,7 @@ class CLI(UI):
         subp = self.subparser_lookup[args._subcommand]
 
         # Call the appropriate command and handle any resulting errors
+        self.open_checksum_cache(args._checksum_cache)
         arg_dict = self.args_to_dict(args)
         try:
             self.set_instance_attributes(arg_dict)
@@ -622,6 +653,7 @@ class CLI(UI):
             sys.exit("\nAborted by user.")
         finally:
             args.instance.destroy()
+            self.close_checksum_cache()
             if self.master_logger:
                 self.master_logger.removeHandler(self.handler)
                 self.master_logger = None
@@ -22,6 +22,7 @@ import logging
 import os
 import os.path
 import sys
+import tarfile
 
 try:
     # Python 2.x
@@ -32,7 +33,9 @@ except ImportError:
 
 import mock
 
+import COT.file_reference
 from COT import __version_long__
+from COT.checksum_cache import ChecksumCache
 from COT.tests import COTTestCase
 from COT.ui.cli import CLI
 from COT.data_validation import InvalidInputError
@@ -329,31 +332,34 @@ class TestCLIGeneral(TestCOTCLI):
         self.assertMultiLineEqual(out1, out2)
         if sys.hexversion < 0x03020000:
             args_str = """
-  -h, --help       show this help message and exit
-  -V, --version    show program's version number and exit
-  -f, --force      Perform requested actions without prompting for
-                   confirmation
-  -q, --quiet      Decrease verbosity of the program (repeatable)
-  -v, --verbose    Increase verbosity of the program (repeatable)
+  -h, --help        show this help message and exit
+  -V, --version     show program's version number and exit
+  -f, --force       Perform requested actions without prompting for
+                    confirmation
+  --checksum-cache  Remember file checksums between runs (in
+                    $XDG_CACHE_HOME/cot/) so that unchanged files don't need
+                    to be checksummed again
+  -q, --quiet       Decrease verbosity of the program (repeatable)
+  -v, --verbose     Increase verbosity of the program (repeatable)
 """
             # No command aliases before Python 3.2
             command_str = """
-    add-disk       Add a disk image to an OVF package and map it as a disk in
-                   the guest environment
-    add-file       Add a file to an OVF package
-    deploy         Create a new VM on the target hypervisor from the given OVF
-                   or OVA
-    edit-hardware  Edit virtual machine hardware properties of an OVF
-    edit-product   Edit product info in an OVF
+    add-disk        Add a disk image to an OVF package and map it as a disk in
+                    the guest environment
+    add-file        Add a file to an OVF package
+    deploy          Create a new VM on the target hypervisor from the given
+                    OVF or OVA
+    edit-hardware   Edit virtual machine hardware properties of an OVF
+    edit-product    Edit product info in an OVF
     edit-properties
-                   Edit or create environment properties of an OVF
-    help           Print help for a command
-    info           Generate a description of an OVF package
-    inject-config  Inject a configuration file into an OVF package
+                    Edit or create environment properties of an OVF
+    help            Print help for a command
+    info            Generate a description of an OVF package
+    inject-config   Inject a configuration file into an OVF package
     install-helpers
-                   Install/verify COT manual pages and any third-party helper
-                   programs that COT may require
-    remove-file    Remove a file from an OVF package
+                    Install/verify COT manual pages and any third-party helper
+                    programs that COT may require
+    remove-file     Remove a file from an OVF package
 """
         else:
             # Spacing in args_str is a bit different due to subcommand aliases
@@ -362,6 +368,9 @@ class TestCLIGeneral(TestCOTCLI):
   -V, --version         show program's version number and exit
   -f, --force           Perform requested actions without prompting for
                         confirmation
+  --checksum-cache      Remember file checksums between runs (in
+                        $XDG_CACHE_HOME/cot/) so that unchanged files don't
+                        need to be checksummed again
   -q, --quiet           Decrease verbosity of the program (repeatable)
   -v, --verbose         Increase verbosity of the program (repeatable)
 """
@@ -421,6 +430,23 @@ commands:
         # Optional args but no subcommand
         self.call_cot(['-f', '-v'], fixup_args=False, result=2)
 
+    def test_checksum_cache(self):
+        """Verify --checksum-cache is used, then closed, by the command."""
+        close = ChecksumCache.close
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.temp_dir}), \
+                mock.patch.object(ChecksumCache, 'close', autospec=True,
+                                  side_effect=close) as mock_close:
+            self.call_cot(['--checksum-cache', 'edit-product', self.input_ovf,
+                           '-o', self.temp_file, '-v', '2.0'])
+        mock_close.assert_called_once_with(mock.ANY)
+        self.assertIsNone(COT.file_reference.CHECKSUM_CACHE)
+        cache = ChecksumCache(os.path.join(self.temp_dir,
+                                           'cot', 'checksums.sqlite'))
+        try:
+            self.assertNotEqual(len(cache), 0)
+        finally:
+            cache.close()
+
     def test_verbosity(self):
         """Verify various verbosity options and their effect on logging."""
         self.logging_handler.flush()
@@ -760,6 +786,20 @@ class TestCLIEditProduct(TestCOTCLI):
         self.call_cot(['edit-product', self.input_ovf, '-V'], result=2)
         self.call_cot(['edit-product', self.input_ovf, '-V', '-v'], result=2)
 
+    def test_manifest_last(self):
+        """Use --manifest-last to place the manifest at the end of an OVA."""
+        output = os.path.join(self.temp_dir, "out.ova")
+        self.call_cot(['edit-product', self.input_ovf, '-o', output,
+                       '-v', '2.0'])
+        with tarfile.open(output, 'r') as tarf:
+            self.assertEqual(tarf.getnames()[:2], ['out.ovf', 'out.mf'])
+        self.call_cot(['edit-product', output, '--manifest-last',
+                       '-v', '3.0'])
+        with tarfile.open(output, 'r') as tarf:
+            self.assertEqual(tarf.getnames(),
+                             ['out.ovf', 'input.vmdk', 'input.iso',
+                              'sample_cfg.txt', 'out.mf'])
+
 
 class TestCLIEditProperties(TestCOTCLI):
     """CLI test cases for "cot edit-properties" command."""
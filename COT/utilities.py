@@ -22,6 +22,7 @@
 
   available_bytes_at_path
   directory_size
+  file_fingerprint
   pretty_bytes
   tar_entry_size
   to_string
@@ -39,7 +40,7 @@ except ImportError:
     # Python 2.7
     from psutil import disk_usage
 
-import xml.etree.ElementTree as ET    # noqa: N814
+from COT.xml_file import ET
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +97,27 @@ def directory_size(path):
     return total_size
 
 
+def file_fingerprint(path):
+    """Get a tuple that changes whenever the given file is modified.
+
+    Follows symbolic links. Two calls returning equal fingerprints mean
+    the file's contents can be assumed to be unchanged in between.
+
+    Args:
+      path (str): File path.
+
+    Returns:
+      tuple: (device, inode, size, modification time)
+
+    Raises:
+      OSError: if the file cannot be examined.
+    """
+    stat = os.stat(path)
+    # st_mtime_ns is Python 3.3+ only
+    return (stat.st_dev, stat.st_ino, stat.st_size,
+            getattr(stat, 'st_mtime_ns', stat.st_mtime))
+
+
 def pretty_bytes(byte_value, base_shift=0):
     """Pretty-print the given bytes value.
 
@@ -203,10 +225,11 @@ def to_string(obj):
         >>> to_string(27.5)
         '27.5'
         >>> e = ET.Element('hello', attrib={'key': 'value'})
+        >>> e.text = 'world'
         >>> print(e)   # doctest: +ELLIPSIS
         <Element ...hello... at ...>
         >>> print(to_string(e))
-        <hello key="value" />
+        <hello key="value">world</hello>
     """
     if ET.iselement(obj):
         if sys.version_info[0] >= 3:
@@ -62,6 +62,21 @@ class OVFHardware(object):
         """
         self.ovf = ovf
         self.item_dict = {}
+        # Secondary indexes for find_all_items(), mapping the values of
+        # frequently searched properties to the set of OVFItems with that
+        # value under any profile. Entries may be stale (i.e., an item
+        # may since have changed its value) but are never missing, so every
+        # candidate is still checked with item_match().
+        self._index = dict((name, {}) for name in (
+            ovf.RESOURCE_TYPE, ovf.INSTANCE_ID, ovf.HOST_RESOURCE, ovf.PARENT))
+        # Cached natural sort of item_dict, and the position of each item
+        # within it; rebuilt whenever items are added or deleted.
+        self._sorted_items = None
+        self._item_position = None
+        # XML Item elements currently representing each OVFItem,
+        # so that update_xml() can leave unchanged ones alone.
+        self._item_elements = {}
+        elements = {}
         valid_profiles = set(ovf.config_profiles)
         item_count = 0
         for item in ovf.virtual_hw_section:
@@ -92,57 +107,176 @@ class OVFHardware(object):
                     # Mask away the nitty-gritty details from our caller
                     raise OVFHardwareDataError("Data conflict for instance {0}"
                                                .format(instance))
+            elements.setdefault(instance, []).append(item)
         logger.debug(
             "OVF contains %s hardware Item elements describing %s "
             "unique devices", item_count, len(self.item_dict))
         # Treat the current state as golden:
-        for ovfitem in self.item_dict.values():
+        for (instance, ovfitem) in self.item_dict.items():
             ovfitem.modified = False
+            self._index_item(ovfitem)
+            self._item_elements[ovfitem] = elements[instance]
+        self._instances = set(self.item_dict)
+
+    def _index_item(self, ovfitem):
+        """Add all indexed property values of the given item to the indexes.
+
+        Args:
+          ovfitem (OVFItem): Item to index. Future changes to its properties
+              will be reported back to us by :meth:`index_item_value`.
+        """
+        ovfitem.hardware = self
+        for (name, index) in self._index.items():
+            for value in ovfitem.get_all_values(name):
+                index.setdefault(value, set()).add(ovfitem)
+
+    def index_item_value(self, ovfitem, name, value):
+        """Update the indexes when an item's property gains a new value.
+
+        Called by :meth:`OVFItem.set_property
+        <COT.vm_description.ovf.item.OVFItem.set_property>`.
+
+        Args:
+          ovfitem (OVFItem): Item whose property was set
+          name (str): Property name
+          value (str): New value of this property
+        """
+        index = self._index.get(name)
+        if index is not None and value:
+            index.setdefault(value, set()).add(ovfitem)
+
+    def _add_item(self, instance, ovfitem):
+        """Add the given item to :attr:`item_dict` and to our indexes.
+
+        Args:
+          instance (str): InstanceID of the item
+          ovfitem (OVFItem): Item to add
+        """
+        self.item_dict[instance] = ovfitem
+        self._sorted_items = None
+        self._index_item(ovfitem)
+
+    def _item_order(self):
+        """Get all items in natural-sorted order by InstanceID.
+
+        Returns:
+          tuple: ``(sorted_items, item_position)``, a list of OVFItems and a
+          dict mapping each OVFItem to its index in that list.
+        """
+        if self._sorted_items is None:
+            self._sorted_items = [self.item_dict[instance] for instance in
+                                  natural_sort(self.item_dict)]
+            self._item_position = dict(
+                (ovfitem, position) for (position, ovfitem) in
+                enumerate(self._sorted_items))
+        return (self._sorted_items, self._item_position)
+
+    @property
+    def modified(self):
+        """Whether any Items have been added, deleted, or changed.
+
+        Returns:
+          bool: True if the hardware differs from when it was read.
+        """
+        if set(self.item_dict) != self._instances:
+            return True
+        return any(ovfitem.modified for ovfitem in self.item_dict.values())
 
     def update_xml(self):
-        """Regenerate all Items under the VirtualHardwareSection, if needed.
+        """Regenerate the Items under the VirtualHardwareSection, if needed.
 
-        Will do nothing if no Items have been changed.
+        Only the Items of new or modified devices are regenerated, and each
+        is spliced in where the Items it replaces were, so Items describing
+        unchanged devices are left exactly as they are. Items of deleted
+        devices are removed. Will do nothing if no Items have been changed.
         """
-        modified = False
-        if len(self.item_dict) != len(XML.find_all_children(
-                self.ovf.virtual_hw_section,
-                set([self.ovf.ITEM, self.ovf.STORAGE_ITEM,
-                     self.ovf.ETHERNET_PORT_ITEM]))):
-            modified = True
-        else:
-            for ovfitem in self.item_dict.values():
-                if ovfitem.modified:
-                    modified = True
-                    break
-        if not modified:
+        if not self.modified:
             logger.verbose("No changes to hardware definition, "
                            "so no XML update is required")
             return
-        # Delete the existing Items:
+        section = self.ovf.virtual_hw_section
+
+        # Delete the Items of any deleted devices:
+        current_items = set(self.item_dict.values())
         delete_count = 0
-        for item in list(self.ovf.virtual_hw_section):
-            if (item.tag == self.ovf.ITEM or
-                    item.tag == self.ovf.STORAGE_ITEM or
-                    item.tag == self.ovf.ETHERNET_PORT_ITEM):
-                self.ovf.virtual_hw_section.remove(item)
+        for ovfitem in list(self._item_elements):
+            if ovfitem not in current_items:
+                for item in self._item_elements.pop(ovfitem):
+                    section.remove(item)
                 delete_count += 1
-        logger.debug("Cleared %d existing items from VirtualHWSection",
-                     delete_count)
-        # Generate the new XML Items, in appropriately sorted order by Instance
-        ordering = [self.ovf.INFO, self.ovf.SYSTEM, self.ovf.ITEM]
-        for instance in natural_sort(self.item_dict):
-            logger.debug("Writing Item(s) with InstanceID %s", instance)
-            ovfitem = self.item_dict[instance]
+
+        # Regenerate the Items of new and modified devices
+        (sorted_items, _) = self._item_order()
+        update_count = 0
+        for (position, ovfitem) in enumerate(sorted_items):
+            if not ovfitem.modified and ovfitem in self._item_elements:
+                continue
+            logger.debug("Writing Item(s) with InstanceID %s",
+                         ovfitem.instance_id)
             new_items = ovfitem.generate_items()
             logger.spam("Generated %d items", len(new_items))
-            for item in new_items:
-                XML.add_child(self.ovf.virtual_hw_section, item, ordering)
-        logger.verbose("Updated XML VirtualHardwareSection, now contains %d "
-                       "Items representing %d devices",
-                       len(self.ovf.virtual_hw_section.findall(self.ovf.ITEM)),
+            self._splice_items(section, sorted_items, position, new_items)
+            self._item_elements[ovfitem] = new_items
+            ovfitem.modified = False
+            update_count += 1
+
+        self._instances = set(self.item_dict)
+        logger.verbose("Updated XML VirtualHardwareSection, regenerating "
+                       "Items for %d devices and removing Items for %d "
+                       "devices. It now contains %d Items representing %d "
+                       "devices", update_count, delete_count,
+                       sum(len(items) for items in
+                           self._item_elements.values()),
                        len(self.item_dict))
 
+    def _splice_items(self, section, sorted_items, position, new_items):
+        """Put the new XML Items for a device in their proper place.
+
+        Helper method for :meth:`update_xml`.
+
+        If the device already has Items, the new Items replace them.
+        Otherwise they are placed after the Items of the closest preceding
+        device (in InstanceID order) or before those of the closest following
+        device.
+
+        Args:
+          section (xml.etree.ElementTree.Element): VirtualHardwareSection
+          sorted_items (list): All OVFItems, sorted by InstanceID
+          position (int): Index into ``sorted_items`` of the device
+          new_items (list): XML Item elements to add for this device
+        """
+        children = list(section)
+        old_items = [item for item in
+                     self._item_elements.get(sorted_items[position], [])
+                     if item in children]
+        index = None
+        if old_items:
+            index = children.index(old_items[0])
+            for item in old_items:
+                section.remove(item)
+        else:
+            for neighbor in reversed(sorted_items[:position]):
+                if self._item_elements.get(neighbor):
+                    index = children.index(
+                        self._item_elements[neighbor][-1]) + 1
+                    break
+            else:
+                for neighbor in sorted_items[position + 1:]:
+                    if self._item_elements.get(neighbor):
+                        index = children.index(
+                            self._item_elements[neighbor][0])
+                        break
+
+        if index is None:
+            # No other Items to be found, so go by the section's schema
+            ordering = [self.ovf.INFO, self.ovf.SYSTEM, self.ovf.ITEM]
+            for item in new_items:
+                XML.add_child(section, item, ordering)
+            return
+        for item in new_items:
+            section.insert(index, item)
+            index += 1
+
     def find_unused_instance_id(self, start=1):
         """Find the first available ``InstanceID`` number.
 
@@ -180,7 +314,7 @@ class OVFHardware(object):
         # so provide a simple default value.
         ovfitem.set_property(self.ovf.ELEMENT_NAME, resource_type,
                              profile_list)
-        self.item_dict[instance] = ovfitem
+        self._add_item(instance, ovfitem)
         ovfitem.modified = True
         logger.info("Created new %s under profile(s) %s, InstanceID is %s",
                     resource_type, profile_list, instance)
@@ -195,6 +329,11 @@ class OVFHardware(object):
         instance = item.get_value(self.ovf.INSTANCE_ID)
         if self.item_dict[instance] == item:
             del self.item_dict[instance]
+            self._sorted_items = None
+            for index in self._index.values():
+                for ovfitems in index.values():
+                    ovfitems.discard(item)
+            item.hardware = None
         # TODO: error handling - currently a no-op if item not in item_dict
 
     def clone_item(self, parent_item, profile_list):
@@ -221,7 +360,7 @@ class OVFHardware(object):
 
         ovfitem.set_property(self.ovf.INSTANCE_ID, instance, profile_list)
         ovfitem.modified = True
-        self.item_dict[instance] = ovfitem
+        self._add_item(instance, ovfitem)
         logger.spam("Added clone of %s under %s, instance is %s",
                     parent_item, profile_list, instance)
         return (instance, ovfitem)
@@ -262,11 +401,24 @@ class OVFHardware(object):
         Returns:
           list: Matching OVFItem instances
         """
-        items = [self.item_dict[instance] for instance in
-                 natural_sort(self.item_dict)]
-        filtered_items = []
         if properties is None:
             properties = {}
+        (items, position) = self._item_order()
+        # Narrow down the search using our indexes where possible
+        candidates = None
+        if resource_type:
+            candidates = self._index[self.ovf.RESOURCE_TYPE].get(
+                self.ovf.RES_MAP[resource_type], set())
+        for (prop, value) in properties.items():
+            if prop not in self._index or value is None:
+                continue
+            matches = self._index[prop].get(value, set())
+            candidates = (matches if candidates is None else
+                          candidates.intersection(matches))
+        if candidates is not None:
+            items = sorted((item for item in candidates if item in position),
+                           key=position.get)
+        filtered_items = []
         for item in items:
             if self.item_match(item, resource_type, properties, profile_list):
                 filtered_items.append(item)
@@ -33,14 +33,15 @@ hardware configuration profiles.
 
   OVFItem
   OVFItemDataError
+  ProfileMasks
 """
 
+import copy
 import re
 import logging
-import xml.etree.ElementTree as ET    # noqa: N814
 
 from COT.data_validation import natural_sort, ValueUnsupportedError
-from COT.xml_file import XML
+from COT.xml_file import ET, XML
 
 from .name_helper import name_helper
 
@@ -77,6 +78,73 @@ class OVFItemDataError(Exception):
     """Data to be added to an :class:`OVFItem` conflicts with existing data."""
 
 
+class ProfileMasks(object):
+    """Interning of configuration profile IDs as bits of an integer mask.
+
+    Bit 0 (:attr:`DEFAULT`) represents ``None``, i.e., the default
+    configuration, which an OVF Item applies to unless it says otherwise.
+    Other profiles are assigned bits as they are first seen, and keep them
+    even if the profile is later deleted.
+
+    ::
+
+      >>> masks = ProfileMasks()
+      >>> masks.mask([None])
+      1
+      >>> masks.mask(["2CPU", "1CPU"])
+      6
+      >>> masks.mask(["1CPU"])
+      4
+      >>> sorted(masks.profiles(5), key=str)
+      ['1CPU', None]
+    """
+
+    DEFAULT = 1
+    """Bit representing ``None``, the default configuration."""
+
+    def __init__(self):
+        """Create a new mapping, initially knowing only :attr:`DEFAULT`."""
+        self._bits = {None: self.DEFAULT}
+        self._profiles = [None]
+
+    def mask(self, profiles):
+        """Get the mask representing the given profiles.
+
+        Args:
+          profiles (iterable): Profile ID strings and/or ``None``.
+
+        Returns:
+          int: Bitmask of these profiles.
+        """
+        mask = 0
+        for profile in profiles:
+            bit = self._bits.get(profile)
+            if bit is None:
+                bit = 1 << len(self._profiles)
+                self._bits[profile] = bit
+                self._profiles.append(profile)
+            mask |= bit
+        return mask
+
+    def profiles(self, mask):
+        """Get the profiles represented by the given mask.
+
+        Args:
+          mask (int): Bitmask of profiles.
+
+        Returns:
+          set: Profile ID strings and/or ``None``.
+        """
+        result = set()
+        for profile in self._profiles:
+            if not mask:
+                break
+            if mask & 1:
+                result.add(profile)
+            mask >>= 1
+        return result
+
+
 class OVFItem(object):
     """Helper class for :class:`OVF`.
 
@@ -86,13 +154,23 @@ class OVFItem(object):
     In essence, it is:
 
     * a dict of ``Item`` properties (indexed by element name)
-    * each of which is a dict of sets of profiles (indexed by element value)
+    * each of which is a dict of profiles (indexed by element value),
+      stored as a bitmask as defined by :class:`ProfileMasks`
     """
 
     # Magic strings
     ATTRIB_KEY_SUFFIX = " {Item attribute}"
     ELEMENT_KEY_SUFFIX = " {custom element}"
 
+    # Kinds of property, as classified by _property_key()
+    _CHILD = 0
+    _ATTRIB = 1
+    _CHILD_ATTRIB = 2
+    _CUSTOM_ELEMENT = 3
+
+    _property_keys = {}
+    """Classification of all property names seen so far, by any OVFItem."""
+
     def __init__(self, ovf, item=None):
         """Create a new OVFItem with contents based on the given Item element.
 
@@ -102,12 +180,21 @@ class OVFItem(object):
         """
         self.ovf = ovf
         if ovf is not None:
-            self.name_helper = ovf
+            self.name_helper = ovf.name_helper
+            self.profile_masks = ovf.profile_masks
         else:
             self.name_helper = name_helper(1.0)
+            self.profile_masks = ProfileMasks()
+        # Bind all of the XML names directly to this object, so that
+        # looking them up doesn't go through __getattr__()
+        self.__dict__.update(vars(self.name_helper))
         self.properties = {}
-        """Dict of dicts. properties[name][value] = (profile1, profile2)."""
+        """Dict of dicts. properties[name][value] = profile_mask."""
         self.modified = False
+        self.hardware = None
+        """OVFHardware that indexes this item, if any."""
+        self._element_templates = {}
+        """Parsed XML element for each value of any custom element."""
         self.namespace = self.RASD   # default for most item types
         if item is not None:
             self.add_item(item)
@@ -122,8 +209,57 @@ class OVFItem(object):
                     str(value), sorted(self.property_profiles(name, value)))
         return ret
 
+    def __deepcopy__(self, memo):
+        """Copy the properties of this item, but not the OVF it belongs to.
+
+        Args:
+          memo (dict): Memo dictionary used by :func:`copy.deepcopy`
+
+        Returns:
+          OVFItem: New item, not (yet) indexed by any OVFHardware.
+        """
+        new_item = OVFItem(self.ovf)
+        new_item.properties = copy.deepcopy(self.properties, memo)
+        # Templates are never modified, only copied, so they can be shared
+        new_item._element_templates = dict(self._element_templates)
+        new_item.modified = self.modified
+        new_item.namespace = self.namespace
+        return new_item
+
+    @classmethod
+    def _property_key(cls, name):
+        """Classify the given property name by how it is represented in XML.
+
+        Args:
+          name (str): Property name
+
+        Returns:
+          tuple: ``(kind, tag, attrib)``, where ``kind`` is one of
+          ``_CHILD`` (child element ``tag``), ``_ATTRIB`` (attribute
+          ``attrib`` of the Item itself), ``_CHILD_ATTRIB`` (attribute
+          ``attrib`` of child element ``tag``) or ``_CUSTOM_ELEMENT``.
+        """
+        key = cls._property_keys.get(name)
+        if key is None:
+            attrib_match = re.match(r"(.*)" + cls.ATTRIB_KEY_SUFFIX, name)
+            child_attrib = re.match(r"(.*)_attrib_(.*)", name)
+            if attrib_match:
+                key = (cls._ATTRIB, None, attrib_match.group(1))
+            elif child_attrib:
+                key = (cls._CHILD_ATTRIB,
+                       child_attrib.group(1), child_attrib.group(2))
+            elif re.match(r"(.*)" + cls.ELEMENT_KEY_SUFFIX, name):
+                key = (cls._CUSTOM_ELEMENT, None, None)
+            else:
+                key = (cls._CHILD, name, None)
+            cls._property_keys[name] = key
+        return key
+
     def __getattr__(self, name):
-        """Transparently pass attribute lookups off to OVF/OVFNameHelper.
+        """Transparently pass attribute lookups off to OVFNameHelper.
+
+        Only used for the helper's class attributes and methods, as its
+        XML name constants are bound directly to this object.
 
         Args:
           name (str): Attribute name.
@@ -136,7 +272,7 @@ class OVFItem(object):
               through but will raise an AttributeError as usual.
         """
         # Don't pass 'special' attributes through to the helper
-        if re.match(r"^__", name):
+        if name.startswith("__"):
             raise AttributeError("'OVFItem' object has no attribute '{0}'"
                                  .format(name))
         # Pass through to designated helper
@@ -187,7 +323,7 @@ class OVFItem(object):
         Returns:
           set: Profile strings associated with this name/value.
         """
-        return self.properties[name][value]
+        return self.profile_masks.profiles(self.properties[name][value])
 
     def all_profiles(self, name, default=None):
         """Superset of all profiles for which this name has a value.
@@ -199,10 +335,24 @@ class OVFItem(object):
         Returns:
           Set of profile strings, or the given `default` if no matches.
         """
-        value_dict = self.properties.get(name, None)
-        if not value_dict:
+        mask = self._all_profiles_mask(name)
+        if not mask:
             return default
-        return set.union(*value_dict.values())
+        return self.profile_masks.profiles(mask)
+
+    def _all_profiles_mask(self, name):
+        """Mask of all profiles for which this name has a value.
+
+        Args:
+          name (str): Property name.
+
+        Returns:
+          int: Profile bitmask, 0 if the name has no values.
+        """
+        mask = 0
+        for profile_mask in self.properties.get(name, {}).values():
+            mask |= profile_mask
+        return mask
 
     def add_item(self, item):
         """Add the given ``Item`` element to this OVFItem.
@@ -223,13 +373,15 @@ class OVFItem(object):
                                         item.tag,
                                         "Item, StorageItem, EthernetPortItem")
 
-        profiles = set(item.get(self.ITEM_CONFIG, "").split())
+        profiles = self.profile_masks.mask(
+            item.get(self.ITEM_CONFIG, "").split())
         # Store any attributes of the Item itself:
         for (attrib, value) in item.attrib.items():
             if attrib == self.ITEM_CONFIG:
                 continue
             attrib_string = attrib + self.ATTRIB_KEY_SUFFIX
-            self.set_property(attrib_string, value, profiles, overwrite=False)
+            self._set_property(attrib_string, value, profiles,
+                               overwrite=False)
 
         # Store any child elements of the Item.
         # We save the ElementName and Description elements for last because
@@ -260,18 +412,18 @@ class OVFItem(object):
                 # vmw:Config elements, each distinguished by its vmw:key attr.
                 # Rather than try to guess how these items do or do not match,
                 # we simply store the whole item
-                self.set_property((ET.tostring(child).decode().strip() +
-                                   self.ELEMENT_KEY_SUFFIX),
-                                  ET.tostring(child).decode(),
-                                  profiles, overwrite=False)
+                self._set_property((ET.tostring(child).decode().strip() +
+                                    self.ELEMENT_KEY_SUFFIX),
+                                   ET.tostring(child).decode(),
+                                   profiles, overwrite=False)
                 continue
             # Store the value of this element:
-            self.set_property(tag, child.text, profiles, overwrite=False)
+            self._set_property(tag, child.text, profiles, overwrite=False)
             # Store any attributes of this element
             for (attrib, value) in child.attrib.items():
                 attrib_string = tag + "_attrib_" + attrib
-                self.set_property(attrib_string, value, profiles,
-                                  overwrite=False)
+                self._set_property(attrib_string, value, profiles,
+                                   overwrite=False)
 
         self.modified = True
         logger.spam("Added %s - new status:\n%s", item.tag, str(self))
@@ -289,7 +441,8 @@ class OVFItem(object):
         Args:
           name (str): Property name
           value (str): Value to add wildcards to.
-          profiles (list): Profiles to which this (name, value) applies.
+          profiles (int): Mask of profiles to which this (name, value)
+              applies.
 
         Returns:
           str: The updated value string with wildcards added.
@@ -298,20 +451,22 @@ class OVFItem(object):
            :meth:`value_replace_wildcards`
         """
         if name == self.ITEM_DESCRIPTION:
-            en_val = self.get_value(self.ELEMENT_NAME, profiles)
+            en_val = self._get_value_for_mask(self.ELEMENT_NAME, profiles)
             if en_val is not None:
                 value = re.sub(en_val, "_EN_", value)
 
         if name == self.ELEMENT_NAME or name == self.ITEM_DESCRIPTION:
-            vq_val = self.get_value(self.VIRTUAL_QUANTITY, profiles)
+            vq_val = self._get_value_for_mask(self.VIRTUAL_QUANTITY,
+                                              profiles)
             if vq_val is not None:
                 value = re.sub(vq_val, "_VQ_", value)
-            rst_val = self.get_value(self.RESOURCE_SUB_TYPE, profiles)
+            rst_val = self._get_value_for_mask(self.RESOURCE_SUB_TYPE,
+                                               profiles)
             if rst_val is not None:
                 if isinstance(rst_val, tuple):
                     rst_val = "/".join(rst_val)
                 value = re.sub(rst_val, "_RST_", value)
-            conn_val = self.get_value(self.CONNECTION, profiles)
+            conn_val = self._get_value_for_mask(self.CONNECTION, profiles)
             if conn_val is not None:
                 value = re.sub(conn_val, "_CONN_", value)
 
@@ -323,7 +478,8 @@ class OVFItem(object):
         Args:
           name (str): Property name
           value (str): Value to replace wildcards from.
-          profiles (list): Profiles to which this (name, value) applies.
+          profiles (int): Mask of profiles to which this (name, value)
+              applies, or ``None``.
 
         Returns:
           str: The updated value string, with wildcards replaced.
@@ -360,13 +516,14 @@ class OVFItem(object):
         Args:
           name (str): Property name
           value (str): Value to store for this property.
-          profiles (list): Profiles to which this (name, value) applies.
+          profiles (int): Mask of profiles to which this (name, value)
+              applies.
         """
         if not value:
             return
 
-        if None in profiles:
-            self.properties[name] = {value: set([None])}
+        if profiles & ProfileMasks.DEFAULT:
+            self.properties[name] = {value: ProfileMasks.DEFAULT}
         else:
             self.properties[name] = {value: profiles}
         self.modified = True
@@ -379,48 +536,52 @@ class OVFItem(object):
         Args:
           name (str): Property name
           value (str): Value to store for this property.
-          profiles (list): Profiles to which this (name, value) applies.
+          profiles (int): Mask of profiles to which this (name, value)
+              applies.
           overwrite (bool): Whether to permit overwriting existing values.
 
         Raises:
           OVFItemDataError: If ``overwrite`` is False and the value is
               already set for one or more of the requested ``profiles``.
         """
-        for (known_value, profile_set) in list(self.properties[name].items()):
-            if not overwrite and profile_set.intersection(profiles):
+        value_dict = self.properties[name]
+        for (known_value, profile_mask) in list(value_dict.items()):
+            if not overwrite and profile_mask & profiles:
                 raise OVFItemDataError(
                     "Tried to set value:\n'{0}'\nfor property\n'{1}'\n"
                     "under profile(s) {2} but already had value:\n'{3}'\n"
                     "for this property under profile(s) {4}"
-                    .format(value, name, profiles,
+                    .format(value, name,
+                            self.profile_masks.profiles(profiles),
                             known_value,
-                            profile_set.intersection(profiles)))
-            new_set = profile_set.copy()
+                            self.profile_masks.profiles(profile_mask &
+                                                        profiles)))
+            new_mask = profile_mask
 
             if known_value != value:
                 # Our profiles should not use this old value
-                new_set -= profiles
-            elif None in profile_set:
+                new_mask &= ~profiles
+            elif profile_mask & ProfileMasks.DEFAULT:
                 # No need to add ourselves, we're already covered
                 # implicitly by the default
                 pass
             else:
-                new_set |= profiles
+                new_mask |= profiles
 
-            if new_set != profile_set:
+            if new_mask != profile_mask:
                 self.modified = True
-                if not new_set:
+                if not new_mask:
                     logger.spam("No longer any profiles with value %s"
                                 " - deleting this value",
                                 known_value)
-                    del self.properties[name][known_value]
+                    del value_dict[known_value]
                 else:
-                    self.properties[name][known_value] = new_set
+                    value_dict[known_value] = new_mask
 
-        if value and value not in self.property_values(name):
-            self.properties[name][value] = profiles
+        if value and value not in value_dict:
+            value_dict[value] = profiles
             self.modified = True
-        elif not self.properties[name]:
+        elif not value_dict:
             logger.debug("No longer any values saved for property %s"
                          " - deleting this property", name)
             del self.properties[name]
@@ -441,6 +602,23 @@ class OVFItem(object):
           OVFItemDataError: if a value is already defined and would be
               overwritten, unless :attr:`overwrite` is ``True``
         """
+        self._set_property(name, value,
+                           self.profile_masks.mask(profiles or []),
+                           overwrite)
+
+    def _set_property(self, name, value, profiles, overwrite):
+        """Store the value and profiles associated with it for the given name.
+
+        Implementation of :meth:`set_property`.
+
+        Args:
+          name (str): Property name
+          value (str): Value associated with :attr:`name`
+          profiles (int): Mask of profiles. If 0, set for all profiles
+              currently known to this item.
+          overwrite (bool): Whether to permit overwriting of existing
+              value set in this item.
+        """
         # A ResourceSubType in the XML can be a single value or a
         # space-separated list of values. Internally, we'll store it as a
         # tuple, and re-join it later if needed.
@@ -460,24 +638,31 @@ class OVFItem(object):
 
         if name == self.RESOURCE_TYPE:
             self.namespace = self.namespace_for_resource_type(value)
+        elif (value and value not in self._element_templates and
+              self._property_key(name)[0] == self._CUSTOM_ELEMENT):
+            # Parse it now, rather than every time we generate XML
+            self._element_templates[value] = ET.fromstring(value)
 
         if not profiles:
             # Profiles not specified.
             # 1) If this property was already defined for a specific set of
             #    profiles, then change the value for all of these profiles.
             # 2) If this property was not defined previously, then set the
-            #    value for all profiles (the magic set([None]))
-            profiles = self.all_profiles(name, set([None]))
-        profiles = set(profiles)
+            #    value for all profiles (the magic DEFAULT)
+            profiles = (self._all_profiles_mask(name) or
+                        ProfileMasks.DEFAULT)
 
         value = self.value_add_wildcards(name, value, profiles)
         logger.spam("Setting %s to %s under profiles %s",
-                    name, value, profiles)
+                    name, value, self.profile_masks.profiles(profiles))
         if name not in self.properties:
             self._set_new_property(name, value, profiles)
         else:
             self._set_existing_property(name, value, profiles, overwrite)
 
+        if self.hardware is not None:
+            self.hardware.index_item_value(self, name, value)
+
         if self.modified:
             self.validate()
 
@@ -503,11 +688,11 @@ class OVFItem(object):
         logger.debug("Adding profile %s to item %s from item %s",
                      new_profile,
                      # TODO: add instance_id property, as this still gets
-                     # a value_dict like "{'13': set(['4CPU-4GB-3NIC'])}"
+                     # a value_dict like "{'13': 2}"
                      self.properties.get(self.INSTANCE_ID,
                                          "<unknown instance>"),
                      from_item.properties[self.INSTANCE_ID])
-        p_set = set([new_profile])
+        p_mask = self.profile_masks.mask([new_profile])
         for name in from_item.property_names:
             found = False
             if not from_item.properties[name]:
@@ -515,9 +700,9 @@ class OVFItem(object):
                             name)
                 continue
             for (value, profiles) in from_item.properties[name].items():
-                if (None in profiles or
-                        len(from_item.property_values(name)) == 1):
-                    self.set_property(name, value, p_set)
+                if (profiles & ProfileMasks.DEFAULT or
+                        len(from_item.properties[name]) == 1):
+                    self._set_property(name, value, p_mask, True)
                     found = True
                     break
             if not found:
@@ -544,28 +729,34 @@ class OVFItem(object):
             return
         logger.debug("Removing profile %s from item %s",
                      profile, self.properties[self.INSTANCE_ID])
-        p_set = set([profile])
+        p_mask = self.profile_masks.mask([profile])
+        all_mask = None
         for name in self.property_names:
-            for (value, profiles) in list(self.properties[name].items()):
-                profiles -= p_set
+            value_dict = self.properties[name]
+            for value in list(value_dict):
+                profiles = value_dict[value] & ~p_mask
                 # Convert "any profile" to a list of all profiles minus
                 # this one and any profiles already set elsewhere
-                if None in profiles and split_default:
+                if profiles & ProfileMasks.DEFAULT and split_default:
                     logger.debug("Profile contains 'any profile'; "
                                  "fixing it up")
-                    profiles.update(self.ovf.config_profiles)
-                    profiles.discard(None)
-                    profiles.discard(profile)
+                    if all_mask is None:
+                        all_mask = self.profile_masks.mask(
+                            self.ovf.config_profiles)
+                    profiles = ((profiles | all_mask) &
+                                ~(p_mask | ProfileMasks.DEFAULT))
                     # Discard all profiles set elsewhere
-                    for (val, prof) in list(self.properties[name].items()):
-                        if val == value:
-                            continue
-                        profiles -= prof
-                    logger.spam("Profiles are now: %s", profiles)
+                    for (val, prof) in value_dict.items():
+                        if val != value:
+                            profiles &= ~prof
+                    logger.spam("Profiles are now: %s",
+                                self.profile_masks.profiles(profiles))
                 if not profiles:
                     logger.debug("No more profiles for value %s, %s",
                                  name, value)
-                    del self.properties[name][value]
+                    del value_dict[value]
+                else:
+                    value_dict[value] = profiles
         self.modified = True
         self.validate()
 
@@ -591,32 +782,30 @@ class OVFItem(object):
 
         Args:
           tag (str): Tag to retrieve value for
-          profiles (set): set of profile names, or None
+          profiles (int): Mask of profiles, or None
 
         Returns:
           Value, default value, or ``None``, unsanitized.
         """
-        if profiles is not None:
-            profiles = set(profiles)
         val_dict = self.properties.get(tag, {})
         if profiles is None:
             if len(val_dict) == 1:
-                return list(val_dict.keys())[0]
+                return next(iter(val_dict))
             else:
                 return None
         # A case we need to handle:
-        # {'1': set([None])
-        #  '4': set(['x'])
+        # {'1': [None]
+        #  '4': ['x']
         # get_value([None, 'y', 'z'])  --> return '1'
         # get_value([None, 'x']) --> return None
         # We have to recognize that y and z are implicit in None but z is not.
         default_val = None
         for (val, prof) in val_dict.items():
-            if prof.issuperset(profiles):
+            if prof & profiles == profiles:
                 return val
-            if None in prof:
+            if prof & ProfileMasks.DEFAULT:
                 default_val = val
-            elif not prof.isdisjoint(profiles):
+            elif prof & profiles:
                 return None
         return default_val
 
@@ -633,6 +822,26 @@ class OVFItem(object):
         Returns:
           Value string or list, or ``None``
 
+        Raises:
+          OVFItemDataError: if :meth:`value_replace_wildcards` failed to
+              remove any wildcards from the internally stored value.
+        """
+        if profiles is not None:
+            profiles = self.profile_masks.mask(profiles)
+        return self._get_value_for_mask(tag, profiles)
+
+    def _get_value_for_mask(self, tag, profiles):
+        """Get the value for the given tag under the given profiles.
+
+        Implementation of :meth:`get_value`.
+
+        Args:
+          tag (str): Tag to retrieve value for
+          profiles (int): Mask of profiles, or None
+
+        Returns:
+          Value string or list, or ``None``
+
         Raises:
           OVFItemDataError: if :meth:`value_replace_wildcards` failed to
               remove any wildcards from the internally stored value.
@@ -642,6 +851,8 @@ class OVFItem(object):
         # Sanity check
         if tag == self.ELEMENT_NAME or tag == self.ITEM_DESCRIPTION:
             if val and re.search(r"_RST_|_VQ_|_CONN_|_EN_", val):
+                if profiles is not None:
+                    profiles = self.profile_masks.profiles(profiles)
                 raise OVFItemDataError("Unreplaced wildcard in value "
                                        "for {0} profiles {1}:\n{2}\n{3}"
                                        .format(tag, profiles, val, self))
@@ -680,21 +891,24 @@ class OVFItem(object):
                                    .format(name,
                                            self.property_values(name)))
         for (name, value_dict) in self.properties.items():
-            set_so_far = set()
-            for profile_set in value_dict.values():
-                if None in profile_set and len(profile_set) > 1:
+            mask_so_far = 0
+            for (value, profile_mask) in value_dict.items():
+                if (profile_mask & ProfileMasks.DEFAULT and
+                        profile_mask != ProfileMasks.DEFAULT):
                     logger.debug("Profile set %s contains redundant info; "
-                                 "cleaning it up now...", profile_set)
+                                 "cleaning it up now...",
+                                 self.profile_masks.profiles(profile_mask))
                     # Clean up...
-                    profile_set.clear()
-                    profile_set.add(None)
+                    profile_mask = ProfileMasks.DEFAULT
+                    value_dict[value] = profile_mask
                 # Make sure the profile sets are mutually exclusive
-                inter = set_so_far.intersection(profile_set)
+                inter = mask_so_far & profile_mask
                 if inter:
                     raise RuntimeError("OVFItem illegally contains duplicate "
                                        "profiles %s under %s: %s",
-                                       inter, name, value_dict)
-                set_so_far |= profile_set
+                                       self.profile_masks.profiles(inter),
+                                       name, value_dict)
+                mask_so_far |= profile_mask
 
     def has_profile(self, profile):
         """Check if this Item exists under the given profile.
@@ -705,54 +919,57 @@ class OVFItem(object):
         Returns:
           bool: True if the item exists in this profile, False if not.
         """
-        profiles = self.all_profiles(self.INSTANCE_ID)
-        if profiles is None:
-            return False
-        if profile in profiles:
+        profiles = self._all_profiles_mask(self.INSTANCE_ID)
+        if profiles & self.profile_masks.mask([profile]):
             return True
-        elif None in profiles and profile in self.ovf.config_profiles:
+        elif (profiles & ProfileMasks.DEFAULT and
+              profile in self.ovf.config_profiles):
             return True
         return False
 
-    def get_nonintersecting_set_list(self):
+    def _nonintersecting_masks(self):
         """Identify the minimal non-intersecting set of profiles.
 
         Returns:
-          list: List of profile-set strings.
+          dict: Mapping of profile-set strings to profile masks.
         """
-        set_list = []
+        mask_list = []
         for name in self.property_names:
-            for (_, new_set) in list(self.properties[name].items()):
-                new_set_list = []
-                for existing_set in set_list:
+            for new_mask in list(self.properties[name].values()):
+                new_mask_list = []
+                for existing_mask in mask_list:
                     # If the sets are identical or do not intersect, do nothing
-                    if (new_set == existing_set or
-                            not new_set.intersection(existing_set)):
-                        new_set_list.append(frozenset(existing_set))
+                    if (new_mask == existing_mask or
+                            not new_mask & existing_mask):
+                        new_mask_list.append(existing_mask)
                         continue
                     # Otherwise, need to re-partition!
-                    set_a = existing_set.difference(new_set)
-                    new_set_list.append(frozenset(set_a))
+                    new_mask_list.append(existing_mask & ~new_mask)
+                    new_mask_list.append(existing_mask & new_mask)
+                    new_mask &= ~existing_mask
 
-                    set_b = existing_set.intersection(new_set)
-                    new_set_list.append(frozenset(set_b))
-
-                    new_set = new_set.difference(existing_set)
-
-                new_set_list.append(frozenset(new_set))
+                new_mask_list.append(new_mask)
                 # Remove duplicate and empty entries
-                set_list = [x for x in set(new_set_list) if x]
-
-        logger.spam("Final set list is %s", set_list)
+                mask_list = [x for x in set(new_mask_list) if x]
 
-        # Construct a list of profile strings
-        set_string_list = []
-        for final_set in set_list:
-            if None in final_set:
-                set_string_list.append("")
+        # Construct the profile strings
+        result = {}
+        for final_mask in mask_list:
+            if final_mask & ProfileMasks.DEFAULT:
+                result[""] = final_mask
             else:
-                set_string_list.append(" ".join(natural_sort(final_set)))
-        set_string_list = natural_sort(set_string_list)
+                result[" ".join(natural_sort(
+                    self.profile_masks.profiles(final_mask)))] = final_mask
+        logger.spam("Final set list is %s", result)
+        return result
+
+    def get_nonintersecting_set_list(self):
+        """Identify the minimal non-intersecting set of profiles.
+
+        Returns:
+          list: List of profile-set strings.
+        """
+        set_string_list = natural_sort(self._nonintersecting_masks())
 
         logger.spam("set string list: %s", set_string_list)
 
@@ -764,24 +981,26 @@ class OVFItem(object):
         Returns:
           list: Generated list of XML Item elements
         """
-        set_string_list = self.get_nonintersecting_set_list()
+        mask_dict = self._nonintersecting_masks()
 
         # Now, construct the Items
         item_tag = self.item_tag_for_namespace(self.namespace)
         child_ordering = [self.namespace + i for i in self.ITEM_CHILDREN]
+        names = [(name, self._property_key(name)) for name in
+                 sorted(self.property_names)]
         item_list = []
-        for set_string in set_string_list:
+        for set_string in natural_sort(mask_dict):
+            final_mask = mask_dict[set_string]
             if not set_string:
                 # no config profile
                 item = ET.Element(item_tag)
-                final_set = set([None])
+                final_mask = ProfileMasks.DEFAULT
                 set_string = '<generic>'
             else:
                 item = ET.Element(item_tag, {self.ITEM_CONFIG: set_string})
-                final_set = set(set_string.split())
-            logger.spam("set string: %s; final_set: %s", set_string, final_set)
-            for name in sorted(self.property_names):
-                val = self.get_value(name, final_set)
+            logger.spam("set string: %s", set_string)
+            for (name, (kind, tag, attrib)) in names:
+                val = self._get_value_for_mask(name, final_mask)
                 if not val:
                     logger.debug("No value defined for attribute '%s' "
                                  "under profile set '%s' for instance %s",
@@ -794,27 +1013,26 @@ class OVFItem(object):
                     val = " ".join(val) if val else None
 
                 # Is this an attribute, a child, or a custom element?
-                attrib_match = re.match(r"(.*)" + self.ATTRIB_KEY_SUFFIX, name)
-                if attrib_match:
-                    attrib_string = attrib_match.group(1)
-                child_attrib = re.match(r"(.*)_attrib_(.*)", name)
-                custom_elem = re.match(r"(.*)" + self.ELEMENT_KEY_SUFFIX, name)
-                if attrib_match:
-                    item.set(attrib_string, val)
-                elif child_attrib:
+                if kind == self._ATTRIB:
+                    item.set(attrib, val)
+                elif kind == self._CHILD_ATTRIB:
                     child = XML.set_or_make_child(
                         item,
-                        child_attrib.group(1),
+                        tag,
                         None,
                         ordering=child_ordering,
                         known_namespaces=self.NSM.values())
-                    child.set(child_attrib.group(2), val)
-                elif custom_elem:
+                    child.set(attrib, val)
+                elif kind == self._CUSTOM_ELEMENT:
                     # Recreate the element in question and append it
-                    item.append(ET.fromstring(val))
+                    template = self._element_templates.get(val)
+                    if template is None:
+                        template = ET.fromstring(val)
+                        self._element_templates[val] = template
+                    item.append(copy.deepcopy(template))
                 else:
                     # Children of Item must be in sorted order
-                    XML.set_or_make_child(item, self.namespace + name, val,
+                    XML.set_or_make_child(item, self.namespace + tag, val,
                                           ordering=child_ordering,
                                           known_namespaces=self.NSM.values())
             logger.spam("Item is:\n%s", ET.tostring(item))
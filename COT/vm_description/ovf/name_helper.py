@@ -75,6 +75,7 @@ Element ordering    Most notably, the various child elements under an Item
 .. autosummary::
   :nosignatures:
 
+  FrozenDict
   OVFNameHelper1
   OVFNameHelper0
   OVFNameHelper2
@@ -84,7 +85,10 @@ from COT.data_validation import ValueUnsupportedError
 
 
 def name_helper(version):
-    """Generate an instance of the correct OVFNameHelper variant class.
+    """Get the instance of the correct OVFNameHelper variant class.
+
+    As name helpers are read-only, there's only ever one instance of each
+    variant, shared by all callers.
 
     Args:
       version (float): OVF specification version to use, such as 0.9, 1.0,
@@ -93,11 +97,54 @@ def name_helper(version):
       Instance of OVFNameHelper[012] as appropriate.
     """
     if version < 1.0:
-        return OVFNameHelper0()
+        cls = OVFNameHelper0
     elif version < 2.0:
-        return OVFNameHelper1()
+        cls = OVFNameHelper1
     else:
-        return OVFNameHelper2()
+        cls = OVFNameHelper2
+    helper = _HELPERS.get(cls)
+    if helper is None:
+        helper = _HELPERS[cls] = cls()
+    return helper
+
+
+_HELPERS = {}
+"""Mapping of OVFNameHelper variant class to its shared instance."""
+
+
+class FrozenDict(dict):
+    """A dict that can't be modified after it's created.
+
+    Used for the helpers' dict constants, which are shared by all clients.
+    It's still a real :class:`dict`, as :mod:`lxml.etree` accepts nothing
+    else as the attributes of a new element.
+
+    Examples:
+      ::
+
+        >>> attrib = FrozenDict({'a': '1'})
+        >>> attrib['a']
+        '1'
+        >>> attrib['a'] = '2'
+        Traceback (most recent call last):
+          ...
+        TypeError: FrozenDict is read-only
+    """
+
+    def _read_only(self, *args, **kwargs):
+        """Disallow modification of this dict.
+
+        Raises:
+          TypeError: always
+        """
+        raise TypeError("{0} is read-only".format(self.__class__.__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        """Copy or pickle this dict by its contents, not item by item."""
+        return (self.__class__, (dict(self),))
 
 
 class _Tag(object):
@@ -124,6 +171,13 @@ class OVFNameHelper1(object):
     elements and attributes.
 
     Version-specific subclasses below provide variant properties.
+
+    All of the constants are computed when the helper is created and stored
+    as ordinary, read-only, instance attributes, so looking them up is
+    cheap. Clients that look them up frequently can copy them all into
+    their own attributes with ``vars(helper)``. As the constants are then
+    shared by every such client, any dict constants (such as
+    ``DISK_SECTION_ATTRIB``) are :class:`FrozenDict` instances.
     """
 
     # For the standard namespace URIs in an OVF descriptor, let's define
@@ -173,9 +227,6 @@ class OVFNameHelper1(object):
     for more details.
     """     # noqa: E501
 
-    # Cached strings, built on the fly
-    _cache = {}
-
     # XML elements we care about in the OVF descriptor
     # TagPlusNamespace objects
     _raw = dict(
@@ -313,74 +364,87 @@ class OVFNameHelper1(object):
         WEIGHT='Weight',
     )
 
-    def __getattr__(self, name):
-        """Transparently pass attribute lookups to _raw and _cache.
+    def __init__(self):
+        """Create a name helper for OVF version 1.x."""
+        # Namespaces, as "{uri}", such as OVF and RASD
+        names = dict((prefix.upper(), "{" + uri + "}")
+                     for (prefix, uri) in self.NSM.items())
+        # Older OVF versions have ethernet and storage items
+        # in the same RASD namespace as other hardware
+        names.setdefault('EPASD', names['RASD'])
+        names.setdefault('SASD', names['RASD'])
+        for (name, raw) in self._raw.items():
+            names[name] = names[raw.namespace_name] + raw.tag
+        names.update(self._item_children)
+
+        # 1.0 is nice in that they're all in alphabetical order
+        names['ITEM_CHILDREN'] = tuple(names[name] for name in (
+            'ADDRESS',
+            'ADDRESS_ON_PARENT',
+            'ALLOCATION_UNITS',
+            'AUTOMATIC_ALLOCATION',
+            'AUTOMATIC_DEALLOCATION',
+            'CAPTION',
+            'CONNECTION',
+            'CONSUMER_VISIBILITY',
+            'ITEM_DESCRIPTION',
+            'ELEMENT_NAME',
+            'HOST_RESOURCE',
+            'INSTANCE_ID',
+            'LIMIT',
+            'MAPPING_BEHAVIOR',
+            'OTHER_RESOURCE_TYPE',
+            'PARENT',
+            'POOL_ID',
+            'RESERVATION',
+            'RESOURCE_SUB_TYPE',
+            'RESOURCE_TYPE',
+            'VIRTUAL_QUANTITY',
+            'WEIGHT',
+        ))
+
+        # all of these are 0.9 exclusive
+        for name in ('NETWORK_SECTION_ATTRIB',
+                     'DISK_SECTION_ATTRIB',
+                     'ANNOTATION_SECTION_ATTRIB',
+                     'VIRTUAL_SYSTEM_ATTRIB',
+                     'PRODUCT_SECTION_ATTRIB',
+                     'EULA_SECTION_ATTRIB',
+                     'VIRTUAL_HW_SECTION_ATTRIB'):
+            names[name] = {}
+
+        self._define(names)
+
+    def _define(self, names):
+        """Define (or redefine) constants of this helper.
+
+        Only for use during construction, as the helper is otherwise
+        read-only.
 
         Args:
-          name (str): Attribute name to look up.
-        Returns:
-          Value looked up from :attr:`_raw` and/or :attr:`_cache`.
-        Raises:
-          AttributeError: if the given ``name`` is not found.
+          names (dict): Constant names and their values.
         """
-        if name in self._item_children:
-            return self._item_children[name]
-        if name not in self._cache:
-            if name.lower() in self.NSM:
-                self._cache[name] = "{%s}" % self.NSM[name.lower()]
-            elif name == "EPASD" or name == "SASD":
-                self._cache[name] = self.RASD
-            elif name not in self._raw:
-                raise AttributeError("Unknown attribute '{0}'".format(name))
-            else:
-                namespace = getattr(self, self._raw[name].namespace_name)
-                tag = self._raw[name].tag
-                self._cache[name] = namespace + tag
-        return self._cache[name]
+        self.__dict__.update(
+            (name, FrozenDict(value) if isinstance(value, dict) else value)
+            for (name, value) in names.items())
 
-    def __init__(self):
-        """Create a name helper for OVF version 1.x."""
-        # 1.0 is nice in that they're all in alphabetical order
+    def __setattr__(self, name, value):
+        """Disallow modification of this helper's constants.
 
-        # Pylint doesn't like naming instance attributes like constants,
-        # even though really these are treated as instance constants.
-        # This needs future refactoring anyway, so for now:
-        # pylint: disable=invalid-name
-
-        self.ITEM_CHILDREN = (
-            self.ADDRESS,
-            self.ADDRESS_ON_PARENT,
-            self.ALLOCATION_UNITS,
-            self.AUTOMATIC_ALLOCATION,
-            self.AUTOMATIC_DEALLOCATION,
-            self.CAPTION,
-            self.CONNECTION,
-            self.CONSUMER_VISIBILITY,
-            self.ITEM_DESCRIPTION,
-            self.ELEMENT_NAME,
-            self.HOST_RESOURCE,
-            self.INSTANCE_ID,
-            self.LIMIT,
-            self.MAPPING_BEHAVIOR,
-            self.OTHER_RESOURCE_TYPE,
-            self.PARENT,
-            self.POOL_ID,
-            self.RESERVATION,
-            self.RESOURCE_SUB_TYPE,
-            self.RESOURCE_TYPE,
-            self.VIRTUAL_QUANTITY,
-            self.WEIGHT,
-        )
+        Raises:
+          AttributeError: always
+        """
+        raise AttributeError("{0} is read-only"
+                             .format(self.__class__.__name__))
 
-        # all of these are 0.9 exclusive
+    def __delattr__(self, name):
+        """Disallow deletion of this helper's constants.
 
-        self.NETWORK_SECTION_ATTRIB = {}
-        self.DISK_SECTION_ATTRIB = {}
-        self.ANNOTATION_SECTION_ATTRIB = {}
-        self.VIRTUAL_SYSTEM_ATTRIB = {}
-        self.PRODUCT_SECTION_ATTRIB = {}
-        self.EULA_SECTION_ATTRIB = {}
-        self.VIRTUAL_HW_SECTION_ATTRIB = {}
+        Raises:
+          AttributeError: always
+        """
+        raise AttributeError("{0} is read-only"
+                             .format(self.__class__.__name__))
 
     def namespace_for_item_tag(self, tag):
         """Get the XML namespace for the given item tag.
@@ -449,7 +513,6 @@ class OVFNameHelper0(OVFNameHelper1):
     )
     """Shorthand for XML namespace URIs usually seen in a version 0.x OVF."""
 
-    _cache = dict(OVFNameHelper1._cache)
     _raw = dict(
         OVFNameHelper1._raw,
         NETWORK_SECTION=_Tag('ovf', 'Section'),
@@ -475,53 +538,54 @@ class OVFNameHelper0(OVFNameHelper1):
     def __init__(self):
         """Create a name helper for OVF version 0.x."""
         super(OVFNameHelper0, self).__init__()
-        self.ITEM_CHILDREN = (
-            self.CAPTION,
-            self.ITEM_DESCRIPTION,
-            self.INSTANCE_ID,
-            self.RESOURCE_TYPE,
-            self.OTHER_RESOURCE_TYPE,
-            self.RESOURCE_SUB_TYPE,
-            self.POOL_ID,
-            self.CONSUMER_VISIBILITY,
-            self.HOST_RESOURCE,
-            self.ALLOCATION_UNITS,
-            self.VIRTUAL_QUANTITY,
-            self.RESERVATION,
-            self.LIMIT,
-            self.WEIGHT,
-            self.AUTOMATIC_ALLOCATION,
-            self.AUTOMATIC_DEALLOCATION,
-            self.PARENT,
-            self.CONNECTION,
-            self.ADDRESS,
-            self.MAPPING_BEHAVIOR,
-            self.ADDRESS_ON_PARENT,
-            self.BUS_NUMBER,
-        )
-
         xsi_type = "{" + self.NSM['xsi'] + "}type"
-        self.NETWORK_SECTION_ATTRIB = {
-            xsi_type: "ovf:NetworkSection_Type"
-        }
-        self.DISK_SECTION_ATTRIB = {
-            xsi_type: "ovf:DiskSection_Type"
-        }
-        self.ANNOTATION_SECTION_ATTRIB = {
-            xsi_type: "ovf:AnnotationSection_Type"
-        }
-        self.VIRTUAL_SYSTEM_ATTRIB = {
-            xsi_type: "ovf:VirtualSystem_Type"
-        }
-        self.PRODUCT_SECTION_ATTRIB = {
-            xsi_type: "ovf:ProductSection_Type"
-        }
-        self.EULA_SECTION_ATTRIB = {
-            xsi_type: "ovf:EulaSection_Type"
-        }
-        self.VIRTUAL_HW_SECTION_ATTRIB = {
-            xsi_type: "ovf:VirtualHardwareSection_Type"
-        }
+        self._define(dict(
+            ITEM_CHILDREN=(
+                self.CAPTION,
+                self.ITEM_DESCRIPTION,
+                self.INSTANCE_ID,
+                self.RESOURCE_TYPE,
+                self.OTHER_RESOURCE_TYPE,
+                self.RESOURCE_SUB_TYPE,
+                self.POOL_ID,
+                self.CONSUMER_VISIBILITY,
+                self.HOST_RESOURCE,
+                self.ALLOCATION_UNITS,
+                self.VIRTUAL_QUANTITY,
+                self.RESERVATION,
+                self.LIMIT,
+                self.WEIGHT,
+                self.AUTOMATIC_ALLOCATION,
+                self.AUTOMATIC_DEALLOCATION,
+                self.PARENT,
+                self.CONNECTION,
+                self.ADDRESS,
+                self.MAPPING_BEHAVIOR,
+                self.ADDRESS_ON_PARENT,
+                self.BUS_NUMBER,
+            ),
+            NETWORK_SECTION_ATTRIB={
+                xsi_type: "ovf:NetworkSection_Type"
+            },
+            DISK_SECTION_ATTRIB={
+                xsi_type: "ovf:DiskSection_Type"
+            },
+            ANNOTATION_SECTION_ATTRIB={
+                xsi_type: "ovf:AnnotationSection_Type"
+            },
+            VIRTUAL_SYSTEM_ATTRIB={
+                xsi_type: "ovf:VirtualSystem_Type"
+            },
+            PRODUCT_SECTION_ATTRIB={
+                xsi_type: "ovf:ProductSection_Type"
+            },
+            EULA_SECTION_ATTRIB={
+                xsi_type: "ovf:EulaSection_Type"
+            },
+            VIRTUAL_HW_SECTION_ATTRIB={
+                xsi_type: "ovf:VirtualHardwareSection_Type"
+            },
+        ))
 
 
 class OVFNameHelper2(OVFNameHelper1):
@@ -542,7 +606,6 @@ class OVFNameHelper2(OVFNameHelper1):
     )
     """Shorthand for XML namespace URIs usually seen in a version 2.x OVF."""
 
-    _cache = dict(OVFNameHelper1._cache)
     _raw = dict(
         OVFNameHelper1._raw,
         STORAGE_ITEM=_Tag('ovf', 'StorageItem'),
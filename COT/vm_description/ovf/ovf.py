@@ -28,17 +28,16 @@ import logging
 import os
 import os.path
 import re
-import tarfile
-import xml.etree.ElementTree as ET    # noqa: N814
-from xml.etree.ElementTree import ParseError
 import textwrap
+from contextlib import closing
 
-from COT.xml_file import XML
+from COT.xml_file import ET, ParseError, XML
 from COT.data_validation import (
-    match_or_die, check_for_conflict, file_checksum,
+    match_or_die, check_for_conflict, checksum_hash, file_checksum,
     ValueTooHighError, ValueUnsupportedError, canonicalize_nic_subtype,
 )
 from COT.file_reference import FileReference, FileOnDisk
+from COT.tar_file import TarIndex, TarMemberReader, TarWriter
 from COT.platforms import Platform
 from COT.disks import DiskRepresentation
 from COT.utilities import pretty_bytes, tar_entry_size
@@ -46,7 +45,7 @@ from COT.utilities import pretty_bytes, tar_entry_size
 from ..vm_description import VMDescription, VMInitError
 from .name_helper import name_helper, CIM_URI
 from .hardware import OVFHardware, OVFHardwareDataError
-from .item import list_union
+from .item import list_union, ProfileMasks
 from .utilities import (
     int_bytes_to_programmatic_units, parse_manifest, programmatic_bytes_to_int,
 )
@@ -64,6 +63,7 @@ class OVF(VMDescription, XML):
 
       input_file
       output_file
+      modified
       ovf_version
       product_class
       platform
@@ -125,19 +125,19 @@ class OVF(VMDescription, XML):
         """Get the OVF descriptor for the given file.
 
         1. The file may be an OVF descriptor itself.
-        2. The file may be an OVA, in which case we need to untar it and
-           return the path to the extracted OVF descriptor.
+        2. The file may be an OVA, in which case we locate the OVF descriptor
+           within the OVA and return its name within the archive. Nothing is
+           extracted from the OVA.
 
         Args:
           input_file (str): Path to an OVF descriptor or OVA file.
 
         Returns:
-          str: OVF descriptor path
+          str: OVF descriptor path, or OVF descriptor name within the OVA
         """
         extension = self.detect_type_from_name(input_file)
         if extension == '.ova' or extension == '.box':
-            # Untar the ova to our working directory
-            return self.untar(input_file)
+            return self._find_ova_descriptor(input_file).name
         elif extension == '.ovf':
             return input_file
         else:
@@ -176,34 +176,22 @@ class OVF(VMDescription, XML):
                     input_file)
 
             # Open the provided OVF
-            try:
-                XML.__init__(self, self.ovf_descriptor)
-            except ParseError as exc:
-                raise VMInitError(2,
-                                  "XML error in parsing file: " + str(exc),
-                                  self.ovf_descriptor)
-
-            # Quick sanity check before we go any further:
-            if ((not re.search(r"Envelope", self.root.tag)) or
-                    (XML.strip_ns(self.root.tag) != 'Envelope')):
-                raise VMInitError(
-                    2,
-                    "File does not appear to be an OVF descriptor - "
-                    "expected top-level element {0} but found {1} instead"
-                    .format('Envelope', self.root.tag),
-                    self.ovf_descriptor)
+            self._init_read_descriptor()
 
             self._ovf_version = None
             self.name_helper = name_helper(self.ovf_version)
+            # Bind all of the XML names directly to this object, so that
+            # looking them up doesn't go through __getattr__()
+            self.__dict__.update(vars(self.name_helper))
 
             for (prefix, uri) in self.NSM.items():
-                ET.register_namespace(prefix, uri)
+                self.register_namespace(prefix, uri)
 
             # Register additional non-standard namespaces we're aware of:
-            ET.register_namespace('vmw', "http://www.vmware.com/schema/ovf")
-            ET.register_namespace('vbox',
-                                  "http://www.virtualbox.org/ovf/machine")
-            ET.register_namespace(
+            self.register_namespace('vmw', "http://www.vmware.com/schema/ovf")
+            self.register_namespace('vbox',
+                                    "http://www.virtualbox.org/ovf/machine")
+            self.register_namespace(
                 'pasd',
                 CIM_URI + "/cim-schema/2/CIM_ProcessorAllocationSettingData")
 
@@ -245,9 +233,15 @@ class OVF(VMDescription, XML):
                 required=True)
 
             # Initialize various caches
+            self._init_indexes()
             self._configuration_profiles = None
+            self.profile_masks = ProfileMasks()
+            """Bitmask representation of config profiles, for OVFItem."""
             self._file_references = {}
             self._platform = None
+            # See modified and _mark_unmodified()
+            self._modified = False
+            self._file_fingerprints = None
 
             try:
                 self.hardware = OVFHardware(self)
@@ -263,10 +257,154 @@ class OVF(VMDescription, XML):
 
             Does not include the manifest file."""
 
+            if output_file is not None:
+                # Remember what we read, so write() can tell what changed
+                self._mark_unmodified()
+
         except Exception:
             self.destroy()
             raise
 
+    def _init_read_descriptor(self):
+        """Parse the OVF descriptor, whether standalone or within an OVA.
+
+        Raises:
+          VMInitError:
+              * if an XML parsing error occurs
+              * if the XML is not actually an OVF descriptor
+        """
+        try:
+            if self.input_file == self.ovf_descriptor:
+                XML.__init__(self, self.ovf_descriptor)
+            else:
+                self._init_read_ova_descriptor()
+        except ParseError as exc:
+            raise VMInitError(2,
+                              "XML error in parsing file: " + str(exc),
+                              self.ovf_descriptor)
+
+        # Quick sanity check before we go any further:
+        if ((not re.search(r"Envelope", self.root.tag)) or
+                (XML.strip_ns(self.root.tag) != 'Envelope')):
+            raise VMInitError(
+                2,
+                "File does not appear to be an OVF descriptor - "
+                "expected top-level element {0} but found {1} instead"
+                .format('Envelope', self.root.tag),
+                self.ovf_descriptor)
+
+    def _init_read_ova_descriptor(self):
+        """Parse the OVF descriptor in place within the OVA.
+
+        Nothing is extracted from the OVA; the descriptor is read directly
+        from its location within the archive.
+        """
+        member = TarIndex.for_path(self.input_file).lookup(self.ovf_descriptor)
+        with closing(TarMemberReader(self.input_file, member)) as file_obj:
+            XML.__init__(self, file_obj)
+
+    def _init_indexes(self):
+        """Build the keyed lookup tables for File, Disk, Network, Property.
+
+        These let us find a given element by its identifying attribute(s)
+        without searching all of its siblings every time. Any method that
+        adds, removes, or re-identifies such an element must update them.
+        """
+        self._file_by_href = {}
+        self._file_by_id = {}
+        for file_obj in self.references.findall(self.FILE):
+            self._index_file(file_obj)
+
+        self._disk_by_id = {}
+        self._disk_by_file_ref = {}
+        if self.disk_section is not None:
+            for disk in self.disk_section.findall(self.DISK):
+                self._index_disk(disk)
+
+        self._network_by_name = {}
+        if self.network_section is not None:
+            for network in self.network_section.findall(self.NETWORK):
+                self._add_to_index(self._network_by_name,
+                                   network.get(self.NETWORK_NAME), network)
+
+        self._property_by_key = {}
+        if self.product_section is not None:
+            for prop in self.product_section.findall(self.PROPERTY):
+                self._add_to_index(self._property_by_key,
+                                   prop.get(self.PROP_KEY), prop)
+
+    @staticmethod
+    def _add_to_index(index, key, element):
+        """Add the given element to the given lookup table.
+
+        Args:
+          index (dict): Lookup table to update
+          key (str): Key identifying this element, or ``None``
+          element (xml.etree.ElementTree.Element): Element to add
+        """
+        if key is None:
+            return
+        if key in index:
+            logger.warning("Found multiple <%s> elements with the same "
+                           "identifier '%s'", XML.strip_ns(element.tag), key)
+            return
+        index[key] = element
+
+    @staticmethod
+    def _remove_from_index(index, key, element):
+        """Remove the given element from the given lookup table, if present.
+
+        Args:
+          index (dict): Lookup table to update
+          key (str): Key identifying this element, or ``None``
+          element (xml.etree.ElementTree.Element): Element to remove
+        """
+        if index.get(key) is element:
+            del index[key]
+
+    def _index_file(self, file_obj):
+        """Add the given File to the lookup tables.
+
+        Args:
+          file_obj (xml.etree.ElementTree.Element): 'File' element
+        """
+        self._add_to_index(self._file_by_href, file_obj.get(self.FILE_HREF),
+                           file_obj)
+        self._add_to_index(self._file_by_id, file_obj.get(self.FILE_ID),
+                           file_obj)
+
+    def _unindex_file(self, file_obj):
+        """Remove the given File from the lookup tables.
+
+        Args:
+          file_obj (xml.etree.ElementTree.Element): 'File' element
+        """
+        self._remove_from_index(self._file_by_href,
+                                file_obj.get(self.FILE_HREF), file_obj)
+        self._remove_from_index(self._file_by_id,
+                                file_obj.get(self.FILE_ID), file_obj)
+
+    def _index_disk(self, disk):
+        """Add the given Disk to the lookup tables.
+
+        Args:
+          disk (xml.etree.ElementTree.Element): 'Disk' element
+        """
+        self._add_to_index(self._disk_by_id, disk.get(self.DISK_ID), disk)
+        self._add_to_index(self._disk_by_file_ref,
+                           disk.get(self.DISK_FILE_REF), disk)
+
+    def _unindex_disk(self, disk):
+        """Remove the given Disk from the lookup tables.
+
+        Args:
+          disk (xml.etree.ElementTree.Element): 'Disk' element
+        """
+        self._remove_from_index(self._disk_by_id, disk.get(self.DISK_ID),
+                                disk)
+        self._remove_from_index(self._disk_by_file_ref,
+                                disk.get(self.DISK_FILE_REF), disk)
+
     def _compare_file_lists(self, descriptor_file_list, manifest_file_list):
         """Compare two lists of files.
 
@@ -346,35 +484,66 @@ class OVF(VMDescription, XML):
         # Check the checksum of the descriptor itself
         # We don't store this in file_references as that would be
         # prone to self-recursion.
-        m_algo, m_cksum = manifest_entries.get(
-            os.path.basename(self.ovf_descriptor), (None, None))
-        if m_algo and m_algo != self.checksum_algorithm:
-            # TODO: log a warning? Discard the checksum?
-            pass
-        FileReference.create(
-            input_path, os.path.basename(self.ovf_descriptor),
-            checksum_algorithm=self.checksum_algorithm,
-            expected_checksum=m_cksum)
+        ovf_filename = os.path.basename(self.ovf_descriptor)
+        expected_checksums = [(
+            FileReference.create(input_path, ovf_filename,
+                                 checksum_algorithm=self.checksum_algorithm),
+            manifest_entries.get(ovf_filename, (None, None)))]
 
         # Now check the checksum of the other files
         for file_href, file_size in descriptor_files.items():
-            m_algo, m_cksum = manifest_entries.get(file_href, (None, None))
-            if m_algo and m_algo != self.checksum_algorithm:
-                # TODO: log a warning? Discard the checksum?
-                pass
             try:
                 file_references[file_href] = FileReference.create(
                     input_path, file_href,
                     checksum_algorithm=self.checksum_algorithm,
-                    expected_checksum=m_cksum,
                     expected_size=file_size)
             except IOError:
                 logger.error("File '%s' referenced in the OVF descriptor "
                              "does not exist.", file_href)
                 continue
+            expected_checksums.append((file_references[file_href],
+                                       manifest_entries.get(file_href,
+                                                            (None, None))))
 
+        self._check_manifest_checksums(expected_checksums)
         return file_references
 
+    @staticmethod
+    def _check_manifest_checksums(expected_checksums):
+        """Validate files against their checksums listed in the manifest.
+
+        The manifest may use a different checksum algorithm than we would,
+        in which case we compute both checksums in the same pass over each
+        file - one to validate the manifest, one for later use.
+
+        Args:
+          expected_checksums (list): List of
+            (:class:`~COT.FileReference`, (algorithm, checksum)) tuples,
+            where the algorithm and checksum are ``None`` if the file
+            is not listed in the manifest.
+        """
+        to_check = []
+        for file_ref, (m_algo, m_cksum) in expected_checksums:
+            if m_cksum is None:
+                continue
+            m_algo = m_algo.lower()
+            try:
+                checksum_hash(m_algo)
+            except NotImplementedError:
+                logger.warning("Unable to validate %s checksum of file '%s'"
+                               " listed in manifest - unsupported algorithm",
+                               m_algo.upper(), file_ref.filename)
+                continue
+            to_check.append((file_ref, m_algo, m_cksum))
+
+        # Hash all of the files in parallel, then compare to the manifest
+        FileReference.compute_checksums(
+            [file_ref for (file_ref, _, _) in to_check],
+            algorithms=[[file_ref.checksum_algorithm, m_algo]
+                        for (file_ref, m_algo, _) in to_check])
+        for file_ref, m_algo, m_cksum in to_check:
+            file_ref.check_checksum(m_cksum, m_algo)
+
     @property
     def output_file(self):
         """OVF or OVA file that will be created or updated by :meth:`write`.
@@ -448,6 +617,7 @@ class OVF(VMDescription, XML):
                          self.product_class, product_class)
         self.product_section.set(self.PRODUCT_CLASS, product_class)
         self._product_class = product_class
+        self._modified = True
 
         # Change platform as well!
         self._platform = None
@@ -606,6 +776,7 @@ class OVF(VMDescription, XML):
                      transports_string)
         self.virtual_hw_section.set(self.ENVIRONMENT_TRANSPORT,
                                     transports_string)
+        self._modified = True
 
     @property
     def networks(self):
@@ -656,6 +827,7 @@ class OVF(VMDescription, XML):
                                   "Virtual System Type")
             XML.set_or_make_child(system, self.VSSD + "InstanceID", 0)
         XML.set_or_make_child(system, self.VIRTUAL_SYSTEM_TYPE, type_string)
+        self._modified = True
 
     @property
     def product(self):
@@ -744,6 +916,9 @@ class OVF(VMDescription, XML):
     def __getattr__(self, name):
         """Transparently pass attribute lookups off to name_helper.
 
+        Only used for the helper's class attributes and methods, as its
+        XML name constants are bound directly to this object.
+
         Args:
           name (str): Attribute being looked up.
 
@@ -755,7 +930,7 @@ class OVF(VMDescription, XML):
               through but will raise an AttributeError as usual.
         """
         # Don't pass 'special' attributes through to the helper
-        if re.match(r"^__", name):
+        if name.startswith("__"):
             raise AttributeError("'OVF' object has no attribute '{0}'"
                                  .format(name))
         return getattr(self.name_helper, name)
@@ -776,8 +951,8 @@ class OVF(VMDescription, XML):
           int: Estimated number of bytes consumed when writing out to
             :attr:`output_file` (plus any associated files).
         """
-        # Size of the OVF descriptor
-        needed = tar_entry_size(len(ET.tostring(self.root)))
+        # Size of the OVF descriptor, exactly as it would be written now
+        needed = tar_entry_size(len(self.serialize()))
 
         # Account for the size of all the referenced files
         manifest_size = 0
@@ -807,8 +982,24 @@ class OVF(VMDescription, XML):
         logger.debug("Estimated output size is %s", pretty_bytes(needed))
         return needed
 
-    def write(self):
-        """Write OVF or OVA to :attr:`output_file`, if set."""
+    def write(self, manifest_last=False):
+        """Write OVF or OVA to :attr:`output_file`, if set.
+
+        If :attr:`output_file` is the same file as :attr:`input_file`,
+        only what has actually changed is rewritten:
+
+        * If nothing has changed (see :attr:`modified`), nothing is written
+          at all.
+        * If the descriptor has changed but the referenced files have not,
+          the files are not examined again. For an OVF, only the descriptor
+          and manifest are rewritten; for an OVA, the unchanged files are
+          spliced from the existing OVA into its replacement.
+
+        Args:
+          manifest_last (bool): When writing an OVA, place the manifest at
+              the end of the OVA rather than immediately after the
+              descriptor. See :meth:`tar`.
+        """
         if not self.output_file:
             return
 
@@ -817,29 +1008,46 @@ class OVF(VMDescription, XML):
         prefix = os.path.splitext(self.output_file)[0]
         extension = self.output_extension
 
-        # Update the XML ElementTree to reflect any hardware changes
-        self.hardware.update_xml()
+        in_place = self._output_is_input()
+        files_modified = self._file_references_modified()
+        # Check this before update_xml() marks the hardware as up to date
+        modified = self.modified
+
+        if not in_place or self.hardware.modified:
+            # Update the XML ElementTree to reflect any hardware changes
+            self.hardware.update_xml()
 
-        # Validate the hardware to be written
-        self.validate_hardware()
+            # Validate the hardware to be written
+            self.validate_hardware()
 
-        # Make sure file references are correct:
-        self._refresh_file_references()
+        if not in_place or files_modified:
+            # Make sure file references are correct:
+            self._refresh_file_references()
 
         # Make sure all defined networks are actually used by NICs,
         # and delete any networks that are unused.
         self._refresh_networks()
 
+        if in_place and not (files_modified or modified or self._modified):
+            logger.info("No changes to %s, so there's nothing to write",
+                        self.output_file)
+            return
+
+        # Serialize the descriptor just once - its size, its checksum,
+        # and the data written out all come from this buffer.
+        descriptor = self.serialize()
+
         logger.info("Writing out to file %s", self.output_file)
 
         if extension == '.ova':
-            ovf_file = os.path.join(self.working_dir, "{0}.ovf"
-                                    .format(os.path.basename(prefix)))
-            self.write_xml(ovf_file)
-            self.generate_manifest(ovf_file)
-            self.tar(ovf_file, self.output_file)
+            # The descriptor goes straight into the OVA, never to disk
+            self.tar("{0}.ovf".format(os.path.basename(prefix)),
+                     self.output_file, descriptor=descriptor,
+                     manifest_last=manifest_last)
         elif extension == '.ovf':
-            self.write_xml(self.output_file)
+            logger.verbose("Writing XML to %s", self.output_file)
+            with open(self.output_file, 'wb') as fileobj:
+                fileobj.write(descriptor)
             # Copy all files from working directory to destination
             dest_dir = os.path.dirname(os.path.abspath(self.output_file))
 
@@ -847,12 +1055,79 @@ class OVF(VMDescription, XML):
                 file_ref.copy_to(dest_dir)
 
             # Generate manifest
-            self.generate_manifest(self.output_file)
+            self.generate_manifest(self.output_file, descriptor=descriptor)
         else:
             # We should never get here, but to be safe:
             raise NotImplementedError("Not sure how to write a '{0}' file"
                                       .format(extension))
 
+        if in_place:
+            self._mark_unmodified()
+
+    def _output_is_input(self):
+        """Check whether :attr:`output_file` is :attr:`input_file`.
+
+        Helper method for :meth:`write`.
+
+        Returns:
+          bool: True if writing out would overwrite the input file.
+        """
+        try:
+            return os.path.samefile(self.input_file, self.output_file)
+        except OSError:
+            # Output file doesn't exist (yet)
+            return False
+
+    @property
+    def modified(self):
+        """Whether the descriptor has been changed since it was read.
+
+        Set by each method that changes the descriptor, and cleared when
+        the descriptor is written back over the input file.
+
+        Returns:
+          bool: True if the descriptor differs from the input file.
+        """
+        return self._modified or self.hardware.modified
+
+    def _mark_unmodified(self):
+        """Record the current state of this package as matching the input.
+
+        :meth:`write` compares against this state to decide what, if
+        anything, needs to be rewritten.
+        """
+        self._modified = False
+        self._file_fingerprints = {}
+        for href, file_ref in self.file_references.items():
+            try:
+                fingerprint = file_ref.fingerprint
+            except IOError:
+                fingerprint = None
+            self._file_fingerprints[href] = (file_ref, fingerprint)
+
+    def _file_references_modified(self):
+        """Check whether any referenced files have changed.
+
+        Helper method for :meth:`write`.
+
+        Returns:
+          bool: True if any files have been added, removed, replaced, or
+          modified since :meth:`_mark_unmodified` was last called.
+        """
+        if (self._file_fingerprints is None or
+                set(self.file_references) != set(self._file_fingerprints)):
+            return True
+        for href, file_ref in self.file_references.items():
+            (old_ref, old_fingerprint) = self._file_fingerprints[href]
+            if file_ref is not old_ref or old_fingerprint is None:
+                return True
+            try:
+                if file_ref.fingerprint != old_fingerprint:
+                    return True
+            except IOError:
+                return True
+        return False
+
     def _refresh_file_references(self):
         """Check all File entries to make sure they are valid and up to date.
 
@@ -877,11 +1152,12 @@ class OVF(VMDescription, XML):
                 # TODO this should probably have a confirm() check...
                 logger.notice("Removing reference to missing file %s", href)
                 self.references.remove(file_elem)
+                self._unindex_file(file_elem)
+                self._modified = True
                 # TODO remove references to this file from Disk, Item?
 
         for filename, file_ref in self.file_references.items():
-            file_elem = self.find_child(self.references, self.FILE,
-                                        {self.FILE_HREF: filename})
+            file_elem = self._file_by_href.get(filename)
             assert file_elem is not None
             file_elem.set(self.FILE_SIZE, str(file_ref.size))
 
@@ -930,11 +1206,14 @@ class OVF(VMDescription, XML):
             if name not in connected_networks:
                 logger.notice("Removing unused network %s", name)
                 self.network_section.remove(net)
+                self._remove_from_index(self._network_by_name, name, net)
+                self._modified = True
         # If all networks were removed, remove the NetworkSection too
         if not self.network_section.findall(self.NETWORK):
             logger.notice("No networks left - removing NetworkSection")
             self.envelope.remove(self.network_section)
             self.network_section = None
+            self._modified = True
 
     def _info_string_header(self, width):
         """Generate OVF/OVA file header for :meth:`info_string`.
@@ -1160,9 +1439,7 @@ class OVF(VMDescription, XML):
 
         # Find placeholder disks as well
         for disk in disk_list:
-            file_id = disk.get(self.DISK_FILE_REF)
-            file_obj = self.find_child(self.references, self.FILE,
-                                       attrib={self.FILE_ID: file_id})
+            file_obj = self._file_by_id.get(disk.get(self.DISK_FILE_REF))
             if file_obj is not None:
                 continue   # already reported on above
             disk_cap_string = pretty_bytes(self.get_capacity_from_disk(disk))
@@ -1560,6 +1837,7 @@ class OVF(VMDescription, XML):
         logger.debug("New profile %s created - clear config_profiles cache",
                      pid)
         self._configuration_profiles = None
+        self._modified = True
 
     def delete_configuration_profile(self, profile):
         """Delete the profile with the given ID.
@@ -1594,6 +1872,7 @@ class OVF(VMDescription, XML):
         logger.debug("Profile %s deleted - clear config_profiles cache",
                      profile)
         self._configuration_profiles = None
+        self._modified = True
 
     # TODO - how to insert a doc about the profile_list (see vm_description.py)
 
@@ -1684,9 +1963,13 @@ class OVF(VMDescription, XML):
             self.NETWORK_SECTION,
             "Logical networks",
             attrib=self.NETWORK_SECTION_ATTRIB)
-        network = self.set_or_make_child(self.network_section, self.NETWORK,
-                                         attrib={self.NETWORK_NAME: label})
+        network = self._network_by_name.get(label)
+        if network is None:
+            network = ET.SubElement(self.network_section, self.NETWORK,
+                                    attrib={self.NETWORK_NAME: label})
+            self._network_by_name[label] = network
         self.set_or_make_child(network, self.NWK_DESC, description)
+        self._modified = True
 
     def set_nic_networks(self, network_list, profile_list):
         """Set the NIC to network mapping for NICs under the given profile(s).
@@ -1805,6 +2088,17 @@ class OVF(VMDescription, XML):
                                               type_list,
                                               profile_list)
 
+    def has_property(self, key):
+        """Check whether the given property exists.
+
+        Args:
+          key (str): Property identifier
+
+        Returns:
+          bool: Whether the property exists, whether or not it has a value.
+        """
+        return key in self._property_by_key
+
     def get_property_value(self, key):
         """Get the value of the given property.
 
@@ -1816,8 +2110,7 @@ class OVF(VMDescription, XML):
         """
         if self.ovf_version < 1.0 or self.product_section is None:
             return None
-        prop = self.find_child(self.product_section, self.PROPERTY,
-                               attrib={self.PROP_KEY: key})
+        prop = self._property_by_key.get(key)
         if prop is None:
             return None
         return prop.get(self.PROP_VALUE)
@@ -1898,40 +2191,142 @@ class OVF(VMDescription, XML):
         if self.ovf_version < 1.0:
             raise NotImplementedError("No support for setting environment "
                                       "properties under OVF v0.9")
-        self.product_section = self._ensure_section(
-            self.PRODUCT_SECTION,
-            "Product Information",
-            attrib=self.PRODUCT_SECTION_ATTRIB,
-            parent=self.virtual_system)
-        prop = self.find_child(self.product_section, self.PROPERTY,
-                               attrib={self.PROP_KEY: key})
+        prop = self._property_by_key.get(key)
         if prop is None:
-            prop = self.set_or_make_child(self.product_section, self.PROPERTY,
-                                          attrib={self.PROP_KEY: key})
+            prop = ET.Element(self.PROPERTY, attrib={self.PROP_KEY: key})
             # Properties *must* have a type to be valid
             if property_type is None:
                 property_type = 'string'
+            changed = True
+        else:
+            changed = False
 
+        # Work out the new attributes, and validate any value against them,
+        # before changing anything
+        attrib = dict(prop.attrib)
         if user_configurable is not None:
-            prop.set(self.PROP_USER_CONFIGABLE, str(user_configurable).lower())
+            attrib[self.PROP_USER_CONFIGABLE] = str(user_configurable).lower()
         if property_type is not None:
-            prop.set(self.PROP_TYPE, property_type)
+            attrib[self.PROP_TYPE] = property_type
             # Revalidate any existing value if not setting a new value
             if value is None:
                 value = prop.get(self.PROP_VALUE)
 
         if value is not None:
             # Make sure the requested value is valid
-            value = self._validate_value_for_property(prop, value)
-            prop.set(self.PROP_VALUE, value)
+            value = self._validate_value_for_property(
+                ET.Element(self.PROPERTY, attrib=attrib), value)
+            attrib[self.PROP_VALUE] = value
 
-        if label is not None:
-            self.set_or_make_child(prop, self.PROPERTY_LABEL, label)
-        if description is not None:
-            self.set_or_make_child(prop, self.PROPERTY_DESC, description)
+        if self.product_section is None:
+            changed = True
+        self.product_section = self._ensure_section(
+            self.PRODUCT_SECTION,
+            "Product Information",
+            attrib=self.PRODUCT_SECTION_ATTRIB,
+            parent=self.virtual_system)
+        if key not in self._property_by_key:
+            self.product_section.append(prop)
+            self._property_by_key[key] = prop
 
+        if self._update_property(prop, attrib, label, description) or changed:
+            self._modified = True
         return value
 
+    def _update_property(self, prop, attrib, label=None, description=None):
+        """Update the given Property element, if its contents differ.
+
+        Helper method for :meth:`set_property_value` and
+        :meth:`set_property_values`.
+
+        Args:
+          prop (xml.etree.ElementTree.Element): Property element to update.
+          attrib (dict): Attributes to set. ``None`` values are ignored.
+          label (str): Label to set, if not ``None``.
+          description (str): Description to set, if not ``None``.
+
+        Returns:
+          bool: Whether anything was actually changed.
+        """
+        changed = False
+        for (name, attr_value) in attrib.items():
+            if attr_value is not None and prop.get(name) != attr_value:
+                prop.set(name, attr_value)
+                changed = True
+        for (tag, text) in ((self.PROPERTY_LABEL, label),
+                            (self.PROPERTY_DESC, description)):
+            if text is not None and prop.findtext(tag) != text:
+                self.set_or_make_child(prop, tag, text)
+                changed = True
+        return changed
+
+    def set_property_values(self, properties, user_configurable=None):
+        """Set the values of many properties at once, creating any new ones.
+
+        This gives the same result as calling :meth:`set_property_value` for
+        each property in turn, but is much faster for large numbers of
+        properties. All values are validated before any changes are made,
+        so if any value is invalid, no properties are changed.
+
+        Args:
+          properties (list): ``(key, value)`` pairs to set, in order.
+              Any new properties are created with type 'string', and
+              appended to the ProductSection in this order.
+          user_configurable (bool): Should these properties be configurable
+              at deployment time by the user?
+
+        Returns:
+          list: the (converted) values that were set.
+
+        Raises:
+          NotImplementedError: if :attr:`ovf_version` is less than 1.0;
+              OVF version 0.9 is not currently supported.
+          ValueUnsupportedError: if any value is not valid for its property.
+        """
+        if self.ovf_version < 1.0:
+            raise NotImplementedError("No support for setting environment "
+                                      "properties under OVF v0.9")
+
+        new_props = []
+        new_props_by_key = {}
+        updates = []
+        for key, value in properties:
+            prop = self._property_by_key.get(key)
+            if prop is None:
+                prop = new_props_by_key.get(key)
+            if prop is None:
+                # Properties *must* have a type to be valid
+                prop = ET.Element(self.PROPERTY,
+                                  attrib={self.PROP_KEY: key,
+                                          self.PROP_TYPE: 'string'})
+                new_props.append(prop)
+                new_props_by_key[key] = prop
+            if value is not None:
+                value = self._validate_value_for_property(prop, value)
+            updates.append((prop, value))
+
+        # All values are valid, so now we can safely update the XML
+        if new_props or self.product_section is None:
+            self._modified = True
+        self.product_section = self._ensure_section(
+            self.PRODUCT_SECTION,
+            "Product Information",
+            attrib=self.PRODUCT_SECTION_ATTRIB,
+            parent=self.virtual_system)
+        self.product_section.extend(new_props)
+        self._property_by_key.update(new_props_by_key)
+        logger.verbose("Updating %d properties (%d of which are new)",
+                       len(updates), len(new_props))
+        if user_configurable is not None:
+            user_configurable = str(user_configurable).lower()
+        for prop, value in updates:
+            attrib = {self.PROP_USER_CONFIGABLE: user_configurable,
+                      self.PROP_VALUE: value}
+            if self._update_property(prop, attrib):
+                self._modified = True
+
+        return [value for (_, value) in updates]
+
     def config_file_to_properties(self, file_path, user_configurable=None):
         """Import each line of a text file into a configuration property.
 
@@ -1948,19 +2343,18 @@ class OVF(VMDescription, XML):
         if not self.platform.LITERAL_CLI_STRING:
             raise NotImplementedError("no known support for literal CLI on " +
                                       str(self.platform))
-        property_num = 0
+        properties = []
         with open(file_path, 'r') as fileobj:
             for line in fileobj:
                 line = line.strip()
                 # Skip blank lines and comment lines
                 if (not line) or line[0] == '!':
                     continue
-                property_num += 1
-                self.set_property_value(
+                properties.append((
                     "{0}-{1:04d}".format(self.platform.LITERAL_CLI_STRING,
-                                         property_num),
-                    line,
-                    user_configurable)
+                                         len(properties) + 1),
+                    line))
+        self.set_property_values(properties, user_configurable)
 
     def convert_disk_if_needed(self, disk_image, kind):
         """Convert the disk to a more appropriate format if needed.
@@ -2023,8 +2417,7 @@ class OVF(VMDescription, XML):
         logger.debug("Looking for existing disk info based on filename %s",
                      filename)
 
-        file_obj = self.find_child(self.references, self.FILE,
-                                   attrib={self.FILE_HREF: filename})
+        file_obj = self._file_by_href.get(filename)
 
         if file_obj is None:
             return (file_obj, disk, ctrl_item, disk_item)
@@ -2077,8 +2470,7 @@ class OVF(VMDescription, XML):
         ctrl_item = None
         disk_item = None
 
-        file_obj = self.find_child(self.references, self.FILE,
-                                   attrib={self.FILE_ID: file_id})
+        file_obj = self._file_by_id.get(file_id)
 
         disk = self.find_disk_from_file_id(file_id)
 
@@ -2159,27 +2551,18 @@ class OVF(VMDescription, XML):
                 host_resource.startswith(self.OLD_HOST_RSRC_DISK_REF)):
             logger.debug("Looking for Disk and File matching disk Item")
             # From disk Item to Disk
-            disk_id = os.path.basename(host_resource)
-            if self.disk_section is not None:
-                disk = self.find_child(self.disk_section, self.DISK,
-                                       attrib={self.DISK_ID: disk_id})
+            disk = self._disk_by_id.get(os.path.basename(host_resource))
 
             if disk is not None:
                 # From Disk to File
-                file_id = disk.get(self.DISK_FILE_REF)
-                file_obj = self.find_child(self.references, self.FILE,
-                                           attrib={self.FILE_ID: file_id})
+                file_obj = self._file_by_id.get(disk.get(self.DISK_FILE_REF))
         elif (host_resource.startswith(self.HOST_RSRC_FILE_REF) or
               host_resource.startswith(self.OLD_HOST_RSRC_FILE_REF)):
             logger.debug("Looking for File and Disk matching disk Item")
             # From disk Item to File
             file_id = os.path.basename(host_resource)
-            file_obj = self.find_child(self.references, self.FILE,
-                                       attrib={self.FILE_ID: file_id})
-
-            if self.disk_section is not None:
-                disk = self.find_child(self.disk_section, self.DISK,
-                                       attrib={self.DISK_FILE_REF: file_id})
+            file_obj = self._file_by_id.get(file_id)
+            disk = self._disk_by_file_ref.get(file_id)
         else:
             logger.error(
                 "Unrecognized HostResource format '%s'; unable to identify "
@@ -2347,6 +2730,7 @@ class OVF(VMDescription, XML):
             if href in self.file_references.keys():
                 del self.file_references[href]
 
+            self._unindex_file(file_obj)
             file_obj.clear()
         elif disk is None:
             file_obj = ET.SubElement(self.references, self.FILE)
@@ -2366,9 +2750,8 @@ class OVF(VMDescription, XML):
             disk_index = all_disks.index(disk)
             file_index = len(all_files)
             while disk_index < len(all_disks):
-                tmp_file_id = all_disks[disk_index].get(self.DISK_FILE_REF)
-                next_file = self.find_child(self.references, self.FILE,
-                                            attrib={self.FILE_ID: tmp_file_id})
+                next_file = self._file_by_id.get(
+                    all_disks[disk_index].get(self.DISK_FILE_REF))
                 if next_file is not None:
                     file_index = all_files.index(next_file)
                     break
@@ -2383,12 +2766,14 @@ class OVF(VMDescription, XML):
         file_obj.set(self.FILE_ID, file_id)
         file_obj.set(self.FILE_HREF, file_name)
         file_obj.set(self.FILE_SIZE, file_size_string)
+        self._index_file(file_obj)
 
         # Make a note of the file's location - we'll copy it at write time.
         # The file_path is always a FileOnDisk
         self.file_references[file_name] = FileOnDisk(
             os.path.dirname(os.path.abspath(file_path)), file_name,
             checksum_algorithm=self.checksum_algorithm)
+        self._modified = True
 
         return file_obj
 
@@ -2406,10 +2791,13 @@ class OVF(VMDescription, XML):
               than 'cdrom' or 'harddisk'
         """
         self.references.remove(file_obj)
+        self._unindex_file(file_obj)
         del self.file_references[file_obj.get(self.FILE_HREF)]
+        self._modified = True
 
         if disk is not None:
             self.disk_section.remove(disk)
+            self._unindex_disk(disk)
 
         if disk_drive is not None:
             # For a CD-ROM drive, we can simply unmap the file.
@@ -2443,10 +2831,12 @@ class OVF(VMDescription, XML):
                               "Existing element will be deleted.")
                 if self.disk_section is not None:
                     self.disk_section.remove(disk)
+                    self._unindex_disk(disk)
                     if not self.disk_section.findall(self.DISK):
                         logger.notice("No Disks left - removing DiskSection")
                         self.envelope.remove(self.disk_section)
                         self.disk_section = None
+                    self._modified = True
                 disk = None
             else:
                 logger.debug("Not adding Disk element to OVF, as CD-ROMs "
@@ -2463,6 +2853,7 @@ class OVF(VMDescription, XML):
 
         if disk is not None:
             disk_id = disk.get(self.DISK_ID)
+            self._unindex_disk(disk)
             disk.clear()
         else:
             disk_id = file_id
@@ -2475,6 +2866,7 @@ class OVF(VMDescription, XML):
         disk.set(self.DISK_FORMAT,
                  ("http://www.vmware.com/interfaces/"
                   "specifications/vmdk.html#streamOptimized"))
+        self._index_disk(disk)
         return disk
 
     def add_controller_device(self, device_type, subtype, address,
@@ -2631,173 +3023,212 @@ class OVF(VMDescription, XML):
 
     # Helper methods - for internal use only
 
-    def untar(self, file_path):
-        """Untar the OVF descriptor from an .ova to the working directory.
+    def _find_ova_descriptor(self, file_path):
+        """Locate the OVF descriptor within an .ova, without extracting it.
 
         Args:
           file_path (str): OVA file path
 
         Returns:
-          str: Path to extracted OVF descriptor
+          COT.tar_file.TarMember: OVF descriptor member of the OVA.
 
         Raises:
           VMInitError: if the given file doesn't represent a valid OVA archive.
         """
-        logger.verbose("Untarring %s to working directory %s",
-                       file_path, self.working_dir)
+        logger.verbose("Looking for OVF descriptor in %s", file_path)
 
         try:
-            tarf = tarfile.open(file_path, 'r')
-        except (EOFError, tarfile.TarError) as exc:
+            index = TarIndex.for_path(file_path)
+        except IOError as exc:
             raise VMInitError(1, "Could not untar file: {0}".format(exc.args),
                               file_path)
 
-        try:
-            # The OVF standard says, with regard to OVAs:
-            # ...the files shall be in the following order inside the archive:
-            # 1) OVF descriptor
-            # 2) OVF manifest (optional)
-            # 3) OVF certificate (optional)
-            # 4) The remaining files shall be in the same order as listed
-            #    in the References section...
-            # 5) OVF manifest (optional)
-            # 6) OVF certificate (optional)
-            #
-            # For now we just validate #1.
-            if not tarf.getmembers():
-                raise VMInitError(1, "No files to untar", file_path)
-            # Make sure the provided file doesn't contain any malicious paths
-            # http://stackoverflow.com/questions/8112742/
-            for pathname in tarf.getnames():
-                logger.debug("Examining path of %s prior to untar", pathname)
-                if not (os.path.abspath(os.path.join(self.working_dir,
-                                                     pathname))
-                        .startswith(self.working_dir)):
-                    raise VMInitError(1, "Tar file contains malicious/unsafe "
-                                      "file path '{0}'!".format(pathname),
-                                      file_path)
-
-            ovf_descriptor = tarf.getmembers()[0]
-            if os.path.splitext(ovf_descriptor.name)[1] != '.ovf':
-                # Do we have an OVF descriptor elsewhere in the file?
-                candidates = [mem for mem in tarf.getmembers() if
-                              os.path.splitext(mem.name)[1] == '.ovf']
-                if not candidates:
-                    raise VMInitError(1,
-                                      "TAR file does not seem to contain any"
-                                      " .ovf file to serve as OVF descriptor"
-                                      " - OVA is invalid!",
-                                      file_path)
-                ovf_descriptor = candidates[0]
-                logger.error(
-                    "OVF file %s found, but is not the first file in the TAR "
-                    "as it should be - OVA is not standard-compliant!",
-                    ovf_descriptor.name)
-
-            # TODO: In theory we could read the ovf descriptor XML directly
-            # from the TAR and not need to even extract this file to disk...
-            tarf.extract(ovf_descriptor, path=self.working_dir)
-            logger.debug(
-                "Extracted OVF descriptor from %s to working dir %s",
-                file_path, self.working_dir)
-        finally:
-            tarf.close()
-
-        # Find the OVF file
-        return os.path.join(self.working_dir, ovf_descriptor.name)
-
-    def generate_manifest(self, ovf_file):
+        # The OVF standard says, with regard to OVAs:
+        # ...the files shall be in the following order inside the archive:
+        # 1) OVF descriptor
+        # 2) OVF manifest (optional)
+        # 3) OVF certificate (optional)
+        # 4) The remaining files shall be in the same order as listed
+        #    in the References section...
+        # 5) OVF manifest (optional)
+        # 6) OVF certificate (optional)
+        #
+        # For now we just validate #1.
+        if not index.members:
+            raise VMInitError(1, "No files to untar", file_path)
+        # Make sure the provided file doesn't contain any malicious paths,
+        # as we may need to extract its contents later on.
+        # http://stackoverflow.com/questions/8112742/
+        for pathname in index.names:
+            logger.debug("Examining path of %s in TAR file", pathname)
+            normpath = os.path.normpath(pathname)
+            if (os.path.isabs(normpath) or normpath == os.pardir or
+                    normpath.startswith(os.pardir + os.sep)):
+                raise VMInitError(1, "Tar file contains malicious/unsafe "
+                                  "file path '{0}'!".format(pathname),
+                                  file_path)
+
+        ovf_descriptor = index.members[0]
+        if os.path.splitext(ovf_descriptor.name)[1] != '.ovf':
+            # Do we have an OVF descriptor elsewhere in the file?
+            candidates = [mem for mem in index.members if
+                          os.path.splitext(mem.name)[1] == '.ovf']
+            if not candidates:
+                raise VMInitError(1,
+                                  "TAR file does not seem to contain any"
+                                  " .ovf file to serve as OVF descriptor"
+                                  " - OVA is invalid!",
+                                  file_path)
+            ovf_descriptor = candidates[0]
+            logger.error(
+                "OVF file %s found, but is not the first file in the TAR "
+                "as it should be - OVA is not standard-compliant!",
+                ovf_descriptor.name)
+
+        return ovf_descriptor
+
+    def generate_manifest(self, ovf_file, descriptor=None):
         """Construct the manifest file for this package, if possible.
 
         Args:
           ovf_file (str): OVF descriptor file path
+          descriptor (bytes): Contents of ``ovf_file``, if already in
+            memory, so that the file doesn't need to be read back.
 
         Returns:
           bool: True if the manifest was successfully generated,
           False if not successful (such as if checksum helper tools are
           unavailable).
         """
-        (prefix, _) = os.path.splitext(ovf_file)
         logger.verbose("Generating manifest for %s", ovf_file)
-        manifest = prefix + '.mf'
-        with open(ovf_file, 'rb') as ovfobj:
-            checksum = file_checksum(ovfobj, self.checksum_algorithm)
+        if descriptor is None:
+            with open(ovf_file, 'rb') as ovfobj:
+                checksum = file_checksum(ovfobj, self.checksum_algorithm)
+        else:
+            checksum = self._descriptor_checksum(descriptor)
+        manifest = os.path.splitext(ovf_file)[0] + '.mf'
         with open(manifest, 'wb') as mfobj:
-            mfobj.write("{algo}({file})= {sum}\n"
-                        .format(algo=self.checksum_algorithm.upper(),
-                                file=os.path.basename(ovf_file),
-                                sum=checksum)
-                        .encode('utf-8'))
-            # Checksum all referenced files as well
-            for file_obj in self.references.findall(self.FILE):
-                file_name = file_obj.get(self.FILE_HREF)
-                file_ref = self.file_references[file_name]
-
-                mfobj.write("{algo}({file})= {sum}\n"
-                            .format(algo=self.checksum_algorithm.upper(),
-                                    file=file_name, sum=file_ref.checksum)
-                            .encode('utf-8'))
-
+            mfobj.write(self._manifest_data(os.path.basename(ovf_file),
+                                            checksum))
         logger.debug("Manifest generated successfully")
         return True
 
-    def tar(self, ovf_descriptor, tar_file):
+    def _descriptor_checksum(self, descriptor):
+        """Compute the checksum of the given serialized OVF descriptor.
+
+        Args:
+          descriptor (bytes): OVF descriptor contents.
+
+        Returns:
+          str: Checksum using :attr:`checksum_algorithm`.
+        """
+        hash_obj = checksum_hash(self.checksum_algorithm)
+        hash_obj.update(descriptor)
+        return hash_obj.hexdigest()
+
+    def _manifest_data(self, ovf_name, ovf_checksum):
+        """Construct the contents of the manifest for this package.
+
+        Helper method for :meth:`generate_manifest` and :meth:`tar`.
+        Any referenced files whose checksums aren't yet known are
+        checksummed (in parallel).
+
+        Args:
+          ovf_name (str): File name of the OVF descriptor.
+          ovf_checksum (str): Checksum of the OVF descriptor.
+
+        Returns:
+          bytes: Manifest contents.
+        """
+        file_names = [file_obj.get(self.FILE_HREF) for file_obj in
+                      self.references.findall(self.FILE)]
+        checksums = FileReference.compute_checksums(
+            [self.file_references[file_name] for file_name in file_names])
+        entries = ([(ovf_name, ovf_checksum)] +
+                   list(zip(file_names, checksums)))
+        return b"".join("{algo}({file})= {sum}\n"
+                        .format(algo=self.checksum_algorithm.upper(),
+                                file=file_name, sum=checksum)
+                        .encode('utf-8')
+                        for file_name, checksum in entries)
+
+    def tar(self, ovf_descriptor, tar_file, descriptor=None,
+            manifest_last=False):
         """Create a .ova tar file based on the given OVF descriptor.
 
+        By default, all files are checksummed (if needed) up front and the
+        manifest is placed immediately after the descriptor in the OVA,
+        as some consumers require. If ``manifest_last`` is set, each file is
+        instead checksummed (if needed) as it is written into the OVA, and
+        the manifest is then added as the last file in the OVA (as the OVF
+        specification permits), so that no file is read twice. Either way,
+        the manifest is generated in memory rather than written to disk.
+
         Args:
-          ovf_descriptor (str): File path for an OVF descriptor
+          ovf_descriptor (str): File path for an OVF descriptor, or, if
+            ``descriptor`` is given, just the file name to use for it
+            within the OVA.
           tar_file (str): File path for the desired OVA archive.
+          descriptor (bytes): Contents of the OVF descriptor, if already
+            serialized (see :meth:`~COT.xml_file.XML.serialize`).
+          manifest_last (bool): Place the manifest at the end of the OVA
+            rather than immediately after the descriptor.
         """
         logger.verbose("Creating tar file %s", tar_file)
 
-        (prefix, _) = os.path.splitext(ovf_descriptor)
+        if descriptor is None:
+            with open(ovf_descriptor, 'rb') as fileobj:
+                descriptor = fileobj.read()
+        ovf_name = os.path.basename(ovf_descriptor)
+        (prefix, _) = os.path.splitext(ovf_name)
+        ovf_checksum = self._descriptor_checksum(descriptor)
 
         # Issue #66 - need to detect any of the possible scenarios:
         # 1) output path and input path are the same real path
         #    (not just string-equal!)
         # 2) output file and input file are the same file (including links)
         # but not error out if (common case) output_file doesn't exist yet.
-        if (os.path.realpath(self.input_file) == os.path.realpath(tar_file) or
+        overwrite = (
+            os.path.realpath(self.input_file) == os.path.realpath(tar_file) or
             (os.path.exists(tar_file) and
-             os.path.samefile(self.input_file, tar_file))):
+             os.path.samefile(self.input_file, tar_file)))
+        if overwrite:
             # We're about to overwrite the input OVA with a new OVA.
-            # (Python tarfile module doesn't support in-place edits.)
-            # Any files that we need to carry over need to be extracted NOW!
-            logger.info(
-                "Input OVA will be overwritten. Extracting files from %s to"
-                " working directory before overwriting it.", self.input_file)
-            for filename in self.file_references:
-                file_ref = self.file_references[filename]
-                if file_ref.file_path is None:
-                    file_ref.copy_to(self.working_dir)
-                    self.file_references[filename] = FileReference.create(
-                        self.working_dir, filename,
-                        checksum_algorithm=self.checksum_algorithm,
-                        expected_checksum=file_ref.checksum,
-                        expected_size=file_ref.size)
-
-        # Be sure to dereference any links to the actual file content!
-        with tarfile.open(tar_file, 'w', dereference=True) as tarf:
+            # Any files that we need to carry over are read from the input
+            # OVA while writing the new OVA alongside it, which then
+            # atomically replaces the input OVA.
+            logger.info("Input OVA %s will be replaced by the new OVA",
+                        self.input_file)
+
+        # TarWriter always dereferences links to the actual file content,
+        # and splices any unchanged files directly from the input OVA.
+        with TarWriter(tar_file, replace=overwrite) as tarf:
             # OVF is always first
-            logger.debug("Adding OVF descriptor %s to %s",
-                         ovf_descriptor, tar_file)
-            tarf.add(ovf_descriptor, os.path.basename(ovf_descriptor))
-            # Add manifest if present
-            manifest_path = prefix + '.mf'
-            if os.path.exists(manifest_path):
+            logger.debug("Adding OVF descriptor %s to %s", ovf_name, tar_file)
+            tarf.addbytes(descriptor, ovf_name)
+            if not manifest_last:
                 logger.debug("Adding manifest to %s", tar_file)
-                tarf.add(manifest_path, os.path.basename(manifest_path))
-            if os.path.exists("{0}.cert".format(prefix)):
+                tarf.addbytes(self._manifest_data(ovf_name, ovf_checksum),
+                              prefix + '.mf')
+            if os.path.exists(os.path.join(self.working_dir,
+                                           prefix + '.cert')):
                 logger.warning("COT doesn't know how to re-sign a certificate"
                                " file, so the existing certificate will be"
                                " omitted from %s.", tar_file)
             # Add all other files mentioned in the OVF
-            for file_obj in self.references.findall(self.FILE):
-                file_name = file_obj.get(self.FILE_HREF)
+            file_names = [file_obj.get(self.FILE_HREF) for file_obj in
+                          self.references.findall(self.FILE)]
+            for file_name in file_names:
                 file_ref = self.file_references[file_name]
                 logger.debug("Adding associated file %s to %s",
                              file_name, tar_file)
-                file_ref.add_to_archive(tarf)
+                file_ref.add_to_archive(
+                    tarf, compute_checksum=manifest_last)
+            if manifest_last:
+                # Every checksum is now known, so this reads no files
+                logger.debug("Adding manifest to %s", tar_file)
+                tarf.addbytes(self._manifest_data(ovf_name, ovf_checksum),
+                              prefix + '.mf')
 
     def _ensure_section(self, section_tag, info_string,
                         attrib=None, parent=None):
@@ -2860,6 +3291,7 @@ class OVF(VMDescription, XML):
             "Product Information",
             attrib=self.PRODUCT_SECTION_ATTRIB,
             parent=self.virtual_system)
+        self._modified = True
         return self.set_or_make_child(self.product_section, child_tag,
                                       child_text)
 
@@ -2943,11 +3375,10 @@ class OVF(VMDescription, XML):
         Returns:
           xml.etree.ElementTree.Element: Disk matching the file, or None
         """
-        if file_id is None or self.disk_section is None:
+        if file_id is None:
             return None
 
-        return self.find_child(self.disk_section, self.DISK,
-                               attrib={self.DISK_FILE_REF: file_id})
+        return self._disk_by_file_ref.get(file_id)
 
     def find_empty_drive(self, drive_type):
         """Find a disk device that exists but contains no data.
@@ -3051,3 +3482,4 @@ class OVF(VMDescription, XML):
                 capacity_bytes)
             disk.set(self.DISK_CAPACITY, capacity)
             disk.set(self.DISK_CAP_UNITS, cap_units)
+        self._modified = True
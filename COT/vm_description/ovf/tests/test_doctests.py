@@ -27,5 +27,6 @@ def load_tests(*_):
     """
     suite = TestSuite()
     suite.addTests(DocTestSuite('COT.vm_description.ovf.item'))
+    suite.addTests(DocTestSuite('COT.vm_description.ovf.name_helper'))
     suite.addTests(DocTestSuite('COT.vm_description.ovf.utilities'))
     return suite
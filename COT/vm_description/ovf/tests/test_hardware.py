@@ -54,3 +54,87 @@ class TestOVFHardware(COTTestCase):
         """Test that find_item returns None if no matches are found."""
         with OVF(self.input_ovf, None) as ovf:
             self.assertEqual(None, ovf.hardware.find_item(resource_type='usb'))
+
+    def test_find_all_items_indexes(self):
+        """Check that lookups track items as they are created and changed."""
+        with OVF(self.input_ovf, None) as ovf:
+            hardware = ovf.hardware
+            ide = hardware.find_item('ide', {ovf.ADDRESS: '1'})
+            ide_instance = ide.instance_id
+            drives = hardware.find_all_items(
+                properties={ovf.PARENT: ide_instance})
+            self.assertEqual(2, len(drives))
+            self.assertEqual(None, hardware.find_item(
+                properties={ovf.HOST_RESOURCE: "ovf:/file/foo"}))
+
+            # Change an existing item
+            drives[0].set_property(ovf.HOST_RESOURCE, "ovf:/file/foo")
+            self.assertEqual(drives[0], hardware.find_item(
+                properties={ovf.HOST_RESOURCE: "ovf:/file/foo"}))
+            drives[0].set_property(ovf.HOST_RESOURCE, "ovf:/file/bar")
+            self.assertEqual(None, hardware.find_item(
+                properties={ovf.HOST_RESOURCE: "ovf:/file/foo"}))
+
+            # Create new items, which should be found in InstanceID order
+            (instance, new_item) = hardware.new_item('cdrom')
+            self.assertEqual('14', instance)
+            new_item.set_property(ovf.PARENT, ide_instance)
+            (instance, clone) = hardware.clone_item(
+                new_item, ovf.config_profiles + [None])
+            self.assertEqual('15', instance)
+            self.assertIs(ovf, clone.ovf)
+            self.assertEqual(
+                drives + [new_item, clone],
+                hardware.find_all_items(properties={ovf.PARENT: ide_instance}))
+            self.assertEqual(clone, hardware.find_item(
+                'cdrom', {ovf.INSTANCE_ID: '15', ovf.PARENT: ide_instance}))
+
+            # Deleted items should no longer be found
+            hardware.delete_item(new_item)
+            self.assertEqual(
+                drives + [clone],
+                hardware.find_all_items(properties={ovf.PARENT: ide_instance}))
+            self.assertEqual(None, hardware.find_item(
+                properties={ovf.INSTANCE_ID: '14'}))
+
+    def test_update_xml_incremental(self):
+        """Only Items of new or modified devices should be regenerated."""
+        with OVF(self.input_ovf, None) as ovf:
+            hardware = ovf.hardware
+            section = ovf.virtual_hw_section
+            before = list(section)
+
+            def instance_ids():
+                return [child.findtext(ovf.RASD + ovf.INSTANCE_ID)
+                        for child in section if child.tag == ovf.ITEM]
+
+            ids_before = instance_ids()
+            nic = hardware.item_dict['11']
+            nic.set_property(ovf.ADDRESS, "00:00:00:00:00:01")
+            hardware.update_xml()
+            self.assertFalse(hardware.modified)
+            after = list(section)
+            self.assertEqual(len(before), len(after))
+            self.assertEqual(ids_before, instance_ids())
+            for (old, new) in zip(before, after):
+                if new.findtext(ovf.RASD + ovf.INSTANCE_ID) == '11':
+                    self.assertIsNot(old, new)
+                    self.assertEqual(
+                        "00:00:00:00:00:01",
+                        new.findtext(ovf.RASD + ovf.ADDRESS))
+                else:
+                    self.assertIs(old, new)
+
+            # Replace a deleted device with a new one
+            hardware.delete_item(hardware.item_dict['12'])
+            (instance, _) = hardware.new_item('serial')
+            self.assertEqual('12', instance)
+            hardware.update_xml()
+            self.assertEqual(ids_before[:-2] + ['12', '13'], instance_ids())
+            self.assertIs(after[-1], list(section)[-1])
+
+            # Nothing to do
+            hardware.update_xml()
+            self.assertLogged(levelname="VERBOSE",
+                              msg="No changes to hardware definition, "
+                              "so no XML update is required")
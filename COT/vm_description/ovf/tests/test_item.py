@@ -16,15 +16,18 @@
 
 """Unit test cases for COT.vm_description.ovf.OVFItem class."""
 
+import copy
 import tempfile
 import shutil
-import xml.etree.ElementTree as ET   # noqa: N814
+
+import mock
 
 from COT.tests import COTTestCase
+from COT.xml_file import ET
 
 from COT.vm_description.ovf import OVF
-from COT.vm_description.ovf.name_helper import OVFNameHelper1
-from COT.vm_description.ovf.item import OVFItem
+from COT.vm_description.ovf.name_helper import OVFNameHelper1, name_helper
+from COT.vm_description.ovf.item import OVFItem, ProfileMasks
 
 
 class TestOVFItem(COTTestCase):
@@ -263,3 +266,92 @@ OVFItem:
         ovf.write()
         ovf.destroy()
         self.check_diff("")
+
+    def test_profile_masks(self):
+        """Profile membership is stored as bitmasks shared across the OVF."""
+        with OVF(self.input_ovf, None) as ovf:
+            # InstanceID 1, 'CPU' - entries for 'default' plus two profiles
+            item = ovf.hardware.item_dict['1']
+            self.assertIs(item.profile_masks, ovf.profile_masks)
+            masks = ovf.profile_masks
+            self.assertEqual(
+                {'1': ProfileMasks.DEFAULT,
+                 '2': masks.mask(['2CPU-2GB-1NIC']),
+                 '4': masks.mask(['4CPU-4GB-3NIC'])},
+                item.properties[ovf.VIRTUAL_QUANTITY])
+            self.assertEqual(set(['2CPU-2GB-1NIC']),
+                             item.property_profiles(ovf.VIRTUAL_QUANTITY, '2'))
+            self.assertEqual(set([None, '2CPU-2GB-1NIC', '4CPU-4GB-3NIC']),
+                             item.all_profiles(ovf.VIRTUAL_QUANTITY))
+            self.assertEqual(["", "2CPU-2GB-1NIC", "4CPU-4GB-3NIC"],
+                             item.get_nonintersecting_set_list())
+
+            item.set_property(ovf.VIRTUAL_QUANTITY, '4', ['2CPU-2GB-1NIC'])
+            self.assertEqual(
+                masks.mask(['2CPU-2GB-1NIC', '4CPU-4GB-3NIC']),
+                item.properties[ovf.VIRTUAL_QUANTITY]['4'])
+            self.assertEqual(["", "2CPU-2GB-1NIC 4CPU-4GB-3NIC"],
+                             item.get_nonintersecting_set_list())
+
+    def test_generate_items_custom_elements(self):
+        """Custom elements are parsed when stored, not when generating XML."""
+        with OVF(self.vmware_ovf, None) as ovf:
+            item = ovf.hardware.find_item('scsi')
+            names = [name for name in item.property_names
+                     if name.endswith(OVFItem.ELEMENT_KEY_SUFFIX)]
+            self.assertEqual(1, len(names))
+            self.assertEqual((OVFItem._CUSTOM_ELEMENT, None, None),
+                             OVFItem._property_key(names[0]))
+            self.assertEqual((OVFItem._ATTRIB, None, "bound"),
+                             OVFItem._property_key(
+                                 "bound" + OVFItem.ATTRIB_KEY_SUFFIX))
+            self.assertEqual((OVFItem._CHILD_ATTRIB, "Connection", "foo"),
+                             OVFItem._property_key("Connection_attrib_foo"))
+            self.assertEqual((OVFItem._CHILD, ovf.ADDRESS, None),
+                             OVFItem._property_key(ovf.ADDRESS))
+
+            with mock.patch('COT.vm_description.ovf.item.ET.fromstring') \
+                    as mock_fromstring:
+                items = item.generate_items()
+                items += item.generate_items()
+                mock_fromstring.assert_not_called()
+            configs = [child for child in items[0] if
+                       child.tag == "{http://www.vmware.com/schema/ovf}Config"]
+            self.assertEqual(1, len(configs))
+            self.assertEqual("slotInfo.pciSlotNumber",
+                             configs[0].get(
+                                 "{http://www.vmware.com/schema/ovf}key"))
+            # Each generated element is distinct from the template
+            self.assertIsNot(configs[0], items[1][-1])
+
+    def test_name_helper_binding(self):
+        """XML names are shared, read-only, and bound to OVF and OVFItem."""
+        with OVF(self.input_ovf, None) as ovf:
+            self.assertIs(ovf.name_helper, name_helper(1.0))
+            item = ovf.hardware.item_dict['4']
+            self.assertIs(item.name_helper, ovf.name_helper)
+            self.assertIs(type(item), OVFItem)
+            self.assertIs(type(copy.deepcopy(item)), OVFItem)
+            for obj in (ovf, item):
+                self.assertEqual(vars(obj)['RESOURCE_TYPE'], 'ResourceType')
+                self.assertEqual(
+                    vars(obj)['ITEM'],
+                    "{http://schemas.dmtf.org/ovf/envelope/1}Item")
+                self.assertEqual(obj.RES_MAP['cpu'], '3')
+        helper = name_helper(0.9)
+        self.assertEqual(helper.INSTANCE_ID, 'InstanceId')
+        item = OVFItem(mock.Mock(name_helper=helper,
+                                 profile_masks=ProfileMasks()))
+        self.assertEqual(vars(item)['INSTANCE_ID'], 'InstanceId')
+        self.assertIs(type(item), OVFItem)
+        self.assertEqual(helper.ITEM_CHILDREN[0], 'Caption')
+        self.assertRaises(AttributeError, setattr, helper, 'ITEM', 'foo')
+        self.assertRaises(AttributeError, delattr, helper, 'ITEM')
+        self.assertRaises(AttributeError, getattr, helper, 'NO_SUCH_NAME')
+        # Shared dict constants can't be modified by any client
+        attrib = helper.DISK_SECTION_ATTRIB
+        self.assertRaises(TypeError, attrib.__setitem__, 'foo', 'bar')
+        self.assertRaises(TypeError, attrib.update, foo='bar')
+        self.assertRaises(TypeError, attrib.clear)
+        self.assertEqual(copy.deepcopy(attrib), attrib)
+        self.assertEqual(name_helper(2.0).DISK_SECTION_ATTRIB, {})
@@ -17,6 +17,7 @@
 """Unit test cases for COT.vm_description.ovf.OVF class."""
 
 import filecmp
+import hashlib
 import logging
 import os
 import os.path
@@ -29,7 +30,7 @@ import mock
 from COT.tests import COTTestCase
 from COT.vm_description.ovf import OVF
 from COT.vm_description import VMInitError
-from COT.data_validation import ValueUnsupportedError
+from COT.data_validation import ValueUnsupportedError, file_checksums
 from COT.helpers import helpers, HelperError
 
 logger = logging.getLogger(__name__)
@@ -270,6 +271,39 @@ ovf:size="{cfg_size}" />
         # self.assertLogged(msg="Capacity of disk.*seems to have changed.*"
         #                  "The updated OVF will reflect this change.")
 
+    def test_input_manifest_other_algorithm(self):
+        """Manifest in a different algorithm is validated in the same pass."""
+        for name in ['input.ovf', 'input.vmdk', 'input.iso']:
+            shutil.copy(os.path.join(os.path.dirname(self.input_ovf), name),
+                        self.temp_dir)
+        shutil.copy(self.sample_cfg, self.temp_dir)
+        with open(os.path.join(self.temp_dir, 'input.mf'), 'w') as mfobj:
+            for name in ['input.ovf', 'input.vmdk', 'input.iso',
+                         'sample_cfg.txt']:
+                with open(os.path.join(self.temp_dir, name), 'rb') as fobj:
+                    checksum = hashlib.sha256(fobj.read()).hexdigest()
+                if name == 'input.iso':
+                    checksum = "12345"
+                mfobj.write("SHA256({0})= {1}\n".format(name, checksum))
+
+        with mock.patch('COT.file_reference.file_checksums',
+                        wraps=file_checksums) as checksum:
+            ovf = OVF(os.path.join(self.temp_dir, 'input.ovf'), None)
+            # One read of each file computes both SHA1 and SHA256
+            self.assertEqual(checksum.call_count, 4)
+            for args, _ in checksum.call_args_list:
+                self.assertEqual(sorted(args[1]), ['sha1', 'sha256'])
+            self.assertEqual(
+                ovf.file_references['input.vmdk'].checksum,
+                file_checksums(self.input_vmdk, ['sha1'])['sha1'])
+            self.assertEqual(checksum.call_count, 4)
+            ovf.destroy()
+        self.assertLogged(levelname="ERROR",
+                          msg="The %s checksum for file '%s' is expected to "
+                          "be:", args=('sha256', 'input.iso', '12345',
+                                       file_checksums(self.input_iso,
+                                                      ['sha256'])['sha256']))
+
     def test_tar_untar(self):
         """Output OVF to OVA and vice versa."""
         # Read OVF and write to OVA
@@ -319,6 +353,236 @@ ovf:size="{cfg_size}" />
                     "{0} file changed after OVF->OVA->OVF conversion"
                     .format(ext))
 
+    def test_ova_read_in_place(self):
+        """OVA descriptor and manifest are read without extracting them."""
+        ova_path = os.path.join(self.temp_dir, "input.ova")
+        with tarfile.open(ova_path, 'w') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+            tarf.add(self.input_manifest, 'input.mf')
+            tarf.add(self.input_vmdk, 'input.vmdk')
+            tarf.add(self.input_iso, 'input.iso')
+            tarf.add(self.sample_cfg, 'sample_cfg.txt')
+        with OVF(ova_path, None) as ova:
+            self.assertEqual(ova.ovf_descriptor, 'input.ovf')
+            self.assertEqual(ova.ovf_version, 1.0)
+            self.assertEqual(sorted(ova.file_references.keys()),
+                             ['input.iso', 'input.vmdk', 'sample_cfg.txt'])
+            self.assertEqual(os.listdir(ova.working_dir), [])
+
+    def test_ova_overwrite_in_place(self):
+        """Overwriting the input OVA doesn't stage its files elsewhere."""
+        ova_path = os.path.join(self.temp_dir, "input.ova")
+        with tarfile.open(ova_path, 'w') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+            tarf.add(self.input_manifest, 'input.mf')
+            tarf.add(self.input_vmdk, 'input.vmdk')
+            tarf.add(self.input_iso, 'input.iso')
+            tarf.add(self.sample_cfg, 'sample_cfg.txt')
+        ova = OVF(ova_path, ova_path)
+        ova.product = "PRODUCT" * 100
+        ova.write()
+        # Descriptor and manifest are written directly into the new OVA
+        self.assertEqual(os.listdir(ova.working_dir), [])
+        ova.destroy()
+        self.assertLogged(levelname="INFO",
+                          msg="Input OVA %s will be replaced by the new OVA",
+                          args=(ova_path,))
+        # No temporary files left behind
+        self.assertEqual(os.listdir(self.temp_dir), ["input.ova"])
+        with tarfile.open(ova_path, 'r') as tarf:
+            self.assertEqual(tarf.getnames(),
+                             ['input.ovf', 'input.mf', 'input.vmdk',
+                              'input.iso', 'sample_cfg.txt'])
+            with open(self.input_vmdk, 'rb') as fileobj:
+                self.assertEqual(tarf.extractfile('input.vmdk').read(),
+                                 fileobj.read())
+
+    def test_ova_trailing_manifest(self):
+        """Files can be checksummed as they're written to the OVA."""
+        ova_path = os.path.join(self.temp_dir, "input.ova")
+        with tarfile.open(ova_path, 'w') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+            tarf.add(self.input_vmdk, 'input.vmdk')
+            tarf.add(self.input_iso, 'input.iso')
+            tarf.add(self.sample_cfg, 'sample_cfg.txt')
+        output_path = os.path.join(self.temp_dir, "output.ova")
+        ova = OVF(ova_path, output_path)
+        try:
+            with mock.patch('COT.file_reference.file_checksums') as checksum:
+                ova.write(manifest_last=True)
+                checksum.assert_not_called()
+        finally:
+            ova.destroy()
+        with tarfile.open(output_path, 'r') as tarf:
+            self.assertEqual(tarf.getnames(),
+                             ['output.ovf', 'input.vmdk', 'input.iso',
+                              'sample_cfg.txt', 'output.mf'])
+            manifest = tarf.extractfile('output.mf').read().decode()
+            descriptor = tarf.extractfile('output.ovf').read()
+        with open(self.input_manifest, 'r') as fileobj:
+            expected = fileobj.read().splitlines()
+        expected[0] = "SHA1(output.ovf)= {0}".format(
+            hashlib.sha1(descriptor).hexdigest())
+        self.assertEqual(manifest.splitlines(), expected)
+
+    def test_ova_manifest_first(self):
+        """By default, the manifest is placed immediately after the OVF."""
+        ova_path = os.path.join(self.temp_dir, "input.ova")
+        with tarfile.open(ova_path, 'w') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+            tarf.add(self.input_vmdk, 'input.vmdk')
+            tarf.add(self.input_iso, 'input.iso')
+            tarf.add(self.sample_cfg, 'sample_cfg.txt')
+        output_path = os.path.join(self.temp_dir, "output.ova")
+        ova = OVF(ova_path, output_path)
+        ova.write()
+        ova.destroy()
+        with tarfile.open(output_path, 'r') as tarf:
+            self.assertEqual(tarf.getnames(),
+                             ['output.ovf', 'output.mf', 'input.vmdk',
+                              'input.iso', 'sample_cfg.txt'])
+
+    def test_write_unchanged_in_place(self):
+        """Writing an unchanged OVF/OVA over itself writes nothing."""
+        ova_path = os.path.join(self.temp_dir, "input.ova")
+        with tarfile.open(ova_path, 'w') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+            tarf.add(self.input_vmdk, 'input.vmdk')
+            tarf.add(self.input_iso, 'input.iso')
+            tarf.add(self.sample_cfg, 'sample_cfg.txt')
+            tarf.add(self.input_manifest, 'input.mf')
+        with open(ova_path, 'rb') as fileobj:
+            expected = fileobj.read()
+        ova = OVF(ova_path, ova_path)
+        try:
+            with mock.patch('COT.vm_description.ovf.ovf.TarWriter') as tarw:
+                ova.write()
+                tarw.assert_not_called()
+        finally:
+            ova.destroy()
+        self.assertLogged(levelname="INFO",
+                          msg="No changes to %s, so there's nothing to write",
+                          args=(ova_path,))
+        with open(ova_path, 'rb') as fileobj:
+            self.assertEqual(fileobj.read(), expected)
+
+        self.staging_dir = tempfile.mkdtemp(prefix="cot_ut_ovfio_stage")
+        for path in [self.input_ovf, self.input_manifest, self.input_vmdk,
+                     self.input_iso, self.sample_cfg]:
+            shutil.copy(path, self.staging_dir)
+        ovf_path = os.path.join(self.staging_dir, "input.ovf")
+        mtime = os.stat(ovf_path).st_mtime
+        with OVF(ovf_path, ovf_path):
+            pass
+        self.assertLogged(levelname="INFO",
+                          msg="No changes to %s, so there's nothing to write",
+                          args=(ovf_path,))
+        self.assertEqual(os.stat(ovf_path).st_mtime, mtime)
+        self.check_diff("", file1=self.input_ovf, file2=ovf_path)
+
+    def test_modified(self):
+        """Changes to the descriptor are tracked without re-serializing it."""
+        with mock.patch.object(OVF, 'serialize') as serialize:
+            ovf = OVF(self.input_ovf, "")
+            serialize.assert_not_called()
+        try:
+            self.assertFalse(ovf.modified)
+            ovf.version_short = "2.0"
+            self.assertTrue(ovf.modified)
+        finally:
+            ovf.destroy()
+
+        ovf = OVF(self.input_ovf, "")
+        try:
+            self.assertFalse(ovf.modified)
+            ovf.set_cpu_count(4, None)
+            self.assertTrue(ovf.modified)
+        finally:
+            ovf.destroy()
+
+        ovf = OVF(self.input_ovf, "")
+        try:
+            # Rejected values, and unchanged values, don't count as changes
+            self.assertRaises(ValueUnsupportedError, ovf.set_property_value,
+                              'enable-ssh-server', 'maybe')
+            self.assertRaises(ValueUnsupportedError, ovf.set_property_values,
+                              [('enable-ssh-server', 'maybe')])
+            self.assertRaises(ValueUnsupportedError, ovf.set_property_value,
+                              'new-property', 'x', property_type='boolean')
+            self.assertEqual(ovf.get_property_value('new-property'), None)
+            ovf.set_property_value('enable-ssh-server', 'false')
+            ovf.set_property_values([('enable-ssh-server', 'false')])
+            self.assertFalse(ovf.modified)
+            ovf.set_property_value('enable-ssh-server', 'true')
+            self.assertTrue(ovf.modified)
+        finally:
+            ovf.destroy()
+
+    def test_write_descriptor_only_in_place(self):
+        """Unchanged files in an OVA aren't checked again when rewriting it."""
+        ova_path = os.path.join(self.temp_dir, "input.ova")
+        with tarfile.open(ova_path, 'w') as tarf:
+            tarf.add(self.input_ovf, 'input.ovf')
+            tarf.add(self.input_manifest, 'input.mf')
+            tarf.add(self.input_vmdk, 'input.vmdk')
+            tarf.add(self.input_iso, 'input.iso')
+            tarf.add(self.sample_cfg, 'sample_cfg.txt')
+        ova = OVF(ova_path, ova_path)
+        ova.product = "TOUDORP"
+        try:
+            with mock.patch('COT.vm_description.ovf.ovf.DiskRepresentation'
+                            '.from_file') as from_file, \
+                    mock.patch('COT.file_reference.file_checksums') as cksum:
+                ova.write()
+                from_file.assert_not_called()
+                cksum.assert_not_called()
+        finally:
+            ova.destroy()
+        self.assertLogged(levelname="INFO",
+                          msg="Input OVA %s will be replaced by the new OVA",
+                          args=(ova_path,))
+        # No temporary files left behind
+        self.assertEqual(os.listdir(self.temp_dir), ["input.ova"])
+        with tarfile.open(ova_path, 'r') as tarf:
+            self.assertEqual(tarf.getnames(),
+                             ['input.ovf', 'input.mf', 'input.vmdk',
+                              'input.iso', 'sample_cfg.txt'])
+            descriptor = tarf.extractfile('input.ovf').read()
+            manifest = tarf.extractfile('input.mf').read().decode()
+            with open(self.input_vmdk, 'rb') as fileobj:
+                self.assertEqual(tarf.extractfile('input.vmdk').read(),
+                                 fileobj.read())
+        self.assertIn(b"<ovf:Product>TOUDORP</ovf:Product>", descriptor)
+        with open(self.input_manifest, 'r') as fileobj:
+            expected = fileobj.read().splitlines()
+        expected[0] = "SHA1(input.ovf)= {0}".format(
+            hashlib.sha1(descriptor).hexdigest())
+        self.assertEqual(manifest.splitlines(), expected)
+
+    def test_write_ovf_descriptor_only_in_place(self):
+        """Unchanged files alongside an OVF aren't checked or copied."""
+        self.staging_dir = tempfile.mkdtemp(prefix="cot_ut_ovfio_stage")
+        for path in [self.input_ovf, self.input_manifest, self.input_vmdk,
+                     self.input_iso, self.sample_cfg]:
+            shutil.copy(path, self.staging_dir)
+        ovf_path = os.path.join(self.staging_dir, "input.ovf")
+        with mock.patch('COT.vm_description.ovf.ovf.DiskRepresentation'
+                        '.from_file') as from_file:
+            with OVF(ovf_path, ovf_path) as ovf:
+                ovf.product = "TOUDORP"
+            from_file.assert_not_called()
+        self.check_diff(file1=self.input_ovf, file2=ovf_path, expected="""
+     <ovf:Info>Information about the installed software</ovf:Info>
+-      <ovf:Product>PRODUCT</ovf:Product>
++      <ovf:Product>TOUDORP</ovf:Product>
+       <ovf:Vendor>VENDOR</ovf:Vendor>
+""")
+        with open(ovf_path, 'rb') as fileobj:
+            checksum = hashlib.sha1(fileobj.read()).hexdigest()
+        with open(os.path.join(self.staging_dir, "input.mf"), 'r') as mfobj:
+            self.assertEqual(mfobj.readline().strip(),
+                             "SHA1(input.ovf)= {0}".format(checksum))
+
     def test_tar_links(self):
         """Check that OVA dereferences symlinks and hard links."""
         self.staging_dir = tempfile.mkdtemp(prefix="cot_ut_ovfio_stage")
@@ -533,6 +797,58 @@ class TestOVFAPI(COTTestCase):
                               "2CPU-2GB-1NIC"])
             self.assertEqual(ovf.default_config_profile, "4CPU-4GB-3NIC")
 
+    def test_keyed_lookups(self):
+        """Lookups by identifier stay correct as elements are changed."""
+        with OVF(self.input_ovf, None) as ovf:
+            (file_obj, disk, _, _) = ovf.search_from_filename('input.vmdk')
+            self.assertEqual(ovf.get_id_from_file(file_obj), 'file1')
+            self.assertEqual(disk.get(ovf.DISK_ID), 'vmdisk1')
+            self.assertEqual(ovf.search_from_file_id('file1')[:2],
+                             (file_obj, disk))
+            self.assertIs(ovf.find_disk_from_file_id('file1'), disk)
+
+            # Replace the file and disk with new identifiers
+            new_file = ovf.add_file(self.blank_vmdk, 'file3',
+                                    file_obj=file_obj, disk=disk)
+            self.assertIs(new_file, file_obj)
+            self.assertEqual(ovf.search_from_filename('input.vmdk'),
+                             (None, None, None, None))
+            self.assertEqual(ovf.search_from_file_id('file3')[:2],
+                             (file_obj, None))
+            self.assertEqual(ovf.search_from_filename('blank.vmdk')[:2],
+                             (file_obj, None))
+            ovf.remove_file(file_obj, disk=disk)
+            self.assertEqual(ovf.search_from_filename('blank.vmdk'),
+                             (None, None, None, None))
+            self.assertEqual(ovf.search_from_file_id('file3'),
+                             (None, None, None, None))
+
+            ovf.create_network('VM Network', 'Updated description')
+            ovf.create_network('New Network', 'New description')
+            self.assertEqual(ovf.networks,
+                             ['VM Network', 'New Network'])
+            self.assertEqual(ovf.network_descriptions[0],
+                             'Updated description')
+
+            self.assertEqual(ovf.get_property_value('enable-ssh-server'),
+                             'false')
+            ovf.set_property_value('enable-ssh-server', 'yes')
+            self.assertEqual(ovf.get_property_value('enable-ssh-server'),
+                             'true')
+            self.assertEqual(ovf.get_property_value('new-property'), None)
+            ovf.set_property_value('new-property', 'hello')
+            self.assertEqual(ovf.get_property_value('new-property'), 'hello')
+
+            # Setting existing properties again doesn't duplicate them
+            count = len(ovf.product_section.findall(ovf.PROPERTY))
+            ovf.set_property_values([('newkey', 'a')])
+            ovf.set_property_values([('newkey', 'b'),
+                                     ('new-property', 'world')])
+            self.assertEqual(len(ovf.product_section.findall(ovf.PROPERTY)),
+                             count + 1)
+            self.assertEqual(ovf.get_property_value('newkey'), 'b')
+            self.assertEqual(ovf.get_property_value('new-property'), 'world')
+
     def test_find_empty_drive_unsupported(self):
         """Negative test for find_empty_drive()."""
         with OVF(self.input_ovf, None) as ovf:
@@ -222,10 +222,14 @@ class TestVMDescription(unittest.TestCase):
             assert ins.environment_transports
         with self.assertRaises(NotImplementedError):
             ins.environment_transports = ['iso']
+        self.assertRaises(NotImplementedError,
+                          ins.has_property, None)
         self.assertRaises(NotImplementedError,
                           ins.get_property_value, None)
         self.assertRaises(NotImplementedError,
                           ins.set_property_value, None, None)
+        self.assertRaises(NotImplementedError,
+                          ins.set_property_values, [])
         self.assertRaises(NotImplementedError,
                           ins.config_file_to_properties, self.TEXT_FILE)
 
@@ -249,8 +249,14 @@ class VMDescription(object):
         """
         return self._working_dir
 
-    def write(self):
-        """Write the VM description to :attr:`output_file`, if any."""
+    def write(self, manifest_last=False):
+        """Write the VM description to :attr:`output_file`, if any.
+
+        Args:
+          manifest_last (bool): For formats that package a manifest with
+              the VM description, place it at the end of the package rather
+              than at the start, if the format permits this.
+        """
         if self.output_file:
             raise NotImplementedError("write not implemented")
 
@@ -803,6 +809,16 @@ class VMDescription(object):
 
     # API methods needed for edit-product
     # API methods needed for edit-properties
+    def has_property(self, key):
+        """Check whether the given property exists.
+
+        Args:
+          key (str): Property identifier
+        Returns:
+          bool: Whether the property exists, whether or not it has a value.
+        """
+        raise NotImplementedError("has_property not implemented")
+
     def get_property_value(self, key):
         """Get the value of the given property.
 
@@ -832,6 +848,19 @@ class VMDescription(object):
         """
         raise NotImplementedError("set_property_value not implemented")
 
+    def set_property_values(self, properties, user_configurable=None):
+        """Set the values of many properties at once, creating any new ones.
+
+        Args:
+          properties (list): ``(key, value)`` pairs to set, in order.
+          user_configurable (bool): Should these properties be configurable
+              at deployment time by the user?
+
+        Returns:
+          list: the (converted) values that were set.
+        """
+        raise NotImplementedError("set_property_values not implemented")
+
     def config_file_to_properties(self, file_path, user_configurable=None):
         """Import each line of a text file into a configuration property.
 